@@ -1,17 +1,30 @@
 from langchain_openai import ChatOpenAI
 from langchain_openai import OpenAIEmbeddings
-from langchain_core.runnables import RunnableSequence
-from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableConfig, RunnableSequence
 from langchain_community.vectorstores import FAISS
-from typing import List, Dict, TypedDict, Annotated
-import json
+from typing import AsyncIterator, List, Dict, Optional, Sequence, Tuple, TypedDict, Annotated, Union
+from functools import lru_cache
+import asyncio
 from langchain_core.output_parsers import JsonOutputParser
 from langchain_core.messages import HumanMessage
 from langgraph.graph import StateGraph, END, START
+from imu_session import IMUSession
+from motion_features import extract_features, format_features
+from downsampling import CHARS_PER_TOKEN, DEFAULT_TOKEN_BUDGET, Downsampler, ExtremaDownsampler, downsample
+from embedding_cache import CachedEmbeddings, EmbeddingCache
+from rate_limit import RateLimiter
+from response_cache import ResponseCache, with_response_cache
+from prompts import PROMPT_TEMPLATES, prompt_template
+from checkpoints import CheckpointStore, SessionCheckpoint, fingerprint
+from windowing import DEFAULT_STRIDE, DEFAULT_WINDOW, window_documents
+
+# Completion size assumed when reserving rate-limit capacity for a call.
+EXPECTED_OUTPUT_TOKENS = 1000
 
 class AgentState(TypedDict):
     """State for the agent system."""
     motion_data: str
+    motion_features: str
     analysis: str
     exercise_suggestions: str
     game_design: str
@@ -19,107 +32,241 @@ class AgentState(TypedDict):
     exercise_summary: str
     game_implementation: str
 
+# Graph node name -> AgentSystem method implementing it.
+WORKFLOW_NODES = {
+    "analyze_data": "_analyze_data",
+    "generate_exercises": "_generate_exercises",
+    "design_game": "_design_game",
+    "plan_routine": "_plan_routine",
+    "generate_report": "_generate_report",
+    "generate_implementation": "_generate_implementation",
+}
+
+# Graph node name -> prompt it renders.
+NODE_PROMPTS = {
+    "analyze_data": "data_analyst",
+    "generate_exercises": "physiotherapist",
+    "design_game": "game_designer",
+    "plan_routine": "exercise_planner",
+    "generate_report": "report_generator",
+    "generate_implementation": "implementation_generator",
+}
+
+# Graph node name -> state key it writes.
+NODE_OUTPUTS = {
+    "analyze_data": "analysis",
+    "generate_exercises": "exercise_suggestions",
+    "design_game": "game_design",
+    "plan_routine": "exercise_routine",
+    "generate_report": "exercise_summary",
+    "generate_implementation": "game_implementation",
+}
+
+def _dispatch(name: str, method: str):
+    """Graph node calling ``method`` on the AgentSystem passed in the run config.
+
+    With a SessionCheckpoint in the config, the node's stored output is
+    reused when its input fingerprint is unchanged.
+    """
+    async def node(state: AgentState, config: RunnableConfig) -> Dict:
+        agent_system = config["configurable"]["agent_system"]
+        checkpoint = config["configurable"].get("checkpoint")
+        if checkpoint is None:
+            return await getattr(agent_system, method)(state)
+        key = agent_system.node_fingerprint(name, state)
+        output = checkpoint.lookup(name, key)
+        if output is None:
+            output = await getattr(agent_system, method)(state)
+            checkpoint.record(name, key, output)
+        return output
+    node.__name__ = method.lstrip("_")
+    return node
+
+@lru_cache(maxsize=None)
+def compiled_workflow():
+    """Create the agent workflow using langgraph, compiled once per process.
+
+    Nodes look up the AgentSystem in the run config, so one compiled graph
+    serves every instance. They run as soon as the state they read is
+    available: the chain up to ``plan_routine`` is sequential, then the
+    report and the implementation guide (which does not read the report)
+    run in parallel. Each node returns only the keys it writes, so parallel
+    branches never conflict.
+    """
+    # Create the workflow graph
+    workflow = StateGraph(AgentState)
+
+    # Add nodes for each analysis step
+    for name, method in WORKFLOW_NODES.items():
+        workflow.add_node(name, _dispatch(name, method))
+
+    # Define the workflow edges
+    workflow.add_edge(START, "analyze_data")
+    workflow.add_edge("analyze_data", "generate_exercises")
+    workflow.add_edge("generate_exercises", "design_game")
+    workflow.add_edge("design_game", "plan_routine")
+    # Fan out: both final documents only depend on the steps above
+    workflow.add_edge("plan_routine", "generate_report")
+    workflow.add_edge("plan_routine", "generate_implementation")
+    # Fan in
+    workflow.add_edge(["generate_report", "generate_implementation"], END)
+
+    # Compile the workflow
+    return workflow.compile()
+
 class AgentSystem:
-    def __init__(self, openai_api_key: str):
-        """Initialize the agent system."""
+    def __init__(self, openai_api_key: str, downsampler: Optional[Downsampler] = None,
+                 raw_data_token_budget: int = DEFAULT_TOKEN_BUDGET,
+                 embedding_cache: Optional[EmbeddingCache] = None,
+                 rate_limiter: Optional[RateLimiter] = None,
+                 response_cache: Optional[ResponseCache] = None,
+                 checkpoints: Optional[CheckpointStore] = None):
+        """Initialize the agent system.
+
+        ``downsampler`` and ``raw_data_token_budget`` control how many raw
+        samples are sent to the data analyst alongside the motion features.
+        Embeddings go through ``embedding_cache`` (by default one at
+        ``$EMBEDDING_CACHE_PATH``, opened on the first embedding), so repeated
+        texts are never re-embedded. Every LLM call
+        first waits on ``rate_limiter``, if given. With a ``response_cache``
+        a rerun on unchanged inputs replays the stored replies, and only
+        nodes whose rendered prompt changed reach the API. With
+        ``checkpoints`` each session's node outputs are stored, and a rerun
+        resumes from the first node whose prompt, model or inputs changed.
+        """
+        self.response_cache = response_cache
         self.llm = ChatOpenAI(model="gpt-4", openai_api_key=openai_api_key)
-        self.embeddings = OpenAIEmbeddings(openai_api_key=openai_api_key)
+        self.embedding_cache = embedding_cache if embedding_cache is not None else EmbeddingCache()
+        self.embeddings = CachedEmbeddings(OpenAIEmbeddings(openai_api_key=openai_api_key), self.embedding_cache)
         self.vector_store = None
-        self.workflow = self._create_workflow()
-
-    def setup_vector_store(self):
-        """Set up the vector store with embeddings."""
-        self.vector_store = FAISS.from_texts(
-            ["IMU data analysis system"], 
-            self.embeddings
-        )
-
-    def _create_workflow(self) -> StateGraph:
-        """Create the agent workflow using langgraph."""
-        # Create the workflow graph
-        workflow = StateGraph(AgentState)
-
-        # Add nodes for each analysis step
-        workflow.add_node("analyze_data", self._analyze_data)
-        workflow.add_node("generate_exercises", self._generate_exercises)
-        workflow.add_node("design_game", self._design_game)
-        workflow.add_node("plan_routine", self._plan_routine)
-        workflow.add_node("generate_report", self._generate_report)
-        workflow.add_node("generate_implementation", self._generate_implementation)
-
-        # Define the workflow edges
-        workflow.add_edge(START, "analyze_data")
-        workflow.add_edge("analyze_data", "generate_exercises")
-        workflow.add_edge("generate_exercises", "design_game")
-        workflow.add_edge("design_game", "plan_routine")
-        workflow.add_edge("plan_routine", "generate_report")
-        workflow.add_edge("generate_report", "generate_implementation")
-        workflow.add_edge("generate_implementation", END)
-
-        # Compile the workflow
-        return workflow.compile()
-
-    def _analyze_data(self, state: AgentState) -> AgentState:
+        self.downsampler = downsampler or ExtremaDownsampler()
+        self.raw_data_token_budget = raw_data_token_budget
+        self.rate_limiter = rate_limiter
+        self.checkpoints = checkpoints
+        self.workflow = compiled_workflow()
+
+    @property
+    def llm(self):
+        """Chat model behind every chain."""
+        return self._llm
+
+    @llm.setter
+    def llm(self, llm):
+        # Prompts are parsed and the graph compiled once per process; only
+        # binding the prompts to this instance's LLM happens here
+        self._llm = with_response_cache(llm, getattr(self, "response_cache", None))
+        self.chains = {name: prompt_template(name) | self._llm for name in PROMPT_TEMPLATES}
+
+    def setup_vector_store(self, session: Optional[IMUSession] = None, window: int = DEFAULT_WINDOW,
+                           stride: int = DEFAULT_STRIDE, align_to_reps: bool = False):
+        """Set up the vector store with embeddings.
+
+        A given ``session`` is indexed as one document per motion window (or
+        repetition) with its summary statistics, not one per sample.
+        """
+        documents = window_documents(session, window, stride, align_to_reps) if session is not None else []
+        if not documents:
+            documents = [("IMU data analysis system", {})]
+        texts, metadatas = zip(*documents)
+        self.vector_store = FAISS.from_texts(list(texts), self.embeddings, metadatas=list(metadatas))
+
+    async def _ainvoke(self, chain, inputs: Dict) -> str:
+        """Run a prompt | llm chain under the rate limiter and return the reply text."""
+        if self.rate_limiter is None or (
+            self.response_cache is not None
+            and self.response_cache.contains(self.llm, chain.first.format_messages(**inputs))
+        ):
+            return (await chain.ainvoke(inputs)).content
+        estimate = len(chain.first.format(**inputs)) // CHARS_PER_TOKEN + EXPECTED_OUTPUT_TOKENS
+        booking = await self.rate_limiter.acquire(estimate)
+        response = await chain.ainvoke(inputs)
+        usage = getattr(response, "usage_metadata", None)
+        if usage:
+            self.rate_limiter.adjust(usage["total_tokens"] - estimate, booking)
+        return response.content
+
+    async def _analyze_data(self, state: AgentState) -> Dict:
         """Analyze motion data using data analyst chain."""
-        chain = self.create_data_analyst_chain()
-        state["analysis"] = chain.invoke({"motion_data": state["motion_data"]}).content
-        return state
-
-    def _generate_exercises(self, state: AgentState) -> AgentState:
+        chain = self.chains["data_analyst"]
+        analysis = await self._ainvoke(chain, {
+            "motion_features": state["motion_features"],
+            "motion_data": state["motion_data"]
+        })
+        return {"analysis": analysis}
+
+    async def _generate_exercises(self, state: AgentState) -> Dict:
         """Generate exercise suggestions using physiotherapist chain."""
-        chain = self.create_physiotherapist_chain()
-        state["exercise_suggestions"] = chain.invoke({"analysis": state["analysis"]}).content
-        return state
+        chain = self.chains["physiotherapist"]
+        exercise_suggestions = await self._ainvoke(chain, {"analysis": state["analysis"]})
+        return {"exercise_suggestions": exercise_suggestions}
 
-    def _design_game(self, state: AgentState) -> AgentState:
+    async def _design_game(self, state: AgentState) -> Dict:
         """Design game mechanics using game designer chain."""
-        chain = self.create_game_designer_chain()
-        state["game_design"] = chain.invoke({"exercise_suggestions": state["exercise_suggestions"]}).content
-        return state
+        chain = self.chains["game_designer"]
+        game_design = await self._ainvoke(chain, {"exercise_suggestions": state["exercise_suggestions"]})
+        return {"game_design": game_design}
 
-    def _plan_routine(self, state: AgentState) -> AgentState:
+    async def _plan_routine(self, state: AgentState) -> Dict:
         """Plan exercise routine using exercise planner chain."""
-        chain = self.create_exercise_planner_chain()
-        state["exercise_routine"] = chain.invoke({
+        chain = self.chains["exercise_planner"]
+        exercise_routine = await self._ainvoke(chain, {
             "analysis": state["analysis"],
             "exercise_suggestions": state["exercise_suggestions"],
             "game_design": state["game_design"]
-        }).content
-        return state
+        })
+        return {"exercise_routine": exercise_routine}
 
-    def _generate_report(self, state: AgentState) -> AgentState:
+    async def _generate_report(self, state: AgentState) -> Dict:
         """Generate exercise summary using report generator chain."""
-        chain = self.create_report_generator_chain()
-        state["exercise_summary"] = chain.invoke({
+        chain = self.chains["report_generator"]
+        exercise_summary = await self._ainvoke(chain, {
             "analysis": state["analysis"],
             "exercise_suggestions": state["exercise_suggestions"],
             "game_design": state["game_design"],
             "exercise_routine": state["exercise_routine"]
-        }).content
-        return state
+        })
+        return {"exercise_summary": exercise_summary}
 
-    def _generate_implementation(self, state: AgentState) -> AgentState:
+    async def _generate_implementation(self, state: AgentState) -> Dict:
         """Generate implementation details using implementation chain."""
-        chain = self.create_implementation_generator_chain()
-        state["game_implementation"] = chain.invoke({
+        chain = self.chains["implementation_generator"]
+        game_implementation = await self._ainvoke(chain, {
             "game_design": state["game_design"],
             "exercise_routine": state["exercise_routine"]
-        }).content
-        return state
-
-    def process_motion_data(self, motion_data: str) -> Dict:
-        """Process motion data through the agent workflow."""
-        # Parse and sample the motion data
-        data = json.loads(motion_data)
-        sampled_data = {
-            "timestamp": data["timestamp"],
-            "left_hand": data["left_hand"][::10],
-            "right_hand": data["right_hand"][::10]
-        }
+        })
+        return {"game_implementation": game_implementation}
+
+    def node_fingerprint(self, node: str, state: AgentState) -> str:
+        """Hash of everything a node's output depends on."""
+        prompt = NODE_PROMPTS[node]
+        get_llm_string = getattr(self.llm, "_get_llm_string", None)
+        return fingerprint({
+            "node": node,
+            "template": PROMPT_TEMPLATES[prompt],
+            "model": get_llm_string() if get_llm_string else type(self.llm).__name__,
+            "inputs": {key: state[key] for key in prompt_template(prompt).input_variables},
+        })
+
+    def _run_config(self, checkpoint: Optional[SessionCheckpoint] = None) -> RunnableConfig:
+        """Config handing this instance (and the session checkpoint) to the shared workflow's nodes."""
+        configurable = {"agent_system": self}
+        if checkpoint is not None:
+            configurable["checkpoint"] = checkpoint
+        return {"configurable": configurable}
+
+    def _initial_state(self, motion_data: Union[str, IMUSession]) -> AgentState:
+        """Workflow input for a session or a legacy JSON payload."""
+        if isinstance(motion_data, str):
+            motion_data = IMUSession.from_json(motion_data)
+
+        # Compute motion features on the full recording, then reduce the raw
+        # data to the prompt budget while keeping pitch and gyro extrema
+        features = extract_features(motion_data)
+        sampled_data = downsample(motion_data, self.raw_data_token_budget, self.downsampler)
 
-        # Initialize the workflow state
-        initial_state: AgentState = {
-            "motion_data": json.dumps(sampled_data),
+        return {
+            "motion_data": sampled_data.to_json(),
+            "motion_features": format_features(features),
             "analysis": "",
             "exercise_suggestions": "",
             "game_design": "",
@@ -128,8 +275,28 @@ class AgentSystem:
             "game_implementation": ""
         }
 
+    def _prepare_run(self, motion_data: Union[str, IMUSession], session_key: Optional[str]):
+        """Initial state, run config and checkpoint (if enabled) for one session."""
+        if isinstance(motion_data, str):
+            motion_data = IMUSession.from_json(motion_data)
+        checkpoint = None
+        if self.checkpoints is not None:
+            checkpoint = self.checkpoints.for_session(session_key or motion_data.session_id or "session")
+        return self._initial_state(motion_data), self._run_config(checkpoint), checkpoint
+
+    async def aprocess_motion_data(self, motion_data: Union[str, IMUSession],
+                                   session_key: Optional[str] = None) -> Dict:
+        """Process motion data through the agent workflow without blocking the event loop.
+
+        ``session_key`` names the checkpoint to resume from; it defaults to
+        the session ID. ``checkpoint`` in the result lists the nodes whose
+        stored output was ``reused`` and those that were ``computed`` (both
+        empty without checkpoints).
+        """
+        initial_state, config, checkpoint = self._prepare_run(motion_data, session_key)
+
         # Run the workflow
-        final_state = self.workflow.invoke(initial_state)
+        final_state = await self.workflow.ainvoke(initial_state, config=config)
 
         # Return the results
         return {
@@ -138,398 +305,71 @@ class AgentSystem:
             "game_design": final_state["game_design"],
             "exercise_routine": final_state["exercise_routine"],
             "exercise_summary": final_state["exercise_summary"],
-            "game_implementation": final_state["game_implementation"]
+            "game_implementation": final_state["game_implementation"],
+            "checkpoint": {
+                "reused": list(checkpoint.reused) if checkpoint is not None else [],
+                "computed": list(checkpoint.computed) if checkpoint is not None else [],
+            },
         }
 
+    async def astream_motion_data(self, motion_data: Union[str, IMUSession], session_key: Optional[str] = None,
+                                  nodes: Optional[Sequence[str]] = None) -> AsyncIterator[Tuple[str, str, str]]:
+        """Run the workflow and yield its output as it is generated.
+
+        Yields ``("token", node, text)`` for every streamed LLM chunk and
+        ``("done", node, output)`` with the complete text when a node
+        finishes. Only the given ``nodes`` are reported (all by default).
+        Nodes answered from a checkpoint or the response cache may arrive as
+        a single ``done`` event without tokens.
+        """
+        initial_state, config, _ = self._prepare_run(motion_data, session_key)
+        async for mode, payload in self.workflow.astream(initial_state, config=config,
+                                                         stream_mode=["messages", "updates"]):
+            if mode == "messages":
+                chunk, metadata = payload
+                node = metadata.get("langgraph_node")
+                if chunk.content and (nodes is None or node in nodes):
+                    yield "token", node, chunk.content
+            else:
+                for node, update in payload.items():
+                    if update and (nodes is None or node in nodes):
+                        yield "done", node, update[NODE_OUTPUTS[node]]
+
+    def process_motion_data(self, motion_data: Union[str, IMUSession], session_key: Optional[str] = None) -> Dict:
+        """Process motion data through the agent workflow.
+
+        ``motion_data`` is either an IMUSession or the legacy JSON payload
+        with ``timestamp``, ``left_hand`` and ``right_hand`` keys. Blocking
+        wrapper around ``aprocess_motion_data``; inside a running event loop
+        await that instead.
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.aprocess_motion_data(motion_data, session_key))
+        raise RuntimeError("process_motion_data called from a running event loop; "
+                           "use 'await aprocess_motion_data(...)' instead")
+
     def create_data_analyst_chain(self):
         """Create a chain for motion data analysis."""
-        template = """You are an AI Data Analyst specializing in IMU (Inertial Measurement Unit) data analysis for VR exercise applications. Analyze the following IMU data from both hands performing up-down movements:
-
-{motion_data}
-
-Focus your analysis on these specific aspects:
-
-1. Bilateral Movement Analysis:
-   - Compare the timing and synchronization between left and right hands
-   - Analyze differences in range of motion between hands
-   - Identify any asymmetries in movement patterns
-   - Evaluate smoothness and consistency of up-down motions
-
-2. Movement Parameters for Each Hand:
-   - Range of motion in vertical direction (pitch)
-   - Movement speed and acceleration patterns
-   - Stability during movement (roll and yaw variations)
-   - Movement rhythm and timing
-
-3. Movement Quality Indicators:
-   - Smoothness of acceleration/deceleration
-   - Consistency of movement patterns
-   - Presence of tremors or jerky movements
-   - Coordination between hands
-
-4. Specific Up-Down Motion Analysis:
-   - Maximum and minimum heights reached
-   - Time taken for upward vs downward movement
-   - Pauses or holds at top/bottom positions
-   - Variation in movement speed throughout range
-
-Your analysis should:
-1. Be quantitative where possible (include specific angles, speeds, timing differences)
-2. Compare left vs right hand performance
-3. Identify any potential issues or areas for improvement
-4. Focus specifically on the vertical (up-down) movement patterns
-
-Format your analysis as a clear, structured report with specific sections for each aspect analyzed."""
-
-        prompt = ChatPromptTemplate.from_template(template)
-        return prompt | self.llm
+        return prompt_template("data_analyst") | self.llm
 
     def create_physiotherapist_chain(self):
         """Create a chain for exercise recommendations."""
-        template = """You are an AI Exercise Routine Planner specializing in VR-based rehabilitation and exercise programs. Based on the following motion analysis:
-
-{analysis}
-
-Create a comprehensive 10-day exercise routine that focuses on improving bilateral hand coordination and up-down movement patterns. Follow this EXACT format:
-
-### Exercise Routine Table
-
-| **Data Observed** | **Data Pattern** | **Phase** | **Exercise/Routine Name** | **Day Duration** | **VR Game Script** |
-|-------------------|------------------|-----------|---------------------------|------------------|--------------------|
-[Fill with one row per day, exactly 10 rows]
-
-Guidelines for each column:
-
-1. **Data Observed**:
-   - Include specific IMU measurements (e.g., "Pitch range: 45°-80°")
-   - Note bilateral differences (e.g., "Left hand lags by 0.2s")
-   - Mention stability metrics (e.g., "Roll deviation: ±5°")
-
-2. **Data Pattern**:
-   - Describe movement characteristics (e.g., "Smooth acceleration, jerky deceleration")
-   - Note timing patterns (e.g., "2s up, 1.5s down")
-   - Highlight coordination aspects (e.g., "Asymmetric peak heights")
-
-3. **Phase**:
-   Choose from:
-   - "Baseline Assessment"
-   - "Coordination Training"
-   - "Strength Building"
-   - "Speed Development"
-   - "Endurance Training"
-   - "Recovery/Light"
-   - "Advanced Integration"
-
-4. **Exercise/Routine Name**:
-   Create specific names like:
-   - "Synchronized Hand Raises"
-   - "Tempo-Based Lifts"
-   - "Mirror Motion Training"
-   - "Peak Hold Challenge"
-
-5. **Day Duration**:
-   - Specify exact minutes (20-45 range)
-   - Include warm-up/cool-down
-   - Account for rest periods
-
-6. **VR Game Script**:
-   Write detailed game mechanics:
-   - Specific objectives (e.g., "Catch falling stars with both hands simultaneously")
-   - Scoring system (e.g., "Points awarded for synchronization within 0.1s")
-   - Progression rules (e.g., "Speed increases every 5 successful catches")
-   - Visual/audio cues (e.g., "Glowing path shows optimal movement trajectory")
-
-### Final Summary
-
-[Write a detailed 1-paragraph summary describing:
-- Key focus areas and progression strategy
-- Expected improvements in coordination, strength, and speed
-- Specific metrics for success (e.g., "Target: <0.1s hand synchronization")
-- Recommendations for continued practice]
-
-IMPORTANT:
-1. MUST use EXACT table format
-2. MUST create EXACTLY 10 rows
-3. MUST include detailed game mechanics
-4. MUST progress difficulty logically
-5. MUST focus on bilateral coordination
-6. MUST emphasize up-down movements
-7. DO NOT add extra sections
-
-Example Row:
-| Pitch range: 45-80°, Left hand lags 0.2s | Smooth up (2s), jerky down (1.5s) | Coordination Training | Synchronized Star Catch | 25 minutes | Players catch falling stars, matching LED path timing. Score based on hand sync (<0.1s). Speed increases every 5 catches |"""
-
-        prompt = ChatPromptTemplate.from_template(template)
-        return prompt | self.llm
+        return prompt_template("physiotherapist") | self.llm
 
     def create_game_designer_chain(self):
         """Create a chain for VR game design."""
-        template = """You are an AI VR Game Designer specializing in therapeutic exercise games. Based on the following exercise recommendations:
-
-{exercise_suggestions}
-
-Design VR games that focus on:
-1. Bilateral Coordination
-   - Synchronized hand movements
-   - Complementary actions
-   - Hand-eye coordination
-
-2. Exercise Integration
-   - Natural movement patterns
-   - Therapeutic progression
-   - Form feedback
-
-3. Engagement Mechanics
-   - Achievement systems
-   - Visual feedback
-   - Progress tracking
-
-4. Adaptive Difficulty
-   - Dynamic scaling
-   - Performance-based adjustments
-   - Recovery periods
-
-Design multiple game modes:
-1. Rhythm Games
-   - Synchronized hand movements
-   - Timing-based challenges
-   - Musical feedback
-
-2. Object Manipulation
-   - Grabbing and releasing
-   - Transfer between hands
-   - Spatial awareness
-
-3. Pattern Matching
-   - Mirror movements
-   - Sequential actions
-   - Memory challenges
-
-4. Movement Flow
-   - Continuous motion
-   - Smooth transitions
-   - Balance challenges
-
-For each game mode, specify:
-1. Core Mechanics:
-   - Primary actions
-   - Control schemes
-   - Movement patterns
-
-2. Progression System:
-   - Difficulty levels
-   - Unlock criteria
-   - Achievement metrics
-
-3. Feedback Systems:
-   - Visual cues
-   - Haptic feedback
-   - Performance metrics
-
-4. Technical Requirements:
-   - Motion tracking
-   - Hand synchronization
-   - Form validation
-
-Your design should create an engaging and therapeutically effective VR experience."""
-
-        prompt = ChatPromptTemplate.from_template(template)
-        return prompt | self.llm
+        return prompt_template("game_designer") | self.llm
 
     def create_exercise_planner_chain(self):
         """Create a chain for exercise routine planning."""
-        template = """You are an AI Exercise Routine Planner specializing in VR-based bilateral exercises. Create a comprehensive routine based on:
-
-Analysis: {analysis}
-Exercise Suggestions: {exercise_suggestions}
-Game Design: {game_design}
-
-Create a 10-day exercise program that focuses on:
-1. Bilateral Coordination
-   - Synchronized movements
-   - Hand-eye coordination
-   - Movement symmetry
-
-2. Progressive Overload
-   - Gradual intensity increase
-   - Complexity progression
-   - Duration adjustments
-
-3. Exercise Variety
-   - Different game modes
-   - Movement patterns
-   - Challenge types
-
-4. Recovery Integration
-   - Rest periods
-   - Alternating focus
-   - Deload sessions
-
-Structure the program as follows:
-
-## Week 1: Foundation
-### Day 1-3: Basic Coordination
-- Focus: Establishing movement patterns
-- Game Modes: Rhythm and Pattern Matching
-- Duration: 20-30 minutes
-
-### Day 4-5: Movement Flow
-- Focus: Smooth transitions
-- Game Modes: Object Manipulation
-- Duration: 25-35 minutes
-
-## Week 2: Progression
-### Day 6-8: Advanced Coordination
-- Focus: Complex patterns
-- Game Modes: All modes with increased difficulty
-- Duration: 30-40 minutes
-
-### Day 9-10: Performance
-- Focus: Speed and accuracy
-- Game Modes: Challenge modes
-- Duration: 35-45 minutes
-
-For each day, specify:
-1. Warm-up routine
-2. Main exercises
-3. Cool-down activities
-4. Progress tracking metrics
-
-Include specific details about:
-1. Exercise selection
-2. Sets and repetitions
-3. Rest periods
-4. Form cues
-5. Success criteria
-
-Your routine should be progressive, engaging, and focused on improving bilateral coordination."""
-
-        prompt = ChatPromptTemplate.from_template(template)
-        return prompt | self.llm
+        return prompt_template("exercise_planner") | self.llm
 
     def create_report_generator_chain(self):
         """Create a chain for generating reports."""
-        template = """You are an AI Report Generator specializing in creating comprehensive exercise summaries. Based on the following information:
-
-Analysis: {analysis}
-Exercise Suggestions: {exercise_suggestions}
-Game Design: {game_design}
-Exercise Routine: {exercise_routine}
-
-Create a detailed exercise summary in markdown format with the following structure:
-
-# Exercise Program Summary
-
-## Motion Analysis Overview
-[Summarize key findings from the motion analysis, focusing on bilateral coordination and movement patterns]
-
-## 10-Day Exercise Program
-
-| Day | Data Observed | Data Pattern | Phase | Exercise/Routine Name | Day Duration | VR Game Script |
-|-----|--------------|--------------|-------|---------------------|--------------|----------------|
-| 1   | [Data] | [Pattern] | [Phase] | [Name] | [Duration] | [Script] |
-| 2   | [Data] | [Pattern] | [Phase] | [Name] | [Duration] | [Script] |
-| 3   | [Data] | [Pattern] | [Phase] | [Name] | [Duration] | [Script] |
-| 4   | [Data] | [Pattern] | [Phase] | [Name] | [Duration] | [Script] |
-| 5   | [Data] | [Pattern] | [Phase] | [Name] | [Duration] | [Script] |
-| 6   | [Data] | [Pattern] | [Phase] | [Name] | [Duration] | [Script] |
-| 7   | [Data] | [Pattern] | [Phase] | [Name] | [Duration] | [Script] |
-| 8   | [Data] | [Pattern] | [Phase] | [Name] | [Duration] | [Script] |
-| 9   | [Data] | [Pattern] | [Phase] | [Name] | [Duration] | [Script] |
-| 10  | [Data] | [Pattern] | [Phase] | [Name] | [Duration] | [Script] |
-
-Fill in the table with the exercise data, ensuring:
-1. Each row represents one day of the program
-2. All 10 days are included
-3. Data is properly aligned in columns
-4. Cells contain appropriate detailed information
-5. Table formatting is preserved
-
-## Progress Tracking
-- Initial Metrics
-- Target Metrics
-- Success Criteria
-- Progression Rules
-
-## Exercise Instructions
-[For each unique exercise/game, provide detailed instructions including:
-- Setup and starting position
-- Movement execution
-- Common mistakes to avoid
-- Progression indicators]
-
-## Safety Guidelines
-- Warm-up requirements
-- Rest period recommendations
-- Signs to watch for
-- When to modify or stop
-
-## Next Steps
-[Include the physiotherapist's recommendations for continued practice and next phase]
-
-IMPORTANT:
-1. The table MUST include all 10 days
-2. Each row MUST be properly aligned
-3. All cells MUST contain appropriate detailed information
-4. Table formatting MUST be preserved exactly as shown
-5. DO NOT modify the column structure
-6. DO NOT omit any days"""
-
-        prompt = ChatPromptTemplate.from_template(template)
-        return prompt | self.llm
+        return prompt_template("report_generator") | self.llm
 
     def create_implementation_generator_chain(self):
         """Create a chain for generating implementation details."""
-        template = """You are a VR development technical lead.
-Create a comprehensive implementation guide for the VR exercise game in markdown format.
-
-Game Design: {game_design}
-Exercise Routine: {exercise_routine}
-
-Include detailed sections on:
-
-1. System Requirements
-- Hardware specifications
-- Software dependencies
-- Development environment setup
-
-2. Game Mechanics Implementation
-- Core mechanics for each exercise
-- Input handling approach
-- Motion tracking requirements
-- Scoring system design
-- Progression logic
-- Visual/audio feedback
-
-3. Data Processing Pipeline
-- IMU data collection
-- Motion analysis algorithms
-- Performance metrics
-
-4. User Interface Design
-- Menu structure
-- Exercise selection interface
-- Progress tracking displays
-- Visual feedback elements
-
-5. Testing Procedures
-- Unit testing approach
-- Integration testing plan
-- User testing protocol
-- Performance benchmarks
-
-6. Game Implementation Details
-Create a detailed table with implementation specifics for each game mode:
-
-| Game Mode | Core Mechanics | Input Requirements | Scoring Logic | Progression System | Technical Requirements |
-|-----------|---------------|-------------------|---------------|-------------------|----------------------|
-[Fill with game modes from Game Design]
-
-7. Deployment Guidelines
-- Build process
-- Platform-specific considerations
-- Quality assurance checklist
-- Maintenance considerations"""
-
-        prompt = ChatPromptTemplate.from_template(template)
-        return prompt | self.llm
+        return prompt_template("implementation_generator") | self.llm
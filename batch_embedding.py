@@ -0,0 +1,83 @@
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+RETRYABLE_ERRORS = {"RateLimitError", "APITimeoutError", "APIConnectionError", "InternalServerError", "Timeout"}
+
+
+def is_retryable(exc: Exception) -> bool:
+    """True for rate limits and transient server/connection failures."""
+    status = getattr(exc, "status_code", None) or getattr(getattr(exc, "response", None), "status_code", None)
+    if status in RETRYABLE_STATUS:
+        return True
+    return type(exc).__name__ in RETRYABLE_ERRORS
+
+
+def embed_batch(model, texts: List[str]) -> List[List[float]]:
+    """Embed one batch with a LlamaIndex or LangChain embedding model."""
+    if hasattr(model, "get_text_embedding_batch"):
+        return model.get_text_embedding_batch(texts)
+    if hasattr(model, "embed_documents"):
+        return model.embed_documents(texts)
+    return [model.get_text_embedding(text) for text in texts]
+
+
+def with_retries(fn: Callable[[], List[List[float]]], max_retries: int, backoff: float,
+                 sleep: Callable[[float], None] = time.sleep) -> List[List[float]]:
+    """Call ``fn``, retrying retryable errors with jittered exponential backoff."""
+    for attempt in range(max_retries + 1):
+        try:
+            return fn()
+        except Exception as exc:
+            if attempt == max_retries or not is_retryable(exc):
+                raise
+            sleep(backoff * (2 ** attempt) * (0.5 + random.random()))
+
+
+def embed_texts(model, texts: Sequence[str], batch_size: int = 100, max_in_flight: int = 4,
+                max_retries: int = 5, backoff: float = 1.0) -> np.ndarray:
+    """Embed ``texts`` in batches with at most ``max_in_flight`` concurrent requests.
+
+    Results are written straight into one preallocated float32 array in the
+    original order. Raises ``ValueError`` if the model returns a different
+    number of vectors than texts, or vectors of differing dimension.
+    """
+    if batch_size < 1 or max_in_flight < 1:
+        raise ValueError("batch_size and max_in_flight must be at least 1")
+    n = len(texts)
+    result: Optional[np.ndarray] = None
+    if n == 0:
+        return np.empty((0, 0), dtype=np.float32)
+
+    starts = range(0, n, batch_size)
+    pending: Dict[Future, int] = {}
+
+    def store(start: int, vectors: List[List[float]]):
+        nonlocal result
+        block = np.asarray(vectors, dtype=np.float32)
+        expected = min(batch_size, n - start)
+        if block.ndim != 2 or len(block) != expected:
+            raise ValueError(f"Embedding batch at {start} returned {len(block)} vectors for {expected} texts")
+        if result is None:
+            result = np.empty((n, block.shape[1]), dtype=np.float32)
+        elif block.shape[1] != result.shape[1]:
+            raise ValueError(f"Embedding batch at {start} has dimension {block.shape[1]}, "
+                             f"expected {result.shape[1]}")
+        result[start:start + len(block)] = block
+
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        for start in starts:
+            if len(pending) >= max_in_flight:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    store(pending.pop(future), future.result())
+            batch = list(texts[start:start + batch_size])
+            future = pool.submit(with_retries, lambda b=batch: embed_batch(model, b), max_retries, backoff)
+            pending[future] = start
+        for future in list(pending):
+            store(pending.pop(future), future.result())
+    return result
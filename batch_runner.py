@@ -0,0 +1,162 @@
+"""Run the agent workflow over every session in a directory.
+
+    python batch_runner.py imu-data --output reports --concurrency 4 --rpm 100 --tpm 80000
+
+A session is a set of recordings in one directory that share a name apart
+from the hand, e.g. ``left_updown.js`` + ``right_updown.js``. Results go to
+``<output>/<session>/``: ``exercise_summary.md``, ``game_implementation.md``
+and ``results.json``. ``results.json`` is written last and records the
+source files it was built from. A rerun skips every session whose
+``results.json`` still matches its sources, so an interrupted batch resumes
+where it stopped.
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from agents import AgentSystem
+from checkpoints import CheckpointStore
+from imu_session import hand_from_filename
+from rate_limit import RateLimiter
+from session_cache import load_session
+
+RESULTS_FILE = "results.json"
+REPORT_FILES = {"exercise_summary": "exercise_summary.md", "game_implementation": "game_implementation.md"}
+
+
+@dataclass
+class SessionJob:
+    """One session found on disk."""
+    name: str
+    files: Dict[str, str]
+    patient_id: Optional[str] = None
+    sources: Dict[str, Dict] = field(default_factory=dict)
+
+
+def _session_stem(filename: str) -> str:
+    stem = re.sub(r"(?i)left|right", "", os.path.splitext(os.path.basename(filename))[0])
+    return stem.strip("_-. ") or "session"
+
+
+def discover_sessions(data_dir: str) -> List[SessionJob]:
+    """Find sessions in ``data_dir`` and its subdirectories.
+
+    The first directory level below ``data_dir`` is taken as the patient ID.
+    """
+    jobs = []
+    for root, dirs, filenames in os.walk(data_dir):
+        dirs.sort()
+        groups: Dict[str, Dict[str, str]] = {}
+        for filename in sorted(filenames):
+            if filename.endswith(".js"):
+                hand = hand_from_filename(filename)
+                groups.setdefault(_session_stem(filename), {}).setdefault(hand, os.path.join(root, filename))
+        relative = os.path.relpath(root, data_dir)
+        parts = [] if relative == "." else relative.split(os.sep)
+        for stem, files in sorted(groups.items()):
+            sources = {}
+            for source in files.values():
+                stat = os.stat(source)
+                sources[os.path.abspath(source)] = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+            jobs.append(SessionJob(name="/".join(parts + [stem]), files=files,
+                                   patient_id=parts[0] if parts else None, sources=sources))
+    return jobs
+
+
+def is_done(job: SessionJob, output_dir: str) -> bool:
+    """Whether ``output_dir`` already holds results built from the job's current sources."""
+    path = os.path.join(output_dir, job.name, RESULTS_FILE)
+    try:
+        with open(path, "r") as f:
+            return json.load(f).get("sources") == job.sources
+    except (OSError, json.JSONDecodeError):
+        return False
+
+
+def _write(path: str, text: str):
+    with open(f"{path}.tmp", "w") as f:
+        f.write(text)
+    os.replace(f"{path}.tmp", path)
+
+
+def write_results(job: SessionJob, output_dir: str, results: Dict):
+    """Write a session's reports, then its ``results.json`` marker."""
+    session_dir = os.path.join(output_dir, job.name)
+    os.makedirs(session_dir, exist_ok=True)
+    for key, filename in REPORT_FILES.items():
+        _write(os.path.join(session_dir, filename), results[key])
+    _write(os.path.join(session_dir, RESULTS_FILE),
+           json.dumps({"session": job.name, "sources": job.sources, "results": results}, indent=2))
+
+
+async def run_batch(agent_system: AgentSystem, jobs: List[SessionJob], output_dir: str,
+                    concurrency: int = 4, force: bool = False) -> Dict[str, str]:
+    """Process ``jobs`` with at most ``concurrency`` sessions in flight.
+
+    Returns each session's status: "done", "skipped" or the error message.
+    A failing session does not stop the batch and is retried on the next run.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    status: Dict[str, str] = {}
+
+    async def run(job: SessionJob):
+        if not force and is_done(job, output_dir):
+            status[job.name] = "skipped"
+            return
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                session = await asyncio.to_thread(load_session, job.files, "", None, job.patient_id, job.name)
+                results = await agent_system.aprocess_motion_data(session)
+                await asyncio.to_thread(write_results, job, output_dir, results)
+            except Exception as exc:
+                status[job.name] = f"{type(exc).__name__}: {exc}"
+                print(f"failed: {job.name}: {status[job.name]}")
+                return
+            status[job.name] = "done"
+            reused = results.get("checkpoint", {}).get("reused")
+            note = f", reused {', '.join(reused)}" if reused else ""
+            print(f"done: {job.name} ({time.perf_counter() - started:.1f}s{note})")
+
+    await asyncio.gather(*(run(job) for job in jobs))
+    return status
+
+
+def main(argv: Optional[List[str]] = None):
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description="Generate exercise reports for every session in a directory.")
+    parser.add_argument("data_dir", nargs="?", default="imu-data", help="Directory containing .js recordings")
+    parser.add_argument("--output", default="reports", help="Directory for the per-session reports")
+    parser.add_argument("--concurrency", type=int, default=4, help="Sessions processed at the same time")
+    parser.add_argument("--rpm", type=int, help="LLM requests per minute")
+    parser.add_argument("--tpm", type=int, help="LLM tokens per minute")
+    parser.add_argument("--force", action="store_true", help="Reprocess sessions that already have results")
+    parser.add_argument("--checkpoint-dir", help="Keep per-node checkpoints here; reruns only recompute stale nodes")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    openai_api_key = os.getenv("OPENAI_API_KEY")
+    if not openai_api_key:
+        raise ValueError("Please set OPENAI_API_KEY in .env file")
+
+    jobs = discover_sessions(args.data_dir)
+    print(f"Found {len(jobs)} session(s) in {args.data_dir}")
+    limiter = RateLimiter(args.rpm, args.tpm) if args.rpm or args.tpm else None
+    checkpoints = CheckpointStore(args.checkpoint_dir) if args.checkpoint_dir else None
+    agent_system = AgentSystem(openai_api_key, rate_limiter=limiter, checkpoints=checkpoints)
+    status = asyncio.run(run_batch(agent_system, jobs, args.output, args.concurrency, args.force))
+
+    counts = {key: sum(value == key for value in status.values()) for key in ("done", "skipped")}
+    failed = len(status) - counts["done"] - counts["skipped"]
+    print(f"{counts['done']} processed, {counts['skipped']} already done, {failed} failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Recall-vs-latency benchmark of the VectorStore index types against exact search.
+
+    python benchmark_index.py --vectors 50000 --dimension 64 --queries 1000
+
+Vectors are synthetic and clustered by default; pass ``--data-dir imu-data``
+to benchmark the local window embeddings of real recordings instead.
+"""
+import argparse
+import os
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from vector_store import INDEX_TYPES, VectorStore
+
+
+def synthetic_vectors(n: int, dimension: int, clusters: int = 256, seed: int = 0) -> np.ndarray:
+    """Gaussian clusters, closer to real embedding distributions than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dimension)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=n)
+    return centers[labels] + 0.3 * rng.normal(size=(n, dimension)).astype(np.float32)
+
+
+def recording_vectors(data_dir: str) -> np.ndarray:
+    """Local window embeddings of every ``.js`` recording in ``data_dir``."""
+    from imu_session import hand_from_filename
+    from session_cache import load_session
+    from window_embeddings import WindowEmbedder
+
+    embedder = WindowEmbedder(stride=1)
+    parts = []
+    for filename in sorted(os.listdir(data_dir)):
+        if filename.endswith(".js"):
+            session = load_session({hand_from_filename(filename): os.path.join(data_dir, filename)})
+            parts.append(embedder.embed_session(session)[0])
+    if not parts:
+        raise ValueError(f"No .js recordings in {data_dir}")
+    return np.concatenate(parts)
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    """Mean fraction of the true k nearest neighbours that were returned."""
+    k = truth.shape[1]
+    hits = sum(len(np.intersect1d(f[f >= 0], t)) for f, t in zip(found, truth))
+    return hits / (len(truth) * k)
+
+
+def benchmark(vectors: np.ndarray, queries: np.ndarray, k: int = 10,
+              configs: Optional[List[Dict]] = None) -> List[Dict]:
+    """Build each configured store, search ``queries`` and compare with the flat index."""
+    configs = configs or [{"index_type": index_type} for index_type in INDEX_TYPES]
+    dimension = vectors.shape[1]
+
+    exact = VectorStore(dimension=dimension)
+    exact.create_index(vectors)
+    _, truth = exact.index.search(queries, k)
+
+    results = []
+    for config in configs:
+        store = VectorStore(dimension=dimension, **config)
+        started = time.perf_counter()
+        store.create_index(vectors)
+        build_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        _, found = store.index.search(queries, k)
+        search_s = time.perf_counter() - started
+        results.append({
+            **config,
+            "build_s": build_s,
+            "latency_ms": 1000 * search_s / len(queries),
+            "recall": recall_at_k(found, truth),
+        })
+    return results
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vectors", type=int, default=50_000)
+    parser.add_argument("--dimension", type=int, default=64)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--data-dir", help="Use window embeddings of the recordings in this directory")
+    args = parser.parse_args(argv)
+
+    if args.data_dir:
+        vectors = recording_vectors(args.data_dir)
+    else:
+        vectors = synthetic_vectors(args.vectors, args.dimension)
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.choice(len(vectors), min(args.queries, len(vectors)), replace=False)]
+    queries = queries + 0.05 * rng.normal(size=queries.shape).astype(np.float32)
+
+    pq_m = 16 if vectors.shape[1] % 16 == 0 else 8
+    configs = [{"index_type": "flat"}]
+    for nprobe in (1, 8, 32):
+        configs.append({"index_type": "ivf_flat", "nprobe": nprobe})
+        configs.append({"index_type": "ivf_pq", "nprobe": nprobe, "pq_m": pq_m})
+    for ef_search in (16, 64, 256):
+        configs.append({"index_type": "hnsw", "ef_search": ef_search})
+
+    print(f"{len(vectors)} vectors, dimension {vectors.shape[1]}, {len(queries)} queries, k={args.k}")
+    print(f"{'index':<10} {'params':<16} {'build s':>9} {'ms/query':>9} {'recall':>7}")
+    for row in benchmark(vectors, queries.astype(np.float32), args.k, configs):
+        params = ", ".join(f"{key}={row[key]}" for key in ("nprobe", "ef_search", "pq_m") if key in row)
+        print(f"{row['index_type']:<10} {params:<16} {row['build_s']:>9.2f} "
+              f"{row['latency_ms']:>9.4f} {row['recall']:>7.3f}")
+
+
+if __name__ == "__main__":
+    main()
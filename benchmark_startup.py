@@ -0,0 +1,60 @@
+"""Startup and per-session setup cost of AgentSystem, with and without the shared caches.
+
+    python benchmark_startup.py --repeat 200
+
+No requests are sent: the OpenAI clients are constructed with a dummy key
+and only prompt parsing, chain composition and graph compilation are timed.
+"""
+import argparse
+import time
+from typing import Callable, List, Optional
+
+from langchain_core.prompts import ChatPromptTemplate
+
+from agents import AgentSystem, compiled_workflow
+from prompts import PROMPT_TEMPLATES, prompt_template
+
+
+def timed(fn: Callable[[], object], repeat: int) -> float:
+    """Mean milliseconds per call."""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return 1000 * (time.perf_counter() - started) / repeat
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    agent_system = AgentSystem("sk-benchmark")
+    first_ms = 1000 * (time.perf_counter() - started)
+    llm = agent_system.llm
+
+    def uncached():
+        # What every session paid before: parse all six templates and rebuild
+        # the chains (once per node call), plus compiling the graph
+        for template in PROMPT_TEMPLATES.values():
+            ChatPromptTemplate.from_template(template) | llm
+        compiled_workflow.__wrapped__()
+
+    def cached():
+        for name in PROMPT_TEMPLATES:
+            prompt_template(name) | llm
+        compiled_workflow()
+
+    rows = [
+        ("first AgentSystem() in process", first_ms),
+        ("AgentSystem() afterwards", timed(lambda: AgentSystem("sk-benchmark"), max(1, args.repeat // 20))),
+        ("per-session setup, uncached", timed(uncached, args.repeat)),
+        ("per-session setup, cached", timed(cached, args.repeat)),
+        ("per-session setup, prebuilt chains", timed(lambda: agent_system.chains["data_analyst"], args.repeat)),
+    ]
+    for label, ms in rows:
+        print(f"{label:<36} {ms:>9.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
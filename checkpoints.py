@@ -0,0 +1,79 @@
+"""Per-session checkpoints of the agent workflow.
+
+Each node's output is stored with a fingerprint of everything that produced
+it: the node, its prompt template, the model configuration and the state
+values the prompt reads. On a rerun a node whose fingerprint is unchanged
+returns its stored output without calling the LLM. A node downstream of a
+changed one sees different inputs, so it is recomputed. The pipeline
+therefore resumes from the first stale node, including after an interrupted
+run.
+"""
+import hashlib
+import json
+import os
+import re
+from typing import Dict, List, Optional
+
+DEFAULT_CHECKPOINT_DIR = ".checkpoints"
+
+
+def fingerprint(payload: Dict) -> str:
+    """Stable hash of a JSON-serializable payload."""
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class SessionCheckpoint:
+    """Node outputs and their input fingerprints for one session, saved after every node."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.nodes: Dict[str, Dict] = {}
+        self.reused: List[str] = []
+        self.computed: List[str] = []
+        if os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    self.nodes = json.load(f).get("nodes", {})
+            except (OSError, json.JSONDecodeError):
+                self.nodes = {}
+
+    def lookup(self, node: str, key: str) -> Optional[Dict]:
+        """Stored output of ``node`` if it was computed from the same inputs."""
+        entry = self.nodes.get(node)
+        if entry is None or entry["fingerprint"] != key:
+            return None
+        self.reused.append(node)
+        return entry["output"]
+
+    def record(self, node: str, key: str, output: Dict):
+        """Store a node's output and write the checkpoint file."""
+        self.nodes[node] = {"fingerprint": key, "output": output}
+        self.computed.append(node)
+        self.save()
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(f"{self.path}.tmp", "w") as f:
+            json.dump({"nodes": self.nodes}, f)
+        os.replace(f"{self.path}.tmp", self.path)
+
+
+class CheckpointStore:
+    """Directory of SessionCheckpoints, one JSON file per session."""
+
+    def __init__(self, directory: str = DEFAULT_CHECKPOINT_DIR):
+        self.directory = directory
+
+    def path_for(self, session_key: str) -> str:
+        safe = re.sub(r"[^A-Za-z0-9_.-]", "_", session_key)
+        digest = hashlib.sha256(session_key.encode("utf-8")).hexdigest()[:12]
+        return os.path.join(self.directory, f"{safe}-{digest}.json")
+
+    def for_session(self, session_key: str) -> SessionCheckpoint:
+        return SessionCheckpoint(self.path_for(session_key))
+
+    def clear(self, session_key: str):
+        """Forget a session so its next run recomputes every node."""
+        path = self.path_for(session_key)
+        if os.path.exists(path):
+            os.remove(path)
@@ -0,0 +1,209 @@
+import math
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from downsampling import CHARS_PER_TOKEN
+from imu_session import IMUSession, record_to_dict
+from motion_features import DEFAULT_SAMPLE_RATE
+from vector_store import document_metadata
+from windowing import describe_window, summarize_session
+
+DEFAULT_CONTEXT_TOKEN_BUDGET = 800
+CHANNELS = ("pitch", "roll", "yaw", "gyro")
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _sample_stats(raw: Dict) -> Dict[str, Dict[str, float]]:
+    """Window-style statistics of a single raw sample."""
+    gyro = math.sqrt(sum(raw["gyro"][axis] ** 2 for axis in ("x", "y", "z")))
+    values = {"pitch": raw["pos"]["pitch"], "roll": raw["pos"]["roll"], "yaw": raw["pos"]["yaw"], "gyro": gyro}
+    return {name: {"mean": v, "std": 0.0, "min": v, "max": v, "first": v, "last": v} for name, v in values.items()}
+
+
+def merge_stats(parts: List[Dict], weights: List[int]) -> Dict[str, float]:
+    """Combine per-segment statistics (ordered by start) into those of their union.
+
+    Means and variances are pooled by sample count, so samples shared by
+    overlapping windows are counted once per window.
+    """
+    w = np.asarray(weights, dtype=np.float64)
+    mean = np.array([p["mean"] for p in parts])
+    std = np.array([p["std"] for p in parts])
+    pooled = float(np.dot(w, mean) / w.sum())
+    second = float(np.dot(w, std ** 2 + mean ** 2) / w.sum())
+    return {
+        "mean": pooled,
+        "std": math.sqrt(max(second - pooled ** 2, 0.0)),
+        "min": min(p["min"] for p in parts),
+        "max": max(p["max"] for p in parts),
+        "first": parts[0]["first"],
+        "last": parts[-1]["last"],
+    }
+
+
+class ContextBuilder:
+    """Packs retrieved documents into an LLM context of at most ``token_budget`` tokens.
+
+    Results from the same session and hand whose sample ranges overlap or
+    touch are merged into one range, as long as it stays within
+    ``max_range_samples``. Raw samples are folded into the same summary
+    statistics as window documents (mean, range, change, peak angular
+    velocity) instead of being listed one by one. Ranges are then added in
+    order of their best match until the budget is used up.
+
+    ``choose_k`` sizes retrievals from the budget and from how many tokens
+    a retrieved result cost in the first packed context, clamped to
+    ``[min_k, max_k]``, so prompts and search time stay flat as the store
+    grows. The value is then kept for as long as ``token_budget`` stays the
+    same, so repeated queries ask for the same ``k`` and can be served from
+    a ``RetrievalCache``.
+    """
+
+    def __init__(self, token_budget: int = DEFAULT_CONTEXT_TOKEN_BUDGET, min_k: int = 3, max_k: int = 50,
+                 max_range_samples: int = 400, sample_rate: float = DEFAULT_SAMPLE_RATE):
+        self.token_budget = token_budget
+        self.min_k = min_k
+        self.max_k = max_k
+        self.max_range_samples = max_range_samples
+        self.sample_rate = sample_rate
+        # Running estimate of the context tokens one retrieved result costs
+        self.tokens_per_result = 80.0
+        self._measured = False
+        self._k: Optional[Tuple[int, int]] = None  # (token_budget, k) once settled
+
+    def choose_k(self) -> int:
+        """Number of results to retrieve for the next context."""
+        if self._k is not None and self._k[0] == self.token_budget:
+            return self._k[1]
+        k = int(self.token_budget / max(self.tokens_per_result, 1.0))
+        k = max(self.min_k, min(self.max_k, k))
+        if self._measured:
+            self._k = (self.token_budget, k)
+        return k
+
+    def _span(self, position: int, result: Dict) -> Dict:
+        document = result.get("document", result)
+        if isinstance(document, np.void):
+            document = record_to_dict(document)
+        metadata = document_metadata(document)
+        span = {"position": position, "distance": result.get("distance"), "results": 1,
+                "hand": metadata.get("hand"), "session": metadata.get("session", metadata.get("session_id")),
+                "start": None, "stop": None, "stats": None, "kind": metadata.get("kind", "window"),
+                "text": getattr(document, "text", None) or metadata.get("text"), "raw": None}
+        if "start" in metadata:
+            span["start"] = int(metadata["start"])
+            span["stop"] = int(metadata.get("stop", metadata["start"] + 1))
+            span["stats"] = metadata.get("stats")
+        raw = metadata.get("raw_data", document if isinstance(document, dict) and "pos" in document else None)
+        if raw is not None:
+            span.update(raw=raw, stats=_sample_stats(raw), kind="sample")
+            if "timestamp" in metadata and isinstance(metadata["timestamp"], (int, np.integer)):
+                span["start"], span["stop"] = int(metadata["timestamp"]), int(metadata["timestamp"]) + 1
+        return span
+
+    def _extends(self, group: List[Dict], span: Dict) -> bool:
+        """Whether ``span`` overlaps or touches the range covered by ``group``."""
+        head = group[0]
+        stop = max(s["stop"] for s in group)
+        return ((head["session"], head["hand"]) == (span["session"], span["hand"])
+                and (head["stats"] is None) == (span["stats"] is None)
+                and span["start"] <= stop
+                and max(stop, span["stop"]) - head["start"] <= self.max_range_samples)
+
+    @staticmethod
+    def _merge(group: List[Dict]) -> Dict:
+        if len(group) == 1:
+            return group[0]
+        first = group[0]
+        merged = dict(first, raw=None, text=None, results=sum(s["results"] for s in group),
+                      stop=max(s["stop"] for s in group),
+                      position=min(s["position"] for s in group),
+                      distance=min((s["distance"] for s in group if s["distance"] is not None), default=None))
+        kind = "samples" if first["kind"] == "sample" else f"{first['kind']}s"
+        merged["kind"] = f"range of {len(group)} {kind}"
+        if first["stats"] is not None:
+            weights = [s["stop"] - s["start"] for s in group]
+            merged["stats"] = {name: merge_stats([s["stats"][name] for s in group], weights) for name in CHANNELS}
+        return merged
+
+    def merge(self, spans: List[Dict]) -> List[Dict]:
+        """Merge overlapping or touching spans; spans without a sample range are kept as they are."""
+        ranged = sorted((s for s in spans if s["start"] is not None),
+                        key=lambda s: (str(s["session"]), str(s["hand"]), s["start"], s["stop"]))
+        merged = [s for s in spans if s["start"] is None]
+        group: List[Dict] = []
+        for span in ranged:
+            if group and not self._extends(group, span):
+                merged.append(self._merge(group))
+                group = []
+            group.append(span)
+        if group:
+            merged.append(self._merge(group))
+        return merged
+
+    def render(self, span: Dict, number: int) -> str:
+        if span["stats"] is not None and span["start"] is not None and (span["raw"] is None or span["results"] > 1):
+            samples = span["stop"] - span["start"]
+            summary = dict(span["stats"], kind=span["kind"], hand=span["hand"] or "unknown", start=span["start"],
+                           stop=span["stop"], duration_s=samples / self.sample_rate)
+            return f"Motion Pattern {number}:\n{describe_window(summary)}\n"
+        if span["text"] is not None:
+            return f"Motion Pattern {number}:\n{span['text']}\n"
+        if span["raw"] is not None:
+            raw = span["raw"]
+            return (
+                f"Motion Pattern {number}:\n"
+                f"- Position: Pitch={raw['pos']['pitch']:.2f}, "
+                f"Roll={raw['pos']['roll']:.2f}, "
+                f"Yaw={raw['pos']['yaw']:.2f}\n"
+                f"- Movement: X={raw['gyro']['x']:.2f}, "
+                f"Y={raw['gyro']['y']:.2f}, "
+                f"Z={raw['gyro']['z']:.2f}\n"
+            )
+        where = f"{span['hand'] or 'unknown'} hand, samples {span['start']}-{span['stop']}"
+        return f"Motion Pattern {number}:\nMotion {span['kind']} ({where})\n"
+
+    def pack(self, spans: List[Dict]) -> str:
+        """Render spans in order until the token budget is used up."""
+        blocks, used, results = [], 0, 0
+        for span in spans:
+            block = self.render(span, len(blocks) + 1)
+            tokens = estimate_tokens(block) + 1
+            if used + tokens > self.token_budget:
+                if blocks:
+                    break
+                # Always keep something: cut the best match down to the budget
+                block = block[:int(self.token_budget * CHARS_PER_TOKEN)]
+                tokens = self.token_budget
+            blocks.append(block)
+            used += tokens
+            results += span["results"]
+        if results:
+            self.tokens_per_result = 0.5 * self.tokens_per_result + 0.5 * used / results
+            self._measured = True
+        return "\n".join(blocks)
+
+    def session_spans(self, session: IMUSession) -> List[Dict]:
+        """Non-overlapping windows over a whole session, sized so that all of them fit the budget."""
+        rate = session.sample_rate or self.sample_rate
+        windows = max(int(self.token_budget / self.tokens_per_result), 1)
+        window = max(math.ceil(len(session) / windows), 1)
+        spans = []
+        for summary in summarize_session(session, window, window, sample_rate=rate):
+            spans.append({"position": len(spans), "distance": None, "results": 1, "hand": summary["hand"],
+                          "session": session.session_id, "start": summary["start"], "stop": summary["stop"],
+                          "stats": {name: summary[name] for name in CHANNELS}, "kind": summary["kind"],
+                          "text": None, "raw": None})
+        return spans
+
+    def build(self, retrieved_docs: Union[List[Dict], IMUSession]) -> str:
+        """Context text for search results (best first) or for a whole session."""
+        if isinstance(retrieved_docs, IMUSession):
+            return self.pack(self.session_spans(retrieved_docs))
+        spans = self.merge([self._span(i, result) for i, result in enumerate(retrieved_docs)])
+        spans.sort(key=lambda s: (s["distance"] is None, s["distance"] or 0.0, s["position"]))
+        return self.pack(spans)
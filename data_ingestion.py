@@ -1,86 +1,125 @@
 import os
-import json
-from typing import List, Dict
+from typing import List, Dict, Optional, Union
 import numpy as np
 from llama_index.core.schema import Document
 from llama_index.embeddings.openai import OpenAIEmbedding
+from imu_parser import IMUStreamParser, ParseStats, open_recording
+from imu_session import HAND_CODES, IMUSession, hand_from_filename, record_to_dict, samples_from_matrix
+from session_cache import cached_parse_stats, load_recording
+from batch_embedding import embed_texts
+from embedding_cache import CachedEmbeddings, EmbeddingCache
+from windowing import DEFAULT_STRIDE, DEFAULT_WINDOW, window_documents
 
 class IMUDataProcessor:
-    def __init__(self, data_dir: str):
+    def __init__(self, data_dir: str, use_cache: bool = True, embed_model=None,
+                 embed_batch_size: int = 100, max_in_flight: int = 4,
+                 embedding_cache: Optional[EmbeddingCache] = None):
         self.data_dir = data_dir
-        self.embed_model = OpenAIEmbedding()
+        self.use_cache = use_cache
+        self.embedding_cache = embedding_cache if embedding_cache is not None else EmbeddingCache()
+        self.embed_model = CachedEmbeddings(embed_model or OpenAIEmbedding(), self.embedding_cache)
+        self.embed_batch_size = embed_batch_size
+        self.max_in_flight = max_in_flight
+        self.parse_stats: Dict[str, ParseStats] = {}
+
+    def load_imu_data(self) -> IMUSession:
+        """Load IMU data from files.
+
+        The hand is taken from the file name (``left_*.js`` / ``right_*.js``);
+        several files for the same hand are appended in name order. With
+        ``use_cache`` the recordings are memory-mapped from their binary cache
+        (see ``session_cache``) and only re-parsed when they change; their
+        ``parse_stats`` come from the cache metadata.
+        """
+        arrays: Dict[str, List[np.ndarray]] = {}
+        self.parse_stats = {}
 
-    def load_imu_data(self) -> List[Dict]:
-        """Load IMU data from files."""
-        all_data = []
-        
         # Get all .js files in the data directory
-        for filename in os.listdir(self.data_dir):
+        for filename in sorted(os.listdir(self.data_dir)):
             if filename.endswith('.js'):
                 file_path = os.path.join(self.data_dir, filename)
-                with open(file_path, 'r') as f:
-                    content = f.read()
-                    # Extract the array from the JavaScript file
-                    # Remove 'data=' from the beginning
-                    content = content.replace('data=', '').strip()
-                    
-                    # Split into lines and process each line
-                    lines = content.split('\n')
-                    json_lines = []
-                    for line in lines:
-                        line = line.strip()
-                        if line.startswith('['):
-                            line = line[1:]  # Remove opening bracket
-                        elif line.endswith(']'):
-                            line = line[:-1]  # Remove closing bracket
-                        
-                        # Skip empty lines and lines with only commas
-                        if line and not line.strip().startswith(','):
-                            # Remove leading comma if present
-                            if line.startswith(','):
-                                line = line[1:].strip()
-                            try:
-                                data_point = json.loads(line)
-                                json_lines.append(data_point)
-                            except json.JSONDecodeError:
-                                # Skip invalid JSON lines
-                                continue
-                    
-                    all_data.extend(json_lines)
-        
-        return all_data
-
-    def create_documents(self, imu_data: List[Dict]) -> List[Document]:
-        """Create Document objects from IMU data."""
+                hand = hand_from_filename(filename)
+                if self.use_cache:
+                    samples = load_recording(file_path, hand)
+                    self.parse_stats[file_path] = cached_parse_stats(file_path)
+                else:
+                    with open_recording(file_path) as f:
+                        parser = IMUStreamParser(f)
+                        samples = samples_from_matrix(parser.read_array(), hand)
+                    self.parse_stats[file_path] = parser.stats
+                arrays.setdefault(hand, []).append(samples)
+
+        hands = {}
+        for hand, parts in arrays.items():
+            if len(parts) == 1:
+                hands[hand] = parts[0]
+                continue
+            samples = np.concatenate(parts)
+            samples["index"] = np.arange(len(samples), dtype=np.int32)
+            hands[hand] = samples
+        return IMUSession(hands)
+
+    def create_documents(self, imu_data: Union[IMUSession, List[Dict]], per_sample: bool = False,
+                         window: int = DEFAULT_WINDOW, stride: int = DEFAULT_STRIDE,
+                         align_to_reps: bool = False) -> List[Document]:
+        """Create Document objects from IMU data.
+
+        A session is indexed as one document per motion window (see
+        ``create_window_documents``) unless ``per_sample`` is set; a plain
+        list of sample dicts always gets one document per sample.
+        """
+        if isinstance(imu_data, IMUSession) and not per_sample:
+            return self.create_window_documents(imu_data, window, stride, align_to_reps)
+        if isinstance(imu_data, IMUSession):
+            samples = imu_data.samples()
+            records = zip(samples["index"].tolist(), samples["hand"].tolist(),
+                          (record_to_dict(record) for record in samples))
+        else:
+            records = ((i, None, data_point) for i, data_point in enumerate(imu_data))
+
         documents = []
-        
-        for i, data_point in enumerate(imu_data):
+        hand_names = {code: name for name, code in HAND_CODES.items()}
+
+        for i, hand, data_point in records:
             # Create a descriptive text representation of the IMU data
             text = f"""Motion data point {i}:
 Position: Pitch={data_point['pos']['pitch']:.2f}°, Roll={data_point['pos']['roll']:.2f}°, Yaw={data_point['pos']['yaw']:.2f}°
 Gyroscope: X={data_point['gyro']['x']:.2f}, Y={data_point['gyro']['y']:.2f}, Z={data_point['gyro']['z']:.2f}
 Compass: X={data_point['compass']['x']:.2f}, Y={data_point['compass']['y']:.2f}, Z={data_point['compass']['z']:.2f}
 Temperature: {data_point['temp']:.2f}°C"""
-            
+
+            metadata = {
+                "raw_data": data_point,
+                "timestamp": i,  # Using index as timestamp since actual timestamps aren't provided
+            }
+            if hand is not None:
+                metadata["hand"] = hand_names[hand]
+
             # Create Document with metadata
-            doc = Document(
-                text=text,
-                metadata={
-                    "raw_data": data_point,
-                    "timestamp": i,  # Using index as timestamp since actual timestamps aren't provided
-                }
-            )
-            documents.append(doc)
-        
+            documents.append(Document(text=text, metadata=metadata))
+
         return documents
 
+    def create_window_documents(self, session: IMUSession, window: int = DEFAULT_WINDOW,
+                                stride: int = DEFAULT_STRIDE, align_to_reps: bool = False) -> List[Document]:
+        """Create one Document per motion window (or repetition) with aggregated statistics.
+
+        This keeps the index a small fraction of the per-sample size and makes
+        each retrieved result describe a whole movement segment.
+        """
+        return [Document(text=text, metadata=metadata)
+                for text, metadata in window_documents(session, window, stride, align_to_reps)]
+
     def get_embeddings(self, documents: List[Document]) -> np.ndarray:
-        """Generate embeddings for the documents using OpenAI."""
-        embeddings = []
-        
-        for doc in documents:
-            # Use OpenAI to get embeddings
-            embedding = self.embed_model.get_text_embedding(doc.text)
-            embeddings.append(embedding)
-        
-        return np.array(embeddings)
+        """Generate embeddings for the documents using OpenAI.
+
+        Texts are sent in batches of ``embed_batch_size`` with up to
+        ``max_in_flight`` requests running concurrently; rate limits and
+        transient errors are retried with backoff.
+        """
+        return embed_texts(
+            self.embed_model,
+            [doc.text for doc in documents],
+            batch_size=self.embed_batch_size,
+            max_in_flight=self.max_in_flight,
+        )
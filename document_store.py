@@ -0,0 +1,166 @@
+"""Offset-indexed, memory-mapped document store for VectorStore.
+
+A saved store is a directory holding
+
+- ``ids.npy``: sorted int64 vector IDs
+- ``offsets.npy``: uint64 byte offsets, one more than there are IDs
+- ``data.bin``: the JSON-encoded documents back to back
+
+``ids.npy`` and ``offsets.npy`` are memory-mapped and ``data.bin`` is read
+through ``np.memmap``, so ``get(i)`` decodes just that record. Unlike the
+old pickled ``document_map`` nothing executable is ever loaded.
+"""
+import json
+import os
+import pickle
+import shutil
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterator, Optional
+
+import numpy as np
+
+LLAMA_DOCUMENT = "llama_document"
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def encode_document(document) -> bytes:
+    """Serialize a dict document or a LlamaIndex Document to UTF-8 JSON."""
+    if not isinstance(document, dict) and hasattr(document, "text") and hasattr(document, "metadata"):
+        document = {"__type__": LLAMA_DOCUMENT, "text": document.text, "metadata": document.metadata}
+    return json.dumps(document, default=_json_default, separators=(",", ":")).encode("utf-8")
+
+
+def decode_document(data: bytes):
+    """Inverse of ``encode_document``."""
+    document = json.loads(data)
+    if isinstance(document, dict) and document.get("__type__") == LLAMA_DOCUMENT:
+        from llama_index.core.schema import Document
+        return Document(text=document["text"], metadata=document["metadata"])
+    return document
+
+
+class DocumentStore(MutableMapping):
+    """Mapping of vector ID to document backed by an on-disk store.
+
+    Reads go to the memory-mapped base files; writes and deletions are kept
+    in memory until the next ``write``.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._ids = np.empty(0, dtype=np.int64)
+        self._offsets = np.zeros(1, dtype=np.uint64)
+        self._data = np.empty(0, dtype=np.uint8)
+        self._overlay: Dict[int, Any] = {}
+        self._deleted = set()
+        if path is not None:
+            self._ids = np.load(os.path.join(path, "ids.npy"), mmap_mode="r")
+            self._offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+            data_path = os.path.join(path, "data.bin")
+            if os.path.getsize(data_path):
+                self._data = np.memmap(data_path, dtype=np.uint8, mode="r")
+
+    def _row(self, key: int) -> int:
+        row = int(np.searchsorted(self._ids, key))
+        if row < len(self._ids) and self._ids[row] == key:
+            return row
+        return -1
+
+    def __getitem__(self, key):
+        key = int(key)
+        if key in self._overlay:
+            return self._overlay[key]
+        if key in self._deleted:
+            raise KeyError(key)
+        row = self._row(key)
+        if row < 0:
+            raise KeyError(key)
+        start, stop = int(self._offsets[row]), int(self._offsets[row + 1])
+        return decode_document(self._data[start:stop].tobytes())
+
+    def __contains__(self, key) -> bool:
+        try:
+            key = int(key)
+        except (TypeError, ValueError):
+            return False
+        if key in self._overlay:
+            return True
+        return key not in self._deleted and self._row(key) >= 0
+
+    def __setitem__(self, key, document):
+        key = int(key)
+        self._overlay[key] = document
+        self._deleted.discard(key)
+
+    def __delitem__(self, key):
+        key = int(key)
+        if key not in self:
+            raise KeyError(key)
+        self._overlay.pop(key, None)
+        if self._row(key) >= 0:
+            self._deleted.add(key)
+
+    def __iter__(self) -> Iterator[int]:
+        for key in self._ids.tolist():
+            if key not in self._deleted and key not in self._overlay:
+                yield key
+        yield from self._overlay
+
+    def __len__(self) -> int:
+        base = sum(1 for key in self._overlay if self._row(key) >= 0)
+        return len(self._ids) - len(self._deleted) - base + len(self._overlay)
+
+    def copy(self) -> "DocumentStore":
+        """Shallow copy sharing the memory-mapped base files."""
+        other = DocumentStore()
+        other.path, other._ids, other._offsets, other._data = self.path, self._ids, self._offsets, self._data
+        other._overlay = dict(self._overlay)
+        other._deleted = set(self._deleted)
+        return other
+
+    @staticmethod
+    def write(path: str, documents: MutableMapping) -> "DocumentStore":
+        """Write ``documents`` to ``path`` (replacing any store there) and open it.
+
+        Files are written to a sibling directory first and swapped in, so a
+        store that is currently memory-mapped from ``path`` stays readable.
+        """
+        tmp_path, old_path = f"{path}.tmp", f"{path}.old"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+
+        ids = np.array(sorted(int(key) for key in documents), dtype=np.int64)
+        offsets = np.zeros(len(ids) + 1, dtype=np.uint64)
+        with open(os.path.join(tmp_path, "data.bin"), "wb") as f:
+            position = 0
+            for row, key in enumerate(ids.tolist()):
+                encoded = encode_document(documents[key])
+                f.write(encoded)
+                position += len(encoded)
+                offsets[row + 1] = position
+        np.save(os.path.join(tmp_path, "ids.npy"), ids)
+        np.save(os.path.join(tmp_path, "offsets.npy"), offsets)
+
+        shutil.rmtree(old_path, ignore_errors=True)
+        if os.path.exists(path):
+            os.replace(path, old_path)
+        os.replace(tmp_path, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+        return DocumentStore(path)
+
+
+def migrate_pickle_docs(filepath: str) -> DocumentStore:
+    """Convert a legacy ``{filepath}.docs`` pickle into ``{filepath}.docstore``.
+
+    Only run this on pickles you created yourself: unpickling executes code.
+    """
+    with open(f"{filepath}.docs", "rb") as f:
+        documents = pickle.load(f)
+    return DocumentStore.write(f"{filepath}.docstore", documents)
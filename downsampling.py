@@ -0,0 +1,160 @@
+import json
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+from imu_session import IMUSession, record_to_dict
+from motion_features import segment_argext
+
+# Rough OpenAI tokenizer ratio for JSON-heavy text.
+CHARS_PER_TOKEN = 4.0
+
+# Raw-sample share of the data analyst prompt when no budget is given.
+DEFAULT_TOKEN_BUDGET = 2000
+
+
+def _bucket_edges(n: int, buckets: int) -> np.ndarray:
+    return np.unique(np.linspace(0, n, buckets + 1).astype(np.int64))
+
+
+def _nothing() -> np.ndarray:
+    return np.empty(0, dtype=np.int64)
+
+
+class Downsampler(ABC):
+    """Chooses which sample indices of one hand to keep."""
+
+    @abstractmethod
+    def select(self, samples: np.ndarray, n_points: int) -> np.ndarray:
+        """Return sorted indices into ``samples``, at most ``n_points`` long (none if ``n_points < 1``)."""
+
+
+class StrideDownsampler(Downsampler):
+    """Evenly spaced samples; the previous fixed ``[::10]`` behaviour."""
+
+    def select(self, samples: np.ndarray, n_points: int) -> np.ndarray:
+        n = len(samples)
+        if n_points < 1:
+            return _nothing()
+        if n_points >= n:
+            return np.arange(n)
+        step = int(np.ceil(n / n_points))
+        return np.arange(0, n, step)
+
+
+class LTTBDownsampler(Downsampler):
+    """Largest-Triangle-Three-Buckets on a single channel.
+
+    Keeps the visually significant shape of the curve; the per-bucket area
+    computation is vectorized so the loop runs once per output point.
+    """
+
+    def __init__(self, channel: str = "pitch"):
+        self.channel = channel
+
+    def select(self, samples: np.ndarray, n_points: int) -> np.ndarray:
+        y = samples[self.channel].astype(np.float64)
+        n = len(y)
+        if n_points < 1:
+            return _nothing()
+        if n_points >= n or n <= 2:
+            return np.arange(n)
+        if n_points < 3:
+            return np.array([0, n - 1])[:n_points]
+
+        # Interior points 1..n-2 split into n_points - 2 buckets.
+        edges = np.linspace(1, n - 1, n_points - 1).astype(np.int64)
+        sums = np.add.reduceat(y[1:n - 1], edges[:-1] - 1)
+        counts = np.diff(edges)
+        means = sums / np.maximum(counts, 1)
+        centers = (edges[:-1] + edges[1:] - 1) / 2.0
+
+        selected = np.empty(n_points, dtype=np.int64)
+        selected[0], selected[-1] = 0, n - 1
+        a = 0
+        for i in range(n_points - 2):
+            lo, hi = edges[i], edges[i + 1]
+            if i + 1 < n_points - 2:
+                cx, cy = centers[i + 1], means[i + 1]
+            else:
+                cx, cy = n - 1, y[-1]
+            xs = np.arange(lo, hi)
+            area = np.abs((a - cx) * (y[lo:hi] - y[a]) - (a - xs) * (cy - y[a]))
+            a = lo + int(np.argmax(area))
+            selected[i + 1] = a
+        return selected
+
+
+class ExtremaDownsampler(Downsampler):
+    """Per-bucket minimum and maximum of each channel.
+
+    Defaults to pitch plus gyroscope magnitude so peaks, troughs and direction
+    reversals survive even at high compression. The first and last samples
+    and each channel's global extrema are always kept when ``n_points``
+    allows; bucket extrema fill the rest.
+    """
+
+    def __init__(self, channels: Sequence[str] = ("pitch", "gyro")):
+        self.channels = tuple(channels)
+
+    def _channel(self, samples: np.ndarray, name: str) -> np.ndarray:
+        if name == "gyro":
+            gyro = np.stack([samples["gyro_x"], samples["gyro_y"], samples["gyro_z"]], axis=1)
+            return np.linalg.norm(gyro.astype(np.float64), axis=1)
+        return samples[name].astype(np.float64)
+
+    def select(self, samples: np.ndarray, n_points: int) -> np.ndarray:
+        n = len(samples)
+        if n_points < 1:
+            return _nothing()
+        if n_points >= n:
+            return np.arange(n)
+        values = [self._channel(samples, name) for name in self.channels]
+        # Picks in priority order: endpoints, global extrema, then bucket extrema
+        picks = [np.array([0, n - 1])]
+        picks += [np.array([v.argmax(), v.argmin()]) for v in values]
+        # Every global extremum is also a bucket extremum, so the buckets
+        # only have to leave room for the two endpoints
+        per_bucket = 2 * len(self.channels)
+        starts = _bucket_edges(n, max((n_points - 2) // per_bucket, 1))[:-1]
+        lengths = np.diff(np.append(starts, n))
+        for v in values:
+            picks.append(segment_argext(v, starts, lengths, use_max=True))
+            picks.append(segment_argext(v, starts, lengths, use_max=False))
+        ordered = np.concatenate(picks).astype(np.int64)
+        _, first = np.unique(ordered, return_index=True)
+        return np.sort(ordered[np.sort(first)[:n_points]])
+
+
+def estimate_tokens_per_sample(samples: np.ndarray, probe: int = 16) -> float:
+    """Estimate prompt tokens per serialized sample from a few records."""
+    if len(samples) == 0:
+        return 0.0
+    step = max(len(samples) // probe, 1)
+    probes = [json.dumps(record_to_dict(record)) for record in samples[::step][:probe]]
+    # +2 for the ", " separator between list items
+    return (sum(len(p) for p in probes) / len(probes) + 2) / CHARS_PER_TOKEN
+
+
+def points_for_budget(session: IMUSession, token_budget: int) -> Dict[str, int]:
+    """Split a token budget across hands in proportion to their sample counts."""
+    total = len(session)
+    if total == 0:
+        return {hand: 0 for hand in session.hands}
+    points = {}
+    for hand in session.hands:
+        samples = session.samples(hand)
+        per_sample = estimate_tokens_per_sample(samples)
+        share = token_budget * len(samples) / total
+        points[hand] = int(share // per_sample) if per_sample else 0
+    return points
+
+
+def downsample(session: IMUSession, token_budget: int = DEFAULT_TOKEN_BUDGET,
+               downsampler: Optional[Downsampler] = None) -> IMUSession:
+    """Reduce a session so its JSON fits roughly within ``token_budget`` tokens."""
+    downsampler = downsampler or ExtremaDownsampler()
+    budgets = points_for_budget(session, token_budget)
+    indices = {hand: downsampler.select(session.samples(hand), budgets[hand]) for hand in session.hands}
+    return session.take(indices)
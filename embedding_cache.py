@@ -0,0 +1,201 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from batch_embedding import embed_batch
+
+DEFAULT_CACHE_PATH = ".embedding_cache/embeddings.sqlite"
+# Overrides DEFAULT_CACHE_PATH for caches created without an explicit path
+CACHE_PATH_ENV = "EMBEDDING_CACHE_PATH"
+
+
+def model_name_of(model) -> str:
+    """Best-effort model identifier for LlamaIndex and LangChain embedding models."""
+    return str(getattr(model, "model_name", None) or getattr(model, "model", None) or type(model).__name__)
+
+
+def cache_key(model_name: str, text: str) -> str:
+    """Content address of one text under one embedding model."""
+    return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """SQLite-backed embedding cache with an in-memory LRU in front.
+
+    Vectors are stored as float32 blobs keyed by ``cache_key``. The disk table
+    is bounded by ``max_entries``; the least recently used rows are evicted
+    first. Without a ``path`` the cache lives at ``$EMBEDDING_CACHE_PATH`` or
+    ``DEFAULT_CACHE_PATH``. The file is only created on the first lookup or
+    store, so constructing a cache that is never used touches no disk.
+    """
+
+    def __init__(self, path: Optional[str] = None, memory_items: int = 10000,
+                 max_entries: int = 1_000_000):
+        self.path = path or os.environ.get(CACHE_PATH_ENV) or DEFAULT_CACHE_PATH
+        self.memory_items = memory_items
+        self.max_entries = max_entries
+        self.memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.memory_hits = 0
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        """SQLite connection, opened (and the table created) on first use; call with the lock held."""
+        if self._db is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings(last_used)")
+            conn.commit()
+            self._db = conn
+        return self._db
+
+    def _remember(self, key: str, vector: np.ndarray):
+        self.memory[key] = vector
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_items:
+            self.memory.popitem(last=False)
+
+    def get_many(self, keys: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Look up vectors for ``keys``; missing entries come back as None."""
+        with self._lock:
+            found: Dict[str, np.ndarray] = {}
+            disk_keys = set()
+            memory_hits = 0
+            for key in keys:
+                if key in self.memory:
+                    self.memory.move_to_end(key)
+                    found[key] = self.memory[key]
+                    memory_hits += 1
+                else:
+                    disk_keys.add(key)
+            disk_keys = list(disk_keys)
+
+            now = time.time()
+            for i in range(0, len(disk_keys), 500):
+                chunk = disk_keys[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                for key, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32)
+                    found[key] = vector
+                    self._remember(key, vector)
+                if rows:
+                    self._conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?",
+                                           [(now, key) for key, _ in rows])
+            if disk_keys:
+                self._conn.commit()
+
+            results = [found.get(key) for key in keys]
+            hits = sum(result is not None for result in results)
+            self.hits += hits
+            self.misses += len(keys) - hits
+            self.memory_hits += memory_hits
+            return results
+
+    def put_many(self, keys: Sequence[str], vectors: Sequence[Sequence[float]]):
+        """Store vectors and evict the least recently used rows over ``max_entries``."""
+        with self._lock:
+            now = time.time()
+            rows = []
+            for key, vector in zip(keys, vectors):
+                vector = np.asarray(vector, dtype=np.float32)
+                self._remember(key, vector)
+                rows.append((key, vector.tobytes(), now))
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)", rows)
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters since construction."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.hits - self.memory_hits,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def __len__(self) -> int:
+        with self._lock:
+            if self._db is None and not os.path.exists(self.path):
+                return 0
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+class CachedEmbeddings(Embeddings):
+    """Wrap an embedding model so repeated texts are served from an EmbeddingCache.
+
+    Usable wherever LangChain expects ``Embeddings`` and by ``embed_texts``
+    (it also exposes the LlamaIndex ``get_text_embedding*`` methods).
+    """
+
+    def __init__(self, model, cache: EmbeddingCache, model_name: Optional[str] = None):
+        self.model = model
+        self.cache = cache
+        self.model_name = model_name or model_name_of(model)
+
+    def _embed(self, texts: List[str], query: bool = False) -> List[List[float]]:
+        keys = [cache_key(self.model_name, text) for text in texts]
+        cached = self.cache.get_many(keys)
+        missing = [i for i, vector in enumerate(cached) if vector is None]
+        if missing:
+            # Embed each distinct missing text once
+            unique: Dict[str, int] = {}
+            for i in missing:
+                unique.setdefault(keys[i], i)
+            order = list(unique.values())
+            if query and hasattr(self.model, "embed_query"):
+                fresh = [self.model.embed_query(texts[order[0]])]
+            elif query and hasattr(self.model, "get_query_embedding"):
+                fresh = [self.model.get_query_embedding(texts[order[0]])]
+            else:
+                fresh = embed_batch(self.model, [texts[i] for i in order])
+            self.cache.put_many([keys[i] for i in order], fresh)
+            by_key = {keys[i]: np.asarray(vector, dtype=np.float32) for i, vector in zip(order, fresh)}
+            cached = [vector if vector is not None else by_key[key] for vector, key in zip(cached, keys)]
+        return [vector.tolist() for vector in cached]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(list(texts))
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text], query=True)[0]
+
+    def get_text_embedding_batch(self, texts: List[str], **kwargs) -> List[List[float]]:
+        return self._embed(list(texts))
+
+    def get_text_embedding(self, text: str) -> List[float]:
+        return self._embed([text])[0]
+
+    def get_query_embedding(self, query: str) -> List[float]:
+        return self._embed([query], query=True)[0]
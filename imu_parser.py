@@ -0,0 +1,135 @@
+import io
+import json
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+# Column order used whenever samples are stored as a float32 matrix.
+CHANNELS = (
+    "pitch", "roll", "yaw",
+    "gyro_x", "gyro_y", "gyro_z",
+    "compass_x", "compass_y", "compass_z",
+    "temp",
+)
+
+
+@dataclass
+class ParseStats:
+    """Counters collected while parsing a recording."""
+    lines: int = 0
+    samples: int = 0
+    skipped: int = 0
+    skipped_lines: List[int] = field(default_factory=list)
+
+    def record_skip(self, line_number: int, max_reported: int):
+        self.skipped += 1
+        if len(self.skipped_lines) < max_reported:
+            self.skipped_lines.append(line_number)
+
+
+def sample_to_row(sample: Dict) -> tuple:
+    """Flatten a nested IMU sample dict into a tuple ordered like CHANNELS."""
+    pos, gyro, compass = sample["pos"], sample["gyro"], sample["compass"]
+    return (
+        float(pos["pitch"]), float(pos["roll"]), float(pos["yaw"]),
+        float(gyro["x"]), float(gyro["y"]), float(gyro["z"]),
+        float(compass["x"]), float(compass["y"]), float(compass["z"]),
+        float(sample["temp"]),
+    )
+
+
+def _strip_line(line: str) -> str:
+    """Remove the JavaScript wrapper and list separators around one sample."""
+    line = line.strip()
+    if line.startswith("data="):
+        line = line[len("data="):].lstrip()
+    if line.startswith("["):
+        line = line[1:].lstrip()
+    if line.endswith("]"):
+        line = line[:-1].rstrip()
+    return line.strip(", \t")
+
+
+PARSE_ERRORS = (json.JSONDecodeError, KeyError, TypeError, ValueError)
+
+
+def parse_line(line: Union[str, bytes]) -> Optional[Tuple[Dict, tuple]]:
+    """Parse one line of a recording or live stream into (sample, row).
+
+    Returns None for blank and wrapper lines; raises one of PARSE_ERRORS for
+    malformed ones.
+    """
+    if isinstance(line, bytes):
+        line = line.decode("utf-8", errors="replace")
+    line = _strip_line(line)
+    if not line:
+        return None
+    sample = json.loads(line)
+    return sample, sample_to_row(sample)
+
+
+class IMUStreamParser:
+    """Incremental parser for ``data=[...]`` IMU recordings.
+
+    Works on any iterable of lines (text file, binary file, socket ``makefile``
+    or pipe), holds at most one line in memory and counts malformed rows in
+    ``stats`` instead of silently dropping them.
+    """
+
+    def __init__(self, stream: Iterable[Union[str, bytes]], max_reported_errors: int = 20):
+        self.stream = stream
+        self.max_reported_errors = max_reported_errors
+        self.stats = ParseStats()
+
+    def _parsed(self) -> Iterator[Tuple[Dict, tuple]]:
+        for line in self.stream:
+            self.stats.lines += 1
+            try:
+                parsed = parse_line(line)
+            except PARSE_ERRORS:
+                self.stats.record_skip(self.stats.lines, self.max_reported_errors)
+                continue
+            if parsed is None:
+                continue
+            self.stats.samples += 1
+            yield parsed
+
+    def samples(self) -> Iterator[Dict]:
+        """Yield each well-formed sample as a nested dict."""
+        for sample, _ in self._parsed():
+            yield sample
+
+    def batches(self, batch_size: int = 4096) -> Iterator[np.ndarray]:
+        """Yield float32 arrays of shape (<= batch_size, len(CHANNELS))."""
+        batch = np.empty((batch_size, len(CHANNELS)), dtype=np.float32)
+        filled = 0
+        for _, row in self._parsed():
+            batch[filled] = row
+            filled += 1
+            if filled == batch_size:
+                yield batch
+                batch = np.empty((batch_size, len(CHANNELS)), dtype=np.float32)
+                filled = 0
+        if filled:
+            yield batch[:filled]
+
+    def read_array(self, batch_size: int = 4096) -> np.ndarray:
+        """Parse the whole stream into a single (n, len(CHANNELS)) array."""
+        batches = list(self.batches(batch_size))
+        if not batches:
+            return np.empty((0, len(CHANNELS)), dtype=np.float32)
+        return np.concatenate(batches)
+
+
+def open_recording(file_path: str) -> io.TextIOWrapper:
+    """Open a recording for line-by-line parsing."""
+    return open(file_path, "r", encoding="utf-8", errors="replace")
+
+
+def parse_file(file_path: str, max_reported_errors: int = 20) -> Tuple[List[Dict], ParseStats]:
+    """Parse a recording into a list of sample dicts and its ParseStats."""
+    with open_recording(file_path) as f:
+        parser = IMUStreamParser(f, max_reported_errors)
+        samples = list(parser.samples())
+    return samples, parser.stats
@@ -0,0 +1,188 @@
+import json
+import os
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from numpy.lib import recfunctions
+
+from imu_parser import CHANNELS, IMUStreamParser, open_recording, sample_to_row
+
+HAND_CODES = {"left": 0, "right": 1, "unknown": 2}
+
+SAMPLE_DTYPE = np.dtype(
+    [(name, np.float32) for name in CHANNELS]
+    + [("hand", np.int8), ("index", np.int32)]
+)
+
+
+def hand_from_filename(filename: str) -> str:
+    """Infer which hand a recording belongs to from its file name."""
+    name = os.path.basename(filename).lower()
+    for hand in ("left", "right"):
+        if hand in name:
+            return hand
+    return "unknown"
+
+
+def empty_samples(n: int = 0) -> np.ndarray:
+    """Allocate a structured sample array with SAMPLE_DTYPE."""
+    return np.zeros(n, dtype=SAMPLE_DTYPE)
+
+
+def samples_from_matrix(matrix: np.ndarray, hand: str, start_index: int = 0) -> np.ndarray:
+    """Build a structured sample array from an (n, len(CHANNELS)) matrix."""
+    samples = empty_samples(len(matrix))
+    for i, name in enumerate(CHANNELS):
+        samples[name] = matrix[:, i]
+    samples["hand"] = HAND_CODES[hand]
+    samples["index"] = np.arange(start_index, start_index + len(matrix), dtype=np.int32)
+    return samples
+
+
+def _to_float(value) -> float:
+    # str() of a float32 is its shortest round-trip form, so -2.610326 stays
+    # -2.610326 instead of widening to -2.6103260517120361.
+    return float(str(value))
+
+
+def record_to_dict(record) -> Dict:
+    """Convert one structured record back to the nested recording format."""
+    f = _to_float
+    return {
+        "pos": {"pitch": f(record["pitch"]), "roll": f(record["roll"]), "yaw": f(record["yaw"])},
+        "gyro": {"x": f(record["gyro_x"]), "y": f(record["gyro_y"]), "z": f(record["gyro_z"])},
+        "compass": {"x": f(record["compass_x"]), "y": f(record["compass_y"]), "z": f(record["compass_z"])},
+        "temp": f(record["temp"]),
+    }
+
+
+class IMUSession:
+    """Columnar IMU recording for one or both hands.
+
+    Each hand is stored as its own structured array ordered by sample index,
+    so ``hand()`` and ``window()`` return sessions whose arrays are views of
+    the original buffers rather than copies.
+    """
+
+    def __init__(self, hands: Dict[str, np.ndarray], timestamp: str = "",
+                 sample_rate: Optional[float] = None, patient_id: Optional[str] = None,
+                 session_id: Optional[str] = None):
+        for name, samples in hands.items():
+            if name not in HAND_CODES:
+                raise ValueError(f"Unknown hand '{name}', expected one of {list(HAND_CODES)}")
+            if samples.dtype != SAMPLE_DTYPE:
+                raise ValueError(f"Samples for '{name}' must use SAMPLE_DTYPE")
+        self._hands = dict(hands)
+        self.timestamp = timestamp
+        self.sample_rate = sample_rate
+        self.patient_id = patient_id
+        # Recordings are identified by their start time unless told otherwise
+        self.session_id = session_id or timestamp or None
+
+    def _derive(self, hands: Dict[str, np.ndarray]) -> "IMUSession":
+        """New session over ``hands`` that keeps this session's identity."""
+        return IMUSession(hands, self.timestamp, self.sample_rate, self.patient_id, self.session_id)
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray], timestamp: str = "",
+                    sample_rate: Optional[float] = None) -> "IMUSession":
+        """Create a session from per-hand (n, len(CHANNELS)) float matrices."""
+        hands = {hand: samples_from_matrix(matrix, hand) for hand, matrix in arrays.items()}
+        return cls(hands, timestamp, sample_rate)
+
+    @classmethod
+    def from_dicts(cls, samples: Dict[str, Iterable[Dict]], timestamp: str = "",
+                   sample_rate: Optional[float] = None) -> "IMUSession":
+        """Create a session from per-hand lists of nested sample dicts."""
+        arrays = {}
+        for hand, hand_samples in samples.items():
+            rows = [sample_to_row(s) for s in hand_samples]
+            arrays[hand] = np.array(rows, dtype=np.float32).reshape(-1, len(CHANNELS))
+        return cls.from_arrays(arrays, timestamp, sample_rate)
+
+    @classmethod
+    def from_json(cls, payload: str) -> "IMUSession":
+        """Inverse of ``to_json``."""
+        data = json.loads(payload)
+        samples = {key[:-len("_hand")]: value for key, value in data.items() if key.endswith("_hand")}
+        return cls.from_dicts(samples, data.get("timestamp", ""))
+
+    @classmethod
+    def from_files(cls, files: Dict[str, str], timestamp: str = "",
+                   sample_rate: Optional[float] = None) -> "IMUSession":
+        """Parse one recording per hand, e.g. ``{"left": "left.js"}``."""
+        arrays = {}
+        for hand, file_path in files.items():
+            with open_recording(file_path) as f:
+                arrays[hand] = IMUStreamParser(f).read_array()
+        return cls.from_arrays(arrays, timestamp, sample_rate)
+
+    @property
+    def hands(self) -> List[str]:
+        """Names of the hands present in this session."""
+        return list(self._hands)
+
+    def hand(self, name: str) -> "IMUSession":
+        """Return a session restricted to one hand (zero-copy)."""
+        if name not in self._hands:
+            raise KeyError(f"Hand '{name}' not in session, available: {self.hands}")
+        return self._derive({name: self._hands[name]})
+
+    def samples(self, name: Optional[str] = None) -> np.ndarray:
+        """Structured samples for one hand, or all hands concatenated (copy)."""
+        if name is not None:
+            return self._hands[name]
+        if len(self._hands) == 1:
+            return next(iter(self._hands.values()))
+        if not self._hands:
+            return empty_samples()
+        return np.concatenate(list(self._hands.values()))
+
+    def window(self, start: int, stop: int) -> "IMUSession":
+        """Restrict every hand to sample indices in [start, stop) (zero-copy)."""
+        hands = {}
+        for name, samples in self._hands.items():
+            lo, hi = np.searchsorted(samples["index"], [start, stop])
+            hands[name] = samples[lo:hi]
+        return self._derive(hands)
+
+    def strided(self, step: int) -> "IMUSession":
+        """Keep every ``step``-th sample of each hand (zero-copy)."""
+        return self._derive({name: samples[::step] for name, samples in self._hands.items()})
+
+    def take(self, indices: Dict[str, np.ndarray]) -> "IMUSession":
+        """Keep the given positional indices per hand (copies the selected rows)."""
+        return self._derive({name: samples[indices[name]] for name, samples in self._hands.items()})
+
+    def time_window(self, start_s: float, stop_s: float) -> "IMUSession":
+        """Like ``window`` but in seconds; requires ``sample_rate``."""
+        if not self.sample_rate:
+            raise ValueError("time_window requires a session sample_rate")
+        return self.window(int(start_s * self.sample_rate), int(np.ceil(stop_s * self.sample_rate)))
+
+    def channel(self, name: str, hand: str) -> np.ndarray:
+        """One channel of one hand as a (strided) float32 view."""
+        return self._hands[hand][name]
+
+    def matrix(self, hand: str) -> np.ndarray:
+        """(n, len(CHANNELS)) float32 copy of one hand's channels."""
+        samples = self._hands[hand]
+        return recfunctions.structured_to_unstructured(samples[list(CHANNELS)], dtype=np.float32)
+
+    def to_dicts(self, hand: str) -> List[Dict]:
+        """Nested sample dicts for one hand, in the original recording format."""
+        return [record_to_dict(record) for record in self._hands[hand]]
+
+    def to_json(self) -> str:
+        """Serialize as the ``{"timestamp", "<hand>_hand": [...]}`` payload used by the agents."""
+        payload = {"timestamp": self.timestamp}
+        for hand in self._hands:
+            payload[f"{hand}_hand"] = self.to_dicts(hand)
+        return json.dumps(payload)
+
+    def __len__(self) -> int:
+        return sum(len(samples) for samples in self._hands.values())
+
+    def __repr__(self) -> str:
+        counts = ", ".join(f"{name}={len(s)}" for name, s in self._hands.items())
+        return f"IMUSession({counts}, timestamp={self.timestamp!r})"
@@ -1,36 +1,34 @@
+import asyncio
 import os
 from dotenv import load_dotenv
-from data_ingestion import IMUDataProcessor
 from agents import AgentSystem
-import json
+from session_cache import cached_parse_stats, load_session
 
-def load_js_data(file_path):
-    """Load data from a JavaScript file that starts with 'data='."""
-    with open(file_path, "r") as f:
-        content = f.read()
-        # Extract the array part
-        start = content.find("[")
-        end = content.rfind("]")
-        if start == -1 or end == -1:
-            raise ValueError(f"Could not find array in {file_path}")
-        
-        # Get the array content
-        array_content = content[start+1:end]
-        
-        # Split into individual JSON objects
-        json_objects = []
-        for line in array_content.split("\n"):
-            line = line.strip()
-            if line.startswith(","):
-                line = line[1:]
-            if line and not line.isspace():
-                try:
-                    obj = json.loads(line)
-                    json_objects.append(obj)
-                except json.JSONDecodeError:
-                    continue
-        
-        return json_objects
+# Workflow node -> markdown file its output is streamed into.
+REPORT_FILES = {
+    "generate_report": "exercise_summary.md",
+    "generate_implementation": "game_implementation.md",
+}
+
+async def stream_reports(agent_system, motion_data):
+    """Run the workflow, appending report tokens to their files as they arrive."""
+    files = {node: open(path, "w") for node, path in REPORT_FILES.items()}
+    try:
+        async for kind, node, text in agent_system.astream_motion_data(motion_data):
+            if node not in files:
+                if kind == "done":
+                    print(f"  {node} finished")
+                continue
+            f = files[node]
+            if kind == "done":
+                # Rewrite with the complete text (nodes served from a cache arrive in one piece)
+                f.seek(0)
+                f.truncate()
+            f.write(text)
+            f.flush()
+    finally:
+        for f in files.values():
+            f.close()
 
 def main():
     """Main function to process IMU data and generate exercise routines."""
@@ -43,38 +41,31 @@ def main():
 
     print("Loading IMU data...")
     
-    # Load IMU data from both hands
-    left_hand_data = load_js_data("imu-data/left_updown.js")
-    right_hand_data = load_js_data("imu-data/right_updown.js")
-    
-    # Combine data from both hands
-    motion_data = {
-        "timestamp": "2025-01-14T08:37:04",
-        "left_hand": left_hand_data,
-        "right_hand": right_hand_data
+    # Load IMU data from both hands; recordings are memory-mapped from their
+    # binary cache, which is rebuilt whenever a source file changes
+    files = {
+        "left": "imu-data/left_updown.js",
+        "right": "imu-data/right_updown.js",
     }
+    motion_data = load_session(files, timestamp="2025-01-14T08:37:04")
+    for file_path in files.values():
+        # Recorded when the cache was built, so cache hits report the same skips
+        stats = cached_parse_stats(file_path)
+        if stats is not None and stats.skipped:
+            print(f"Skipped {stats.skipped} malformed line(s) in {file_path} "
+                  f"(first at line {stats.skipped_lines[0]})")
 
     print("Initializing agent system...")
     agent_system = AgentSystem(openai_api_key)
 
     print("Setting up vector store...")
-    agent_system.setup_vector_store()
+    agent_system.setup_vector_store(motion_data)
     print("Saving vector store...")
     agent_system.vector_store.save_local("vector_store/imu_vectors")
 
-    print("Processing motion data...")
-    results = agent_system.process_motion_data(
-        motion_data=json.dumps(motion_data)
-    )
-
-    print("Generating reports...")
-    # Create exercise_summary.md
-    with open("exercise_summary.md", "w") as f:
-        f.write(results["exercise_summary"])
-
-    # Create game_implementation.md
-    with open("game_implementation.md", "w") as f:
-        f.write(results["game_implementation"])
+    print("Processing motion data and streaming reports...")
+    # exercise_summary.md and game_implementation.md fill up while GPT-4 writes them
+    asyncio.run(stream_reports(agent_system, motion_data))
 
     print("Done! Reports have been generated in exercise_summary.md and game_implementation.md")
 
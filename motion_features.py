@@ -0,0 +1,167 @@
+import json
+from typing import Dict, Optional
+
+import numpy as np
+
+from imu_session import IMUSession
+from rep_detection import detect_reps, rep_summary
+
+# The recordings carry no timestamps; this rate is assumed unless the
+# session (or caller) provides one.
+DEFAULT_SAMPLE_RATE = 20.0
+
+# Physiological tremor band in Hz.
+TREMOR_BAND = (4.0, 12.0)
+
+
+def _smooth(x: np.ndarray, window: int) -> np.ndarray:
+    """Centered moving average that keeps the input length."""
+    if window <= 1 or len(x) < window:
+        return x.astype(np.float64)
+    kernel = np.ones(window) / window
+    padded = np.pad(x.astype(np.float64), (window // 2, window - 1 - window // 2), mode="edge")
+    return np.convolve(padded, kernel, mode="valid")
+
+
+def segment_argext(x: np.ndarray, starts: np.ndarray, lengths: np.ndarray, use_max: bool) -> np.ndarray:
+    """Index of the first max (or min) of ``x`` inside each contiguous segment."""
+    reducer = np.maximum if use_max else np.minimum
+    extreme = reducer.reduceat(x, starts)
+    hits = x == np.repeat(extreme, lengths)
+    positions = np.where(hits, np.arange(len(x)), len(x))
+    return np.minimum.reduceat(positions, starts)
+
+
+def angle_stats(samples: np.ndarray) -> Dict:
+    """Range, mean and spread of pitch, roll and (unwrapped) yaw in degrees."""
+    stats = {}
+    for name in ("pitch", "roll", "yaw"):
+        values = samples[name].astype(np.float64)
+        if name == "yaw":
+            values = np.rad2deg(np.unwrap(np.deg2rad(values)))
+        stats[name] = {
+            "min": float(values.min()),
+            "max": float(values.max()),
+            "range": float(np.ptp(values)),
+            "mean": float(values.mean()),
+            "std": float(values.std()),
+        }
+    return stats
+
+
+def angular_velocity_stats(samples: np.ndarray, sample_rate: float) -> Dict:
+    """Gyroscope magnitude statistics plus the pitch rate derived from orientation."""
+    gyro = np.stack([samples["gyro_x"], samples["gyro_y"], samples["gyro_z"]], axis=1).astype(np.float64)
+    magnitude = np.linalg.norm(gyro, axis=1)
+    if len(samples) < 2:
+        pitch_rate = np.zeros(len(samples))
+    else:
+        pitch_rate = np.gradient(_smooth(samples["pitch"], 3)) * sample_rate
+    return {
+        "gyro_magnitude_mean": float(magnitude.mean()),
+        "gyro_magnitude_p95": float(np.percentile(magnitude, 95)),
+        "gyro_magnitude_max": float(magnitude.max()),
+        "gyro_axis_rms": [float(v) for v in np.sqrt(np.mean(gyro ** 2, axis=0))],
+        "pitch_rate_max_up": float(pitch_rate.max()),
+        "pitch_rate_max_down": float(-pitch_rate.min()),
+        "pitch_rate_mean_abs": float(np.abs(pitch_rate).mean()),
+    }
+
+
+def smoothness(pitch: np.ndarray, sample_rate: float) -> Dict:
+    """RMS jerk and log dimensionless jerk (higher LDLJ means smoother) of pitch."""
+    x = _smooth(pitch, max(1, int(round(0.1 * sample_rate))))
+    if len(x) < 4:
+        return {"rms_jerk": None, "log_dimensionless_jerk": None}
+    velocity = np.gradient(x) * sample_rate
+    jerk = np.gradient(np.gradient(velocity)) * sample_rate ** 2
+    duration = len(x) / sample_rate
+    peak_velocity = np.abs(velocity).max()
+    ldlj = None
+    if peak_velocity > 0:
+        dimensionless = duration ** 3 / peak_velocity ** 2 * np.sum(jerk ** 2) / sample_rate
+        ldlj = float(-np.log(dimensionless)) if dimensionless > 0 else None
+    return {"rms_jerk": float(np.sqrt(np.mean(jerk ** 2))), "log_dimensionless_jerk": ldlj}
+
+
+def tremor(samples: np.ndarray, sample_rate: float) -> Dict:
+    """Share of gyroscope power in the tremor band and its dominant frequency."""
+    gyro = np.stack([samples["gyro_x"], samples["gyro_y"], samples["gyro_z"]], axis=1).astype(np.float64)
+    if len(gyro) < 8:
+        return {"band_power_ratio": None, "dominant_frequency_hz": None}
+    gyro -= gyro.mean(axis=0)
+    power = (np.abs(np.fft.rfft(gyro, axis=0)) ** 2).sum(axis=1)
+    freqs = np.fft.rfftfreq(len(gyro), d=1.0 / sample_rate)
+    in_band = (freqs >= TREMOR_BAND[0]) & (freqs <= TREMOR_BAND[1])
+    total = power[1:].sum()
+    if not in_band.any() or total <= 0:
+        return {"band_power_ratio": None, "dominant_frequency_hz": None}
+    band_power = power[in_band]
+    return {
+        "band_power_ratio": float(band_power.sum() / total),
+        "dominant_frequency_hz": float(freqs[in_band][np.argmax(band_power)]),
+    }
+
+
+def bilateral_lag(left: np.ndarray, right: np.ndarray, sample_rate: float) -> Dict:
+    """Lag between two signals from FFT cross-correlation.
+
+    A positive lag means the right hand trails the left hand.
+    """
+    if len(left) < 2 or len(right) < 2:
+        return {"lag_samples": None, "lag_s": None, "correlation": None}
+    a = left.astype(np.float64) - left.mean()
+    b = right.astype(np.float64) - right.mean()
+    norm = np.sqrt(np.sum(a ** 2) * np.sum(b ** 2))
+    if norm == 0:
+        return {"lag_samples": None, "lag_s": None, "correlation": None}
+    size = len(a) + len(b) - 1
+    nfft = 1 << (size - 1).bit_length()
+    xcorr = np.fft.irfft(np.fft.rfft(b, nfft) * np.conj(np.fft.rfft(a, nfft)), nfft)
+    # Reorder circular lags to run from -(len(a) - 1) to len(b) - 1.
+    xcorr = np.concatenate((xcorr[-(len(a) - 1):], xcorr[:len(b)]))
+    best = int(np.argmax(xcorr))
+    lag = best - (len(a) - 1)
+    return {"lag_samples": lag, "lag_s": lag / sample_rate, "correlation": float(xcorr[best] / norm)}
+
+
+def hand_features(samples: np.ndarray, sample_rate: float) -> Dict:
+    """All single-hand features for one structured sample array."""
+    return {
+        "samples": int(len(samples)),
+        "duration_s": len(samples) / sample_rate,
+        "angles": angle_stats(samples),
+        "angular_velocity": angular_velocity_stats(samples, sample_rate),
+        "reps": rep_summary(detect_reps(samples, sample_rate)),
+        "smoothness": smoothness(samples["pitch"], sample_rate),
+        "tremor": tremor(samples, sample_rate),
+    }
+
+
+def extract_features(session: IMUSession, sample_rate: Optional[float] = None) -> Dict:
+    """Compute per-hand and bilateral motion features for a session."""
+    rate = sample_rate or session.sample_rate or DEFAULT_SAMPLE_RATE
+    features = {
+        "sample_rate_hz": rate,
+        "hands": {hand: hand_features(session.samples(hand), rate)
+                  for hand in session.hands if len(session.samples(hand))},
+    }
+    if "left" in session.hands and "right" in session.hands:
+        features["bilateral"] = bilateral_lag(session.channel("pitch", "left"),
+                                              session.channel("pitch", "right"), rate)
+    return features
+
+
+def _round(value, digits: int):
+    if isinstance(value, float):
+        return round(value, digits)
+    if isinstance(value, dict):
+        return {k: _round(v, digits) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_round(v, digits) for v in value]
+    return value
+
+
+def format_features(features: Dict, digits: int = 2) -> str:
+    """Compact JSON rendering of ``extract_features`` output for prompts."""
+    return json.dumps(_round(features, digits), separators=(",", ":"))
@@ -1,43 +1,18 @@
-from typing import Dict, List
-from langchain.chat_models import ChatOpenAI
-from langchain.prompts import ChatPromptTemplate
-from langchain.schema import BaseMessage
+import asyncio
+import re
+from typing import Dict, List, Optional, Union
+from langchain_openai import ChatOpenAI
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.messages import BaseMessage
+from langchain_core.embeddings import Embeddings
 import numpy as np
 from vector_store import VectorStore
+from imu_session import IMUSession
+from response_cache import ResponseCache, with_response_cache
+from retrieval_cache import RetrievalCache
+from context_builder import ContextBuilder
 
-class RAGAgent:
-    def __init__(self, vector_store: VectorStore, llm: ChatOpenAI):
-        self.vector_store = vector_store
-        self.llm = llm
-        
-    def retrieve(self, query: str, k: int = 5) -> List[Dict]:
-        """Retrieve relevant documents based on query."""
-        # Convert query to embedding using the same model as data ingestion
-        query_embedding = self.llm.get_embedding(query)
-        
-        # Search vector store
-        results = self.vector_store.search(query_embedding, k=k)
-        return results
-        
-    def generate_context(self, retrieved_docs: List[Dict]) -> str:
-        """Generate a structured context from retrieved documents."""
-        context = []
-        for i, doc in enumerate(retrieved_docs, 1):
-            motion_data = doc.get('document', {})
-            context.append(
-                f"Motion Pattern {i}:\n"
-                f"- Position: Pitch={motion_data['pos']['pitch']:.2f}, "
-                f"Roll={motion_data['pos']['roll']:.2f}, "
-                f"Yaw={motion_data['pos']['yaw']:.2f}\n"
-                f"- Movement: X={motion_data['gyro']['x']:.2f}, "
-                f"Y={motion_data['gyro']['y']:.2f}, "
-                f"Z={motion_data['gyro']['z']:.2f}\n"
-            )
-        return "\n".join(context)
-        
-    def analyze(self, query: str, context: str) -> Dict:
-        """Analyze the context and generate insights."""
-        template = """You are an AI expert in analyzing IMU motion data.
+ANALYSIS_TEMPLATE = """You are an AI expert in analyzing IMU motion data.
         Based on the following motion patterns:
         {context}
         
@@ -50,15 +25,128 @@ class RAGAgent:
            - Detailed interpretation of the motion data
         3. Recommendations:
            - Actionable suggestions based on the analysis"""
+
+DECOMPOSE_TEMPLATE = """You are a Query Planner AI responsible for retrieving the most relevant information from a vector store. Based on the following user query:
+
+{query}
+
+1. Break down the query into specific sub-questions to retrieve focused results.
+2. Ensure each sub-question is aligned with the context of the user's motion data and the task requirements.
+3. Return a list of structured queries optimized for retrieving embeddings and documents from the vector store.
+
+Respond in the following format:
+- **Main Query**: [Restated Main Query]
+- **Sub-Queries**:
+  1. [Sub-Query 1]
+  2. [Sub-Query 2]
+  3. [Sub-Query 3]
+- **Additional Notes**:"""
+
+SYNTHESIS_TEMPLATE = """Synthesize the following analysis results into a coherent response:
+        
+        {results}
+        
+        Provide a unified analysis that combines all insights."""
+
+
+def _result_key(result: Dict):
+    """Identity of a retrieved document: (shard, vector ID)."""
+    return result.get('shard'), result['index']
+
+
+def dedupe_results(results: List[List[Dict]]) -> List[List[Dict]]:
+    """Keep each retrieved document only for the query it is closest to.
+
+    A query whose documents all went to other queries is left with an empty
+    list rather than a copy of one of them.
+    """
+    best: Dict = {}  # document -> (distance, query)
+    for q, row in enumerate(results):
+        for result in row:
+            key = _result_key(result)
+            if key not in best or result['distance'] < best[key][0]:
+                best[key] = (result['distance'], q)
+    deduped = []
+    for q, row in enumerate(results):
+        kept = [result for result in row if best[_result_key(result)][1] == q]
+        deduped.append(kept)
+    return deduped
+
+
+class RAGAgent:
+    def __init__(self, vector_store: VectorStore, llm: ChatOpenAI, embeddings: Optional[Embeddings] = None,
+                 response_cache: Optional[ResponseCache] = None,
+                 retrieval_cache: Optional[RetrievalCache] = None,
+                 context_builder: Optional[ContextBuilder] = None):
+        self.vector_store = vector_store
+        # With a response cache, repeated analyses of the same context are replayed from disk
+        self.llm = with_response_cache(llm, response_cache)
+        # Typically AgentSystem.embeddings, which is backed by the embedding cache
+        self.embeddings = embeddings
+        # Repeated and (optionally) near-identical queries reuse earlier results
+        self.retrieval_cache = retrieval_cache
+        # Bounds every analysis prompt's context and picks k for retrieval
+        self.context_builder = context_builder or ContextBuilder()
+
+    def _store_version(self):
+        return getattr(self.vector_store, 'version', None)
+        
+    def retrieve(self, query: str, k: Optional[int] = None) -> List[Dict]:
+        """Retrieve relevant documents based on query; ``k`` defaults to the context builder's choice."""
+        k = k or self.context_builder.choose_k()
+        cache = self.retrieval_cache
+        if cache is not None:
+            version = self._store_version()
+            results = cache.get(query, k, version)
+            if results is not None:
+                return results
+
+        # Convert query to embedding using the same model as data ingestion
+        if self.embeddings is not None:
+            query_embedding = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        else:
+            query_embedding = self.llm.get_embedding(query)
+
+        if cache is not None:
+            results = cache.get_similar(query_embedding, k, version)
+            if results is not None:
+                return results
+        
+        # Search vector store
+        results = self.vector_store.search(query_embedding, k=k)
+        if cache is not None:
+            cache.put(query, query_embedding, k, results, version)
+        return results
+        
+    def generate_context(self, retrieved_docs: Union[List[Dict], IMUSession]) -> str:
+        """Generate a structured context from retrieved documents or an IMUSession.
+
+        The context is packed by ``self.context_builder``: overlapping results
+        are merged into ranges, raw samples are summarized and the text stays
+        within the builder's token budget.
+        """
+        return self.context_builder.build(retrieved_docs)
         
-        prompt = ChatPromptTemplate.from_template(template)
-        messages = prompt.format_messages(context=context, query=query)
-        response = self.llm.invoke(messages)
+    def _analysis_messages(self, query: str, context: str) -> List[BaseMessage]:
+        prompt = ChatPromptTemplate.from_template(ANALYSIS_TEMPLATE)
+        return prompt.format_messages(context=context, query=query)
+
+    def analyze(self, query: str, context: str) -> Dict:
+        """Analyze the context and generate insights."""
+        response = self.llm.invoke(self._analysis_messages(query, context))
         
         return {
             "analysis": response.content,
             "source_data": context
         }
+
+    async def aanalyze(self, query: str, context: str) -> Dict:
+        """Async ``analyze``, so several sub-queries can be analyzed at once."""
+        response = await self.llm.ainvoke(self._analysis_messages(query, context))
+        return {
+            "analysis": response.content,
+            "source_data": context
+        }
         
     def execute_rag_workflow(self, query: str) -> Dict:
         """Execute the full RAG workflow."""
@@ -73,64 +161,124 @@ class RAGAgent:
         
         return result
 
-class QueryPlanner:
-    def __init__(self, llm: ChatOpenAI):
-        self.llm = llm
-        
-    def decompose_query(self, query: str) -> List[str]:
-        """Decompose complex queries into simpler sub-queries."""
-        template = """You are a Query Planner AI responsible for retrieving the most relevant information from a vector store. Based on the following user query:
+    def embed_queries(self, queries: List[str]) -> np.ndarray:
+        """Embed several queries, in one request when the model supports batches."""
+        if self.embeddings is not None:
+            return np.asarray(self.embeddings.embed_documents(list(queries)), dtype=np.float32)
+        return np.asarray([self.llm.get_embedding(query) for query in queries], dtype=np.float32)
 
-{query}
+    def retrieve_batch(self, queries: List[str], k: Optional[int] = None) -> List[List[Dict]]:
+        """Retrieve documents for several queries with one embedding batch and one search."""
+        if not queries:
+            return []
+        k = k or self.context_builder.choose_k()
+        cache = self.retrieval_cache
+        if cache is None:
+            return self.vector_store.search_batch(self.embed_queries(queries), k=k)
 
-1. Break down the query into specific sub-questions to retrieve focused results.
-2. Ensure each sub-question is aligned with the context of the user's motion data and the task requirements.
-3. Return a list of structured queries optimized for retrieving embeddings and documents from the vector store.
+        version = self._store_version()
+        results: List[Optional[List[Dict]]] = [cache.get(query, k, version) for query in queries]
+        missing = [i for i, row in enumerate(results) if row is None]
+        if not missing:
+            return results
+        embeddings = self.embed_queries([queries[i] for i in missing])
+        to_search = []
+        for i, embedding in zip(missing, embeddings):
+            results[i] = cache.get_similar(embedding, k, version)
+            if results[i] is None:
+                to_search.append((i, embedding))
+        if to_search:
+            found = self.vector_store.search_batch(np.stack([embedding for _, embedding in to_search]), k=k)
+            for (i, embedding), row in zip(to_search, found):
+                cache.put(queries[i], embedding, k, row, version)
+                results[i] = row
+        return results
 
-Respond in the following format:
-- **Main Query**: [Restated Main Query]
-- **Sub-Queries**:
-  1. [Sub-Query 1]
-  2. [Sub-Query 2]
-  3. [Sub-Query 3]
-- **Additional Notes**:"""
-        
-        prompt = ChatPromptTemplate.from_template(template)
-        messages = prompt.format_messages(query=query)
-        response = self.llm.invoke(messages)
-        
-        # Extract sub-queries from the response
+    async def aexecute_multi_query_workflow(self, query: str, planner: "QueryPlanner",
+                                            k: Optional[int] = None) -> Dict:
+        """Decompose ``query``, answer the sub-queries concurrently and synthesize one response.
+
+        All sub-queries are embedded in one batch and searched in one
+        vectorized call. A document retrieved by several sub-queries is only
+        kept for the one it matches best, so no analysis (and therefore the
+        synthesis) sees it twice. Sub-queries left without documents of their
+        own are not analyzed. The analyze calls then run concurrently.
+        """
+        sub_queries = await planner.adecompose_query(query) or [query]
+        retrieved = dedupe_results(self.retrieve_batch(sub_queries, k))
+        answered = [(sub_query, docs) for sub_query, docs in zip(sub_queries, retrieved) if docs]
+        sub_queries = [sub_query for sub_query, _ in answered]
+        sub_results = await asyncio.gather(*(
+            self.aanalyze(sub_query, self.generate_context(docs))
+            for sub_query, docs in answered
+        ))
+        for sub_query, result in zip(sub_queries, sub_results):
+            result["query"] = sub_query
+        return await planner.asynthesize_results(list(sub_results))
+
+    def execute_multi_query_workflow(self, query: str, planner: "QueryPlanner", k: Optional[int] = None) -> Dict:
+        """Blocking wrapper around ``aexecute_multi_query_workflow``."""
+        return asyncio.run(self.aexecute_multi_query_workflow(query, planner, k))
+
+
+class QueryPlanner:
+    def __init__(self, llm: ChatOpenAI, response_cache: Optional[ResponseCache] = None):
+        self.llm = with_response_cache(llm, response_cache)
+
+    @staticmethod
+    def _parse_sub_queries(content: str) -> List[str]:
+        """Numbered items of the response's Sub-Queries list, brackets removed.
+
+        Only the list following the "Sub-Queries" heading is read, so numbered
+        items in later sections such as "Additional Notes" are not taken for
+        sub-queries. Without the heading the first numbered list is used.
+        """
+        lines = [line.strip() for line in content.split('\n')]
+        start = next((i + 1 for i, line in enumerate(lines) if 'sub-queries' in line.lower()), 0)
         sub_queries = []
-        lines = response.content.split('\n')
-        for line in lines:
-            line = line.strip()
-            if line.startswith('  1.') or line.startswith('  2.') or line.startswith('  3.'):
+        for line in lines[start:]:
+            if re.match(r'\d+\.\s', line):
                 # Remove the number and brackets
-                query = line.split('.', 1)[1].strip()
-                query = query.strip('[]')
-                sub_queries.append(query)
-        
+                sub_queries.append(line.split('.', 1)[1].strip().strip('[]'))
+            elif line and sub_queries:
+                break
         return sub_queries
         
-    def synthesize_results(self, sub_results: List[Dict]) -> Dict:
-        """Synthesize results from multiple sub-queries."""
-        template = """Synthesize the following analysis results into a coherent response:
-        
-        {results}
-        
-        Provide a unified analysis that combines all insights."""
-        
+    def decompose_query(self, query: str) -> List[str]:
+        """Decompose complex queries into simpler sub-queries."""
+        prompt = ChatPromptTemplate.from_template(DECOMPOSE_TEMPLATE)
+        response = self.llm.invoke(prompt.format_messages(query=query))
+        return self._parse_sub_queries(response.content)
+
+    async def adecompose_query(self, query: str) -> List[str]:
+        """Async ``decompose_query``."""
+        prompt = ChatPromptTemplate.from_template(DECOMPOSE_TEMPLATE)
+        response = await self.llm.ainvoke(prompt.format_messages(query=query))
+        return self._parse_sub_queries(response.content)
+
+    @staticmethod
+    def _synthesis_messages(sub_results: List[Dict]) -> List[BaseMessage]:
         # Format sub-results
         formatted_results = "\n\n".join([
             f"Analysis {i+1}:\n{result['analysis']}"
             for i, result in enumerate(sub_results)
         ])
+        prompt = ChatPromptTemplate.from_template(SYNTHESIS_TEMPLATE)
+        return prompt.format_messages(results=formatted_results)
         
-        prompt = ChatPromptTemplate.from_template(template)
-        messages = prompt.format_messages(results=formatted_results)
-        response = self.llm.invoke(messages)
+    def synthesize_results(self, sub_results: List[Dict]) -> Dict:
+        """Synthesize results from multiple sub-queries."""
+        response = self.llm.invoke(self._synthesis_messages(sub_results))
         
         return {
             "synthesized_analysis": response.content,
             "sub_results": sub_results
         }
+
+    async def asynthesize_results(self, sub_results: List[Dict]) -> Dict:
+        """Async ``synthesize_results``."""
+        response = await self.llm.ainvoke(self._synthesis_messages(sub_results))
+        return {
+            "synthesized_analysis": response.content,
+            "sub_results": sub_results
+        }
@@ -0,0 +1,71 @@
+import asyncio
+import time
+from collections import deque
+from typing import List, Optional
+
+WINDOW_S = 60.0
+
+
+class RateLimiter:
+    """Sliding one-minute window limit on LLM requests and tokens for asyncio code.
+
+    ``acquire`` waits until one more request of the given estimated size fits
+    under both limits. When the real usage is known afterwards, ``adjust``
+    corrects the request's booking so later calls see the true load. A single request
+    larger than ``tokens_per_minute`` is let through once the window is empty
+    instead of waiting forever.
+    """
+
+    def __init__(self, requests_per_minute: Optional[int] = None, tokens_per_minute: Optional[int] = None):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._events = deque()  # [time, requests, tokens]
+        self._requests = 0
+        self._tokens = 0
+        self._lock = asyncio.Lock()
+
+    def _expire(self, now: float):
+        while self._events and now - self._events[0][0] >= WINDOW_S:
+            _, requests, tokens = self._events.popleft()
+            self._requests -= requests
+            self._tokens -= tokens
+
+    def _fits(self, tokens: int) -> bool:
+        if self.requests_per_minute is not None and self._requests + 1 > self.requests_per_minute:
+            return False
+        if self.tokens_per_minute is not None and self._tokens + tokens > self.tokens_per_minute:
+            return not self._events
+        return True
+
+    async def acquire(self, tokens: int = 0) -> List:
+        """Wait for capacity, then record one request of ``tokens`` tokens.
+
+        Returns the booking, to be passed to ``adjust``.
+        """
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._expire(now)
+                if self._fits(tokens):
+                    event = [now, 1, tokens]
+                    self._events.append(event)
+                    self._requests += 1
+                    self._tokens += tokens
+                    return event
+                await asyncio.sleep(max(WINDOW_S - (now - self._events[0][0]), 0.01))
+
+    def adjust(self, tokens: int, event: Optional[List] = None):
+        """Book ``tokens`` more (or, if negative, fewer) tokens than ``event`` acquired.
+
+        The correction is applied to the request's own booking, so both
+        leave the window together and the count never drops below zero.
+        Once that booking has expired (or without one), extra tokens are
+        booked now and refunds are dropped.
+        """
+        if event is not None and any(e is event for e in self._events):
+            corrected = max(event[2] + tokens, 0)
+            self._tokens += corrected - event[2]
+            event[2] = corrected
+        elif tokens > 0:
+            self._events.append([time.monotonic(), 0, tokens])
+            self._tokens += tokens
@@ -0,0 +1,365 @@
+"""Repetition segmentation for up-down exercises, in batch or sample by sample.
+
+The pitch is smoothed with a trailing moving average and split into three
+zones: top (at or above ``Zones.top``), bottom (at or below
+``Zones.bottom``) and the transit between them. The zone the recording
+starts in is the rest position. A rep starts when the hand last leaves the
+rest zone, reaches the opposite zone and ends when it is back in the rest
+zone. Dips that turn around in the transit zone are not counted. The turn is
+the extreme of the smoothed pitch in the opposite zone, and it splits the
+rep into its down and up movement. Samples in a zone with a gyroscope
+magnitude below ``hold_gyro_dps`` count as holding at that position.
+
+``detect_reps`` processes a whole recording with array operations.
+``RepDetector`` gives the same reps one sample at a time, up to
+floating-point rounding. Without explicit ``Zones`` both calibrate them the
+same causal way: once the smoothed pitch has moved at least
+``min_excursion_deg`` away from where it started and come back, the zones
+are taken from the pitch range seen so far, and reps are detected from up to
+``calibration_s`` before that point on.
+"""
+from collections import deque
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+DEFAULT_HOLD_GYRO_DPS = 15.0
+DEFAULT_ZONE = 0.25
+DEFAULT_MIN_EXCURSION_DEG = 20.0
+DEFAULT_CALIBRATION_S = 60.0
+# An excursion is over once the pitch is back within this fraction of its farthest distance
+RETURN_FRACTION = 0.25
+# Backlog samples a calibrated RepDetector replays per pushed sample
+REPLAY_PER_SAMPLE = 4
+
+
+@dataclass
+class Zones:
+    """Pitch thresholds (degrees) of the bottom and top zones."""
+    bottom: float
+    top: float
+
+
+@dataclass
+class Rep:
+    """One repetition. ``start``, ``turn`` and ``end`` are sample numbers; ``end`` is exclusive."""
+    start: int
+    turn: int
+    end: int
+    down_s: float
+    up_s: float
+    bottom_hold_s: float
+    top_hold_s: float  # at the end of the rep when resting at the top, before it otherwise
+    turn_pitch: float
+    pitch_min: float
+    pitch_max: float
+    roll_min: float
+    roll_max: float
+    peak_gyro_dps: float
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+def gyro_magnitude(samples: np.ndarray) -> np.ndarray:
+    """Angular speed in deg/s from a structured sample array."""
+    return np.linalg.norm(np.stack([samples["gyro_x"], samples["gyro_y"], samples["gyro_z"]], axis=1)
+                          .astype(np.float64), axis=1)
+
+
+def trailing_mean(x: np.ndarray, window: int) -> np.ndarray:
+    """Causal moving average over the last ``window`` samples (fewer at the start)."""
+    x = np.asarray(x, dtype=np.float64)
+    csum = np.concatenate(([0.0], np.cumsum(x)))
+    stops = np.arange(1, len(x) + 1)
+    starts = np.maximum(stops - window, 0)
+    return (csum[stops] - csum[starts]) / (stops - starts)
+
+
+def smoothing_window(sample_rate: float, smooth_s: float) -> int:
+    return max(1, int(round(smooth_s * sample_rate)))
+
+
+def calibration_window(sample_rate: float, calibration_s: float) -> int:
+    return max(int(calibration_s * sample_rate), 1)
+
+
+def zones_from_range(low: float, high: float, zone: float = DEFAULT_ZONE) -> Zones:
+    """Zones covering the outer ``zone`` fraction of the pitch range at each end."""
+    return Zones(bottom=float(low + zone * (high - low)), top=float(high - zone * (high - low)))
+
+
+def calibrate_zones(smoothed_pitch: np.ndarray, min_excursion_deg: float = DEFAULT_MIN_EXCURSION_DEG,
+                    zone: float = DEFAULT_ZONE) -> Tuple[Optional[Zones], int]:
+    """Zones from the first full excursion and the index of the sample that completed it.
+
+    The excursion is complete at the first sample back within a quarter of
+    the farthest distance from the starting pitch, once that distance has
+    reached ``min_excursion_deg``. Returns ``(None, -1)`` if there is none.
+    """
+    x = np.asarray(smoothed_pitch, dtype=np.float64)
+    if len(x) == 0:
+        return None, -1
+    distance = np.abs(x - x[0])
+    farthest = np.maximum.accumulate(distance)
+    back = np.flatnonzero((farthest >= min_excursion_deg) & (distance <= RETURN_FRACTION * farthest))
+    if len(back) == 0:
+        return None, -1
+    at = int(back[0])
+    return zones_from_range(float(x[:at + 1].min()), float(x[:at + 1].max()), zone), at
+
+
+def classify(smoothed_pitch: np.ndarray, zones: Zones) -> np.ndarray:
+    """1 in the top zone, -1 in the bottom zone, 0 in between."""
+    return np.where(smoothed_pitch >= zones.top, 1, np.where(smoothed_pitch <= zones.bottom, -1, 0)).astype(np.int8)
+
+
+def _make_rep(rest: int, sample_rate: float, start: int, turn: int, end: int, far_hold: int, rest_hold: int,
+              turn_pitch: float, pitch_min: float, pitch_max: float, roll_min: float, roll_max: float,
+              peak_gyro: float) -> Rep:
+    away, back = (turn - start) / sample_rate, (end - turn) / sample_rate
+    far_hold_s, rest_hold_s = far_hold / sample_rate, rest_hold / sample_rate
+    resting_top = rest == 1
+    return Rep(start=start, turn=turn, end=end,
+               down_s=away if resting_top else back, up_s=back if resting_top else away,
+               bottom_hold_s=far_hold_s if resting_top else rest_hold_s,
+               top_hold_s=rest_hold_s if resting_top else far_hold_s,
+               turn_pitch=turn_pitch, pitch_min=pitch_min, pitch_max=pitch_max,
+               roll_min=roll_min, roll_max=roll_max, peak_gyro_dps=peak_gyro)
+
+
+def detect_reps(samples: np.ndarray, sample_rate: float, zones: Optional[Zones] = None,
+                hold_gyro_dps: float = DEFAULT_HOLD_GYRO_DPS, smooth_s: float = 0.25,
+                calibration_s: float = DEFAULT_CALIBRATION_S,
+                min_excursion_deg: float = DEFAULT_MIN_EXCURSION_DEG) -> List[Rep]:
+    """Complete reps in one hand's structured samples."""
+    x = trailing_mean(samples["pitch"], smoothing_window(sample_rate, smooth_s))
+    offset = 0
+    if zones is None:
+        zones, at = calibrate_zones(x, min_excursion_deg)
+        if zones is None:
+            return []
+        # Like the stream, only look back calibration_s from where the zones became known
+        offset = max(at + 1 - calibration_window(sample_rate, calibration_s), 0)
+        samples, x = samples[offset:], x[offset:]
+    zone = classify(x, zones)
+    in_zone = np.flatnonzero(zone)
+    if len(in_zone) < 3:
+        return []
+
+    # Consecutive visits to the same zone form one run; runs alternate top/bottom
+    z = zone[in_zone]
+    run_starts = np.concatenate(([0], np.flatnonzero(np.diff(z)) + 1))
+    run_stops = np.append(run_starts[1:], len(z))
+    kinds = z[run_starts]
+    first, last = in_zone[run_starts], in_zone[run_stops - 1]
+    rest = int(kinds[0])
+
+    still = gyro_magnitude(samples) < hold_gyro_dps
+    held = {kind: np.concatenate(([0], np.cumsum(still & (zone == kind)))) for kind in (1, -1)}
+    pitch, roll = samples["pitch"].astype(np.float64), samples["roll"].astype(np.float64)
+    gyro = gyro_magnitude(samples)
+
+    reps = []
+    for r in range(0, len(kinds) - 2, 2):
+        start, far_enter, far_exit, end = last[r] + 1, first[r + 1], last[r + 1] + 1, first[r + 2]
+        rest_exit = last[r + 2] + 1
+        far = x[far_enter:far_exit]
+        turn = int(far_enter + (np.argmax(far) if rest == -1 else np.argmin(far)))
+        reps.append(_make_rep(
+            rest, sample_rate, offset + int(start), offset + turn, offset + int(end),
+            far_hold=int(held[-rest][far_exit] - held[-rest][far_enter]),
+            rest_hold=int(held[rest][rest_exit] - held[rest][end]),
+            turn_pitch=float(x[turn]),
+            pitch_min=float(pitch[start:end].min()), pitch_max=float(pitch[start:end].max()),
+            roll_min=float(roll[start:end].min()), roll_max=float(roll[start:end].max()),
+            peak_gyro=float(gyro[start:end].max()),
+        ))
+    return reps
+
+
+def rep_bounds(samples: np.ndarray, sample_rate: float) -> List[Tuple[int, int]]:
+    """[start, end) sample ranges of the reps ``detect_reps`` finds."""
+    return [(rep.start, rep.end) for rep in detect_reps(samples, sample_rate)]
+
+
+class RepDetector:
+    """Sample-by-sample version of ``detect_reps``.
+
+    ``push`` returns the reps finalized by that sample. A rep is finalized
+    once its closing hold is over, i.e. when the next excursion reaches the
+    opposite zone, or on ``finish``. ``rep_count`` and ``phase`` already
+    reflect a rep as soon as the hand is back in the rest zone, for live
+    feedback.
+
+    Every ``push`` takes constant time. While calibrating, samples are only
+    buffered and the pitch range is tracked. Once the zones are known, the
+    buffered samples are replayed ``REPLAY_PER_SAMPLE`` at a time with each
+    new sample, so the live state catches up within a few seconds instead of
+    stalling one push.
+    """
+
+    def __init__(self, sample_rate: float, zones: Optional[Zones] = None,
+                 hold_gyro_dps: float = DEFAULT_HOLD_GYRO_DPS, smooth_s: float = 0.25,
+                 calibration_s: float = DEFAULT_CALIBRATION_S,
+                 min_excursion_deg: float = DEFAULT_MIN_EXCURSION_DEG):
+        self.sample_rate = sample_rate
+        self.zones = zones
+        self.hold_gyro_dps = hold_gyro_dps
+        self.min_excursion_deg = min_excursion_deg
+        self.window = smoothing_window(sample_rate, smooth_s)
+        self.reps: List[Rep] = []
+        self.count = 0
+        self._recent = deque()
+        self._sum = 0.0
+        # Samples kept until the zones are calibrated, then replayed
+        self._pending = deque()
+        self._calibration_window = calibration_window(sample_rate, calibration_s)
+        self._origin = None
+        self._farthest = 0.0
+        self._low = self._high = None
+
+        self.rest = 0
+        self.zone = 0
+        self.far_reached = False
+        self._excursion = None  # aggregates since the last rest-zone sample
+        self._closing = None  # completed rep waiting for its rest hold
+        self._rest_hold = 0
+
+    @property
+    def rep_count(self) -> int:
+        return len(self.reps) + (self._closing is not None)
+
+    @property
+    def phase(self) -> Optional[str]:
+        """"top", "bottom", "down" or "up"; None until the zones are known."""
+        if self.rest == 0:
+            return None
+        if self.zone != 0:
+            return "top" if self.zone == 1 else "bottom"
+        towards_far = self._excursion is not None and not self.far_reached
+        going_down = towards_far == (self.rest == 1)
+        return "down" if going_down else "up"
+
+    def push(self, pitch: float, roll: float, gyro: float) -> List[Rep]:
+        """Add one sample (degrees, degrees, deg/s)."""
+        self._recent.append(pitch)
+        self._sum += pitch
+        if len(self._recent) > self.window:
+            self._sum -= self._recent.popleft()
+        x = self._sum / len(self._recent)
+        i = self.count
+        self.count += 1
+        if self.zones is not None and not self._pending:
+            return self._step(i, x, pitch, roll, gyro)
+
+        self._pending.append((i, x, pitch, roll, gyro))
+        if self.zones is None:
+            if len(self._pending) > self._calibration_window:
+                self._pending.popleft()
+            self._calibrate(x)
+            return []
+        return self._replay(REPLAY_PER_SAMPLE)
+
+    def _calibrate(self, x: float):
+        """``calibrate_zones``, one sample at a time."""
+        if self._origin is None:
+            self._origin = self._low = self._high = x
+        self._low, self._high = min(self._low, x), max(self._high, x)
+        distance = abs(x - self._origin)
+        self._farthest = max(self._farthest, distance)
+        if self._farthest >= self.min_excursion_deg and distance <= RETURN_FRACTION * self._farthest:
+            self.zones = zones_from_range(self._low, self._high)
+
+    def _replay(self, limit: Optional[int] = None) -> List[Rep]:
+        """Step through up to ``limit`` buffered samples (all of them by default)."""
+        finished = []
+        while self._pending and (limit is None or limit > 0):
+            finished += self._step(*self._pending.popleft())
+            if limit is not None:
+                limit -= 1
+        return finished
+
+    def _step(self, i: int, x: float, pitch: float, roll: float, gyro: float) -> List[Rep]:
+        zones = self.zones
+        zone = 1 if x >= zones.top else -1 if x <= zones.bottom else 0
+        self.zone = zone
+        still = gyro < self.hold_gyro_dps
+        if zone != 0 and self.rest == 0:
+            self.rest = zone
+        if self.rest == 0:
+            return []
+        finished = []
+
+        if zone == self.rest:
+            if self._excursion is not None and self.far_reached:
+                # Back at rest: the rep is complete, its closing hold starts now
+                e = self._excursion
+                self._closing = dict(e, end=i)
+                self._rest_hold = 0
+            self._excursion = None
+            self.far_reached = False
+            if self._closing is not None and still:
+                self._rest_hold += 1
+            return finished
+
+        e = self._excursion
+        if e is None:
+            e = self._excursion = {"start": i, "turn": None, "turn_pitch": None, "far_hold": 0,
+                                   "pitch_min": pitch, "pitch_max": pitch, "roll_min": roll, "roll_max": roll,
+                                   "peak_gyro": gyro}
+        e["pitch_min"], e["pitch_max"] = min(e["pitch_min"], pitch), max(e["pitch_max"], pitch)
+        e["roll_min"], e["roll_max"] = min(e["roll_min"], roll), max(e["roll_max"], roll)
+        e["peak_gyro"] = max(e["peak_gyro"], gyro)
+        if zone == -self.rest:
+            if not self.far_reached and self._closing is not None:
+                finished.append(self._finalize())
+            self.far_reached = True
+            if e["turn"] is None or (x - e["turn_pitch"]) * self.rest < 0:
+                e["turn"], e["turn_pitch"] = i, x
+            if still:
+                e["far_hold"] += 1
+        return finished
+
+    def _closing_rep(self) -> Rep:
+        c = self._closing
+        return _make_rep(self.rest, self.sample_rate, c["start"], c["turn"], c["end"], c["far_hold"],
+                         self._rest_hold, c["turn_pitch"], c["pitch_min"], c["pitch_max"],
+                         c["roll_min"], c["roll_max"], c["peak_gyro"])
+
+    def _finalize(self) -> Rep:
+        rep = self._closing_rep()
+        self.reps.append(rep)
+        self._closing = None
+        return rep
+
+    @property
+    def last_rep(self) -> Optional[Rep]:
+        """Most recently completed rep; its closing hold may still be growing."""
+        if self._closing is not None:
+            return self._closing_rep()
+        return self.reps[-1] if self.reps else None
+
+    def finish(self) -> List[Rep]:
+        """Replay what is still buffered and finalize the last rep at the end of the stream."""
+        finished = self._replay() if self.zones is not None else []
+        return finished + ([self._finalize()] if self._closing is not None else [])
+
+
+def rep_summary(reps: List[Rep], digits: int = 2) -> Dict:
+    """Means over reps plus the per-rep list, compact enough for a prompt."""
+    def mean(name: str) -> Optional[float]:
+        return round(float(np.mean([getattr(rep, name) for rep in reps])), digits) if reps else None
+
+    per_rep = [{key: round(value, digits) if isinstance(value, float) else value
+                for key, value in rep.to_dict().items()} for rep in reps]
+    return {
+        "rep_count": len(reps),
+        "down_s_mean": mean("down_s"),
+        "up_s_mean": mean("up_s"),
+        "bottom_hold_s_mean": mean("bottom_hold_s"),
+        "top_hold_s_mean": mean("top_hold_s"),
+        "turn_pitch_mean": mean("turn_pitch"),
+        "per_rep": per_rep,
+    }
@@ -0,0 +1,160 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Sequence
+
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps
+from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, Generation
+
+DEFAULT_RESPONSE_CACHE_PATH = ".llm_cache/responses.sqlite"
+
+
+def response_key(prompt: str, llm_string: str) -> str:
+    """Content address of one rendered prompt under one model configuration."""
+    return hashlib.sha256(f"{llm_string}\0{prompt}".encode("utf-8")).hexdigest()
+
+
+def _encode(generations: Sequence[Generation]) -> str:
+    return json.dumps([
+        {
+            "text": generation.text,
+            "message": message_to_dict(generation.message) if isinstance(generation, ChatGeneration) else None,
+            "info": generation.generation_info,
+        }
+        for generation in generations
+    ])
+
+
+def _decode(value: str) -> List[Generation]:
+    generations = []
+    for item in json.loads(value):
+        if item["message"] is not None:
+            message = messages_from_dict([item["message"]])[0]
+            generations.append(ChatGeneration(message=message, generation_info=item["info"]))
+        else:
+            generations.append(Generation(text=item["text"], generation_info=item["info"]))
+    return generations
+
+
+class ResponseCache(BaseCache):
+    """On-disk LLM response cache for LangChain chat models.
+
+    Attach it with ``with_response_cache``. LangChain then looks up every call
+    by the model's ``llm_string`` (model name and parameters such as the
+    temperature) plus the fully rendered prompt, and only reaches the API on
+    a miss. Entries older than ``ttl_s`` are treated as misses. When the
+    stored responses exceed ``max_bytes``, the least recently used entries are
+    evicted.
+
+    Replies are replayed verbatim, so only enable this where the same prompt
+    is expected to give the same answer (e.g. ``temperature=0``).
+    """
+
+    def __init__(self, path: str = DEFAULT_RESPONSE_CACHE_PATH, ttl_s: Optional[float] = 7 * 24 * 3600,
+                 max_bytes: int = 256 * 1024 * 1024):
+        self.path = path
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses(last_used)")
+        self._conn.commit()
+
+    def _expired(self, created: float, now: float) -> bool:
+        return self.ttl_s is not None and now - created > self.ttl_s
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[List[Generation]]:
+        key = response_key(prompt, llm_string)
+        with self._lock:
+            now = time.time()
+            row = self._conn.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and self._expired(row[1], now):
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        return _decode(row[0])
+
+    def update(self, prompt: str, llm_string: str, return_val: Sequence[Generation]):
+        value = _encode(return_val)
+        with self._lock:
+            now = time.time()
+            self._conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                               (response_key(prompt, llm_string), value, len(value), now, now))
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float):
+        if self.ttl_s is not None:
+            self._conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl_s,))
+        (total,) = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if total <= self.max_bytes:
+            return
+        # Drop least recently used rows until the total fits
+        excess = total - self.max_bytes
+        keys = []
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY last_used"):
+            keys.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", keys)
+
+    def clear(self, **kwargs):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def contains(self, llm, messages: List[BaseMessage]) -> bool:
+        """Whether calling ``llm`` with ``messages`` would be answered from this cache.
+
+        Rebuilds the key the way LangChain chat models do, so callers can skip
+        rate limiting for calls that never reach the API.
+        """
+        messages = [message.model_copy(update={"id": None}) if getattr(message, "id", None) is not None
+                    else message for message in messages]
+        key = response_key(dumps(messages), llm._get_llm_string())
+        with self._lock:
+            row = self._conn.execute("SELECT created FROM responses WHERE key = ?", (key,)).fetchone()
+        return row is not None and not self._expired(row[0], time.time())
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters since construction."""
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0}
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def with_response_cache(llm, cache: Optional[ResponseCache]):
+    """Copy of a LangChain chat model that answers from ``cache``; ``llm`` itself if cache is None."""
+    if cache is None:
+        return llm
+    return llm.model_copy(update={"cache": cache})
@@ -0,0 +1,148 @@
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+def normalize_query(query: str) -> str:
+    """Cache key of a query: case and whitespace differences are ignored."""
+    return re.sub(r"\s+", " ", query).strip().casefold()
+
+
+class RetrievalCache:
+    """In-memory cache of ``RAGAgent`` retrievals.
+
+    A query is first looked up by its normalized text, which skips both the
+    embedding and the search. With ``similarity_threshold`` set, a query that
+    missed is embedded and compared with the cached query embeddings. If its
+    cosine similarity to one of them reaches the threshold, that query's
+    results are reused and only the search is skipped. This catches rephrased
+    questions such as "left hand ROM" and "range of motion left hand". Pick
+    the threshold for the embedding model in use; 0.95 is a cautious start
+    for OpenAI text embeddings.
+
+    Entries remember the store ``version`` they were retrieved from, and the
+    whole cache is dropped as soon as the store reports a different one. An
+    entry retrieved with ``k`` results also answers requests for fewer, and
+    for more if the store returned fewer than ``k`` (it holds no more). At
+    most ``max_entries`` queries are kept; the least recently used are
+    evicted first.
+    """
+
+    def __init__(self, max_entries: int = 1024, similarity_threshold: Optional[float] = None):
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self.entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self.version = None
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        # Unit-length query embeddings, one row per slot, for the similarity lookup
+        self._vectors: Optional[np.ndarray] = None
+        self._slot_keys: List[Optional[str]] = []
+        self._free: List[int] = []
+        self._lock = threading.Lock()
+
+    def _reset(self):
+        self.entries.clear()
+        self._slot_keys = [None] * len(self._slot_keys)
+        self._free = list(range(len(self._slot_keys)))
+
+    def _check_version(self, version):
+        if version != self.version:
+            if self.entries:
+                self.invalidations += 1
+            self._reset()
+            self.version = version
+
+    @staticmethod
+    def _covers(entry: Dict, k: int) -> bool:
+        """Whether ``entry`` holds all results a search for ``k`` would return."""
+        return entry["k"] >= k or len(entry["results"]) < entry["k"]
+
+    @staticmethod
+    def _results(entry: Dict, k: int) -> List[Dict]:
+        return [dict(result) for result in entry["results"][:k]]
+
+    def get(self, query: str, k: int, version) -> Optional[List[Dict]]:
+        """Results of an earlier retrieval of the same query text, or None."""
+        with self._lock:
+            self._check_version(version)
+            key = normalize_query(query)
+            entry = self.entries.get(key)
+            if entry is None or not self._covers(entry, k):
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self._results(entry, k)
+
+    def get_similar(self, embedding: np.ndarray, k: int, version) -> Optional[List[Dict]]:
+        """Results of the most similar cached query if it reaches ``similarity_threshold``.
+
+        Called after ``get`` missed; a query that misses both counts as one miss.
+        """
+        with self._lock:
+            self._check_version(version)
+            if self.similarity_threshold is not None and self.entries and self._vectors is not None \
+                    and len(embedding) == self._vectors.shape[1]:
+                similarity = self._vectors @ self._unit(embedding)
+                for slot in np.argsort(-similarity):
+                    if similarity[slot] < self.similarity_threshold:
+                        break
+                    key = self._slot_keys[slot]
+                    if key is not None and self._covers(self.entries[key], k):
+                        self.entries.move_to_end(key)
+                        self.semantic_hits += 1
+                        return self._results(self.entries[key], k)
+            self.misses += 1
+            return None
+
+    @staticmethod
+    def _unit(embedding: np.ndarray) -> np.ndarray:
+        embedding = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm > 0 else embedding
+
+    def put(self, query: str, embedding: np.ndarray, k: int, results: List[Dict], version):
+        """Remember the results of searching the store at ``version`` for ``query``."""
+        with self._lock:
+            self._check_version(version)
+            key = normalize_query(query)
+            unit = self._unit(embedding)
+            if self._vectors is None or self._vectors.shape[1] != len(unit):
+                self._vectors = np.zeros((self.max_entries, len(unit)), dtype=np.float32)
+                self._slot_keys = [None] * self.max_entries
+                self._reset()
+
+            entry = self.entries.pop(key, None)
+            if entry is None:
+                if not self._free:
+                    _, evicted = self.entries.popitem(last=False)
+                    self._slot_keys[evicted["slot"]] = None
+                    self._free.append(evicted["slot"])
+                entry = {"slot": self._free.pop()}
+            entry.update(k=k, results=[dict(result) for result in results])
+            self.entries[key] = entry
+            self._slot_keys[entry["slot"]] = key
+            self._vectors[entry["slot"]] = unit
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters since construction."""
+        lookups = self.hits + self.semantic_hits + self.misses
+        return {
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_rate": (self.hits + self.semantic_hits) / lookups if lookups else 0.0,
+        }
+
+    def __len__(self) -> int:
+        return len(self.entries)
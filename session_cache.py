@@ -0,0 +1,156 @@
+"""Binary cache for ``imu-data/*.js`` recordings.
+
+Each recording ``foo.js`` is converted once into ``foo.js.imu.npy`` (a
+structured array with SAMPLE_DTYPE) plus ``foo.js.imu.json`` holding the
+source path, mtime and size it was built from, and the parser's counts of
+lines, samples and skipped malformed lines. Later loads ``np.load`` the
+``.npy`` with ``mmap_mode="r"``, so no JSON is decoded until the source
+file changes.
+
+Bulk-convert a directory with::
+
+    python session_cache.py imu-data
+"""
+import argparse
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from imu_parser import IMUStreamParser, ParseStats, open_recording
+from imu_session import IMUSession, hand_from_filename, samples_from_matrix
+
+CACHE_VERSION = 2
+CACHE_SUFFIX = ".imu.npy"
+META_SUFFIX = ".imu.json"
+
+
+def cache_paths(source: str) -> Tuple[str, str]:
+    """Return the (array, metadata) cache paths for a recording."""
+    return f"{source}{CACHE_SUFFIX}", f"{source}{META_SUFFIX}"
+
+
+def _fingerprint(source: str, hand: str) -> Dict:
+    stat = os.stat(source)
+    return {
+        "version": CACHE_VERSION,
+        "source": os.path.abspath(source),
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "hand": hand,
+    }
+
+
+def _read_meta(source: str) -> Optional[Dict]:
+    array_path, meta_path = cache_paths(source)
+    if not (os.path.exists(array_path) and os.path.exists(meta_path)):
+        return None
+    try:
+        with open(meta_path, "r") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def is_fresh(source: str, hand: Optional[str] = None) -> bool:
+    """Check whether the cache for ``source`` matches its current mtime and size."""
+    meta = _read_meta(source)
+    if meta is None:
+        return False
+    expected = _fingerprint(source, hand or hand_from_filename(source))
+    return all(meta.get(key) == value for key, value in expected.items())
+
+
+def convert(source: str, hand: Optional[str] = None) -> Dict:
+    """Parse ``source`` and write its binary cache, returning the metadata."""
+    hand = hand or hand_from_filename(source)
+    array_path, meta_path = cache_paths(source)
+    meta = _fingerprint(source, hand)
+
+    with open_recording(source) as f:
+        parser = IMUStreamParser(f)
+        samples = samples_from_matrix(parser.read_array(), hand)
+    meta.update(lines=parser.stats.lines, samples=parser.stats.samples, skipped=parser.stats.skipped,
+                skipped_lines=parser.stats.skipped_lines)
+
+    # Write to temporary files and rename so readers never see a partial cache;
+    # the metadata goes last and acts as the commit marker.
+    tmp_array = f"{array_path}.tmp"
+    with open(tmp_array, "wb") as f:
+        np.save(f, samples)
+    os.replace(tmp_array, array_path)
+    tmp_meta = f"{meta_path}.tmp"
+    with open(tmp_meta, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp_meta, meta_path)
+    return meta
+
+
+def load_recording(source: str, hand: Optional[str] = None, refresh: bool = False) -> np.ndarray:
+    """Load one recording as a read-only memory-mapped structured array.
+
+    The cache is (re)built first if it is missing, stale or ``refresh`` is set.
+    """
+    if refresh or not is_fresh(source, hand):
+        convert(source, hand)
+    array_path, _ = cache_paths(source)
+    return np.load(array_path, mmap_mode="r")
+
+
+def cached_parse_stats(source: str) -> Optional[ParseStats]:
+    """ParseStats recorded when the cache for ``source`` was built, if there is one."""
+    meta = _read_meta(source)
+    if meta is None:
+        return None
+    return ParseStats(lines=meta.get("lines", 0), samples=meta.get("samples", 0),
+                      skipped=meta.get("skipped", 0), skipped_lines=list(meta.get("skipped_lines", [])))
+
+
+def load_session(files: Dict[str, str], timestamp: str = "", sample_rate: Optional[float] = None,
+                 patient_id: Optional[str] = None, session_id: Optional[str] = None) -> IMUSession:
+    """Build an IMUSession from cached recordings, e.g. ``{"left": "left.js"}``."""
+    hands = {hand: load_recording(source, hand) for hand, source in files.items()}
+    return IMUSession(hands, timestamp, sample_rate, patient_id, session_id)
+
+
+def convert_directory(data_dir: str, force: bool = False,
+                      recursive: bool = False) -> List[Tuple[str, bool]]:
+    """Convert every ``.js`` recording under ``data_dir``.
+
+    Returns ``(path, converted)`` pairs; ``converted`` is False when the
+    existing cache was already fresh.
+    """
+    results = []
+    for root, dirs, filenames in os.walk(data_dir):
+        dirs.sort()
+        for filename in sorted(filenames):
+            if not filename.endswith(".js"):
+                continue
+            source = os.path.join(root, filename)
+            if force or not is_fresh(source):
+                convert(source)
+                results.append((source, True))
+            else:
+                results.append((source, False))
+        if not recursive:
+            break
+    return results
+
+
+def main(argv: Optional[List[str]] = None):
+    """Command line entry point for bulk conversion."""
+    parser = argparse.ArgumentParser(description="Convert IMU .js recordings to memory-mappable .npy caches.")
+    parser.add_argument("data_dir", nargs="?", default="imu-data", help="Directory containing .js recordings")
+    parser.add_argument("--force", action="store_true", help="Rebuild caches even if they are fresh")
+    parser.add_argument("--recursive", action="store_true", help="Descend into subdirectories")
+    args = parser.parse_args(argv)
+
+    results = convert_directory(args.data_dir, force=args.force, recursive=args.recursive)
+    for source, converted in results:
+        print(f"{'converted' if converted else 'up to date'}: {source}")
+    print(f"{sum(converted for _, converted in results)} of {len(results)} recording(s) converted")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""Vector store split into per-patient (or hashed) shards.
+
+Each shard is an ordinary VectorStore saved under ``<directory>/<shard>``;
+``shards.json`` records the sharding scheme and the shard names. Shards are
+loaded from disk only when a query or write needs them, and searches fan out
+over a thread pool (FAISS releases the GIL while searching) before the
+per-shard top-k lists are merged.
+"""
+import heapq
+import json
+import os
+import re
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from imu_session import IMUSession
+from vector_store import FILTER_KEYS, VectorStore, document_metadata
+from window_embeddings import WindowEmbedder
+
+SHARD_BY = ("patient", "hash")
+MANIFEST = "shards.json"
+UNASSIGNED = "unassigned"
+
+
+def patient_of(document) -> Optional[str]:
+    """Patient ID of a document, or None."""
+    metadata = document_metadata(document)
+    value = next((metadata[key] for key in FILTER_KEYS["patient"] if key in metadata), None)
+    return None if value is None else str(value)
+
+
+class ShardedVectorStore:
+    """VectorStore facade over many shards.
+
+    ``shard_by="patient"`` gives every patient its own shard, so deleting or
+    querying one patient touches one small index. ``shard_by="hash"``
+    spreads patients over ``num_shards`` shards of similar size, which suits
+    clinics with many patients and few windows each. Extra keyword arguments
+    (``index_type``, ``nprobe``, ...) configure each shard's VectorStore.
+
+    Result dicts are those of ``VectorStore.search_batch`` plus a ``shard``
+    key; ``index`` is the vector ID within that shard.
+
+    The worker threads start on the first fan-out. Use the store as a
+    context manager, or call ``close``, to shut them down.
+    """
+
+    def __init__(self, directory: Optional[str] = None, shard_by: str = "patient", num_shards: int = 16,
+                 embedder: Optional[WindowEmbedder] = None, max_workers: Optional[int] = None,
+                 **store_kwargs):
+        if shard_by not in SHARD_BY:
+            raise ValueError(f"Unknown shard_by '{shard_by}', expected one of {SHARD_BY}")
+        self.directory = directory
+        self.shard_by = shard_by
+        self.num_shards = num_shards
+        self.embedder = embedder
+        self.store_kwargs = store_kwargs
+        self.max_workers = max_workers or min(32, os.cpu_count() or 1)
+        self.shards: Dict[str, VectorStore] = {}  # Loaded shards
+        self.shard_names = set()  # Every known shard, loaded or on disk
+        self._lock = threading.Lock()
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    def shard_name(self, patient: Optional[str]) -> str:
+        """Shard holding a patient's vectors."""
+        if self.shard_by == "hash":
+            key = UNASSIGNED if patient is None else patient
+            return f"shard-{zlib.crc32(key.encode('utf-8')) % self.num_shards:04d}"
+        if patient is None:
+            return UNASSIGNED
+        safe = re.sub(r"[^A-Za-z0-9_.-]", "_", patient)
+        # Keep names unique when sanitizing collapses different IDs
+        return f"patient-{safe}-{zlib.crc32(patient.encode('utf-8')):08x}"
+
+    def _new_store(self) -> VectorStore:
+        return VectorStore(embedder=self.embedder, **self.store_kwargs)
+
+    def shard(self, name: str, create: bool = False) -> Optional[VectorStore]:
+        """Return a shard, loading it from disk on first use."""
+        with self._lock:
+            store = self.shards.get(name)
+        if store is not None:
+            return store
+        # Read outside the lock so a fan-out loads its shards in parallel
+        path = os.path.join(self.directory, name, "index") if self.directory else None
+        if path is not None and os.path.exists(f"{path}.faiss"):
+            store = self._new_store()
+            store.load(path)
+        elif create:
+            store = self._new_store()
+        else:
+            return None
+        with self._lock:
+            self.shard_names.add(name)
+            return self.shards.setdefault(name, store)
+
+    def _shards_for(self, filters: Optional[Dict]) -> List[str]:
+        """Names of the shards that can hold results matching ``filters``."""
+        wanted = (filters or {}).get("patient")
+        if wanted is None:
+            return sorted(self.shard_names)
+        values = wanted if isinstance(wanted, (list, tuple, set)) else [wanted]
+        names = {self.shard_name(str(value)) for value in values}
+        return sorted(names & self.shard_names)
+
+    def _executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers)
+            return self._pool
+
+    def _map(self, fn, names: Sequence[str]) -> List:
+        """Apply ``fn`` to each named shard on the thread pool, preserving order."""
+        return list(self._executor().map(lambda name: fn(name, self.shard(name)), names))
+
+    def add_vectors(self, embeddings: np.ndarray, documents: List[Dict]) -> Dict[str, np.ndarray]:
+        """Route each vector to its patient's shard and add the groups in parallel.
+
+        Returns the assigned IDs per shard.
+        """
+        if len(documents) != len(embeddings):
+            raise ValueError("Every vector needs a document to be routed to a shard")
+        groups: Dict[str, List[int]] = {}
+        for row, document in enumerate(documents):
+            groups.setdefault(self.shard_name(patient_of(document)), []).append(row)
+        for name in groups:
+            self.shard(name, create=True)
+
+        def add(name: str, store: VectorStore) -> np.ndarray:
+            rows = groups[name]
+            return store.add_vectors(embeddings[rows], [documents[row] for row in rows])
+
+        names = sorted(groups)
+        return dict(zip(names, self._map(add, names)))
+
+    def index_session(self, session: IMUSession) -> Dict[str, np.ndarray]:
+        """Embed a session's motion windows locally and add them to its patient's shard."""
+        if self.embedder is None:
+            raise ValueError("index_session requires a ShardedVectorStore created with an embedder")
+        vectors, documents = self.embedder.embed_session(session)
+        if not len(vectors):
+            return {}
+        return self.add_vectors(vectors, documents)
+
+    def search_batch(self, queries: np.ndarray, k: int = 5, filters: Optional[Dict] = None) -> List[List[Dict]]:
+        """Search the shards a query can match in parallel and merge their top-k lists."""
+        queries = np.ascontiguousarray(np.atleast_2d(queries), dtype='float32')
+        names = self._shards_for(filters)
+
+        def search(name: str, store: VectorStore) -> List[List[Dict]]:
+            if store is None or store.index is None:
+                return [[] for _ in range(len(queries))]
+            results = store.search_batch(queries, k, filters)
+            for row in results:
+                for result in row:
+                    result['shard'] = name
+            return results
+
+        per_shard = self._map(search, names)
+        return [
+            list(islice(heapq.merge(*(results[q] for results in per_shard), key=lambda r: r['distance']), k))
+            for q in range(len(queries))
+        ]
+
+    def search(self, query_vector: np.ndarray, k: int = 5, filters: Optional[Dict] = None) -> List[Dict]:
+        """Search for the k nearest neighbours of one query vector across shards."""
+        return self.search_batch(np.atleast_2d(query_vector)[:1], k, filters)[0]
+
+    def remove_patient(self, patient: str) -> int:
+        """Delete every vector of one patient; returns the number removed."""
+        return self.remove_matching({"patient": patient})
+
+    def remove_matching(self, filters: Dict) -> int:
+        """Delete the vectors matching ``filters`` from every shard that can hold them.
+
+        Shards whose files are missing hold nothing to delete and are skipped.
+        """
+        names = self._shards_for(filters)
+        return sum(self._map(lambda name, store: store.remove_matching(filters) if store is not None else 0, names))
+
+    def save(self, directory: Optional[str] = None):
+        """Persist the loaded shards in parallel and write the manifest.
+
+        Shards already saved in ``directory`` only append their changes (see
+        ``VectorStore.save_incremental``); unloaded shards are untouched.
+        """
+        directory = directory or self.directory
+        if directory is None:
+            raise ValueError("No directory given to save the shards to")
+        if directory != self.directory:
+            # Moving the store: every shard has to be written out
+            for name in sorted(self.shard_names):
+                self.shard(name)
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+
+        def save(name: str, store: VectorStore):
+            if store.index is not None:
+                os.makedirs(os.path.join(directory, name), exist_ok=True)
+                store.save_incremental(os.path.join(directory, name, "index"))
+
+        self._map(save, sorted(self.shards))
+        tmp_path = os.path.join(directory, f"{MANIFEST}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "shard_by": self.shard_by,
+                "num_shards": self.num_shards,
+                "embedder": self.embedder.config() if self.embedder is not None else None,
+                "store_kwargs": self.store_kwargs,
+                "shards": sorted(name for name in self.shard_names
+                                 if name not in self.shards or self.shards[name].index is not None),
+            }, f)
+        os.replace(tmp_path, os.path.join(directory, MANIFEST))
+
+    @classmethod
+    def load(cls, directory: str, max_workers: Optional[int] = None) -> "ShardedVectorStore":
+        """Open a saved store; shards are read lazily when first searched or written."""
+        with open(os.path.join(directory, MANIFEST), "r") as f:
+            manifest = json.load(f)
+        embedder = WindowEmbedder.from_config(manifest["embedder"]) if manifest.get("embedder") else None
+        store = cls(directory, manifest["shard_by"], manifest["num_shards"], embedder, max_workers,
+                    **manifest.get("store_kwargs", {}))
+        store.shard_names.update(manifest["shards"])
+        return store
+
+    @property
+    def version(self) -> int:
+        """Changes whenever a shard is loaded or its vectors change."""
+        with self._lock:
+            stores = list(self.shards.values())
+        # Every shard's counter is positive once it holds data and only grows
+        return sum(store.version for store in stores)
+
+    def loaded_shards(self) -> List[Tuple[str, int]]:
+        """(name, vector count) of the shards currently in memory."""
+        return [(name, len(store)) for name, store in sorted(self.shards.items())]
+
+    def close(self):
+        """Shut down the worker threads; a later fan-out starts new ones."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+    def __enter__(self) -> "ShardedVectorStore":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self) -> int:
+        """Number of vectors across all shards (loads every shard; missing ones count as empty)."""
+        return sum(len(store) for store in map(self.shard, sorted(self.shard_names)) if store is not None)
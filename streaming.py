@@ -0,0 +1,386 @@
+"""Live ingestion of headset samples with incrementally updated motion features.
+
+    python streaming.py --replay imu-data/left_updown.js imu-data/right_updown.js
+    python streaming.py --listen 127.0.0.1:8765
+    headset-bridge | python streaming.py --stdin --hand left
+
+Input is one sample per line in the recording format (the ``data=[`` wrapper
+and list commas are tolerated), optionally with a ``"hand"`` key. Every
+``--publish-every`` samples a feature snapshot is written to stdout as one
+JSON line, for the VR game to read.
+
+Each sample updates the features in constant time, independent of how long
+the stream has been running. Range of motion and angular velocity cover the
+last ``window_s`` seconds. Reps, with their up/down durations, holds and
+peak angles, come from ``rep_detection.RepDetector``. Bilateral lag is
+an exponentially weighted cross-correlation of the two pitch signals over
+lags up to ``max_lag_s``.
+"""
+import argparse
+import asyncio
+import math
+import sys
+from collections import deque
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from imu_parser import CHANNELS, PARSE_ERRORS, IMUStreamParser, open_recording, parse_line
+from imu_session import hand_from_filename
+from motion_features import DEFAULT_SAMPLE_RATE, format_features
+from rep_detection import RepDetector
+
+COLUMNS = {name: i for i, name in enumerate(CHANNELS)}
+
+
+class RingBuffer:
+    """The most recent ``capacity`` rows of a stream, addressed by absolute sample number."""
+
+    def __init__(self, capacity: int, width: int = len(CHANNELS)):
+        self.capacity = capacity
+        self.data = np.zeros((capacity, width), dtype=np.float32)
+        self.count = 0
+
+    def append(self, row: Sequence[float]):
+        self.data[self.count % self.capacity] = row
+        self.count += 1
+
+    def __getitem__(self, i: int) -> np.ndarray:
+        if not self.count - self.capacity <= i < self.count:
+            raise IndexError(f"sample {i} is no longer buffered")
+        return self.data[i % self.capacity]
+
+    def latest(self, n: Optional[int] = None) -> np.ndarray:
+        """Up to ``n`` most recent rows, oldest first."""
+        n = min(n or self.capacity, self.count, self.capacity)
+        rows = np.arange(self.count - n, self.count) % self.capacity
+        return self.data[rows]
+
+    def __len__(self) -> int:
+        return min(self.count, self.capacity)
+
+
+class SlidingExtrema:
+    """Minimum and maximum over the last ``window`` values (monotonic deques, amortized O(1))."""
+
+    def __init__(self, window: int):
+        self.window = window
+        self._min = deque()  # (sample, value), values increasing
+        self._max = deque()  # (sample, value), values decreasing
+
+    def push(self, i: int, value: float):
+        while self._min and self._min[-1][1] >= value:
+            self._min.pop()
+        while self._max and self._max[-1][1] <= value:
+            self._max.pop()
+        self._min.append((i, value))
+        self._max.append((i, value))
+        for queue in (self._min, self._max):
+            while queue[0][0] <= i - self.window:
+                queue.popleft()
+
+    @property
+    def min(self) -> Optional[float]:
+        return self._min[0][1] if self._min else None
+
+    @property
+    def max(self) -> Optional[float]:
+        return self._max[0][1] if self._max else None
+
+
+class HandTracker:
+    """Ring buffer and incrementally updated features for one hand."""
+
+    def __init__(self, sample_rate: float = DEFAULT_SAMPLE_RATE, window_s: float = 10.0):
+        self.sample_rate = sample_rate
+        self.window = max(int(round(window_s * sample_rate)), 2)
+        self.buffer = RingBuffer(self.window)
+        self.pitch = SlidingExtrema(self.window)
+        self.roll = SlidingExtrema(self.window)
+        self.gyro = SlidingExtrema(self.window)
+        self.pitch_min = self.pitch_max = None
+        self._gyro_sum = 0.0
+        self._gyro_values = deque()
+        # EMA roughly matching the 0.25 s moving average used offline
+        self._alpha = 2.0 / (max(1, int(round(0.25 * sample_rate))) + 1)
+        self.smoothed_pitch = None
+        self.pitch_rate = 0.0
+        self.reps = RepDetector(sample_rate)
+
+    @property
+    def count(self) -> int:
+        return self.buffer.count
+
+    def add(self, row: Sequence[float]):
+        i = self.buffer.count
+        self.buffer.append(row)
+        pitch, roll = float(row[COLUMNS["pitch"]]), float(row[COLUMNS["roll"]])
+        gyro = math.sqrt(sum(float(row[COLUMNS[axis]]) ** 2 for axis in ("gyro_x", "gyro_y", "gyro_z")))
+
+        self.pitch.push(i, pitch)
+        self.roll.push(i, roll)
+        self.gyro.push(i, gyro)
+        self.pitch_min = pitch if self.pitch_min is None else min(self.pitch_min, pitch)
+        self.pitch_max = pitch if self.pitch_max is None else max(self.pitch_max, pitch)
+
+        self._gyro_values.append(gyro)
+        self._gyro_sum += gyro
+        if len(self._gyro_values) > self.window:
+            self._gyro_sum -= self._gyro_values.popleft()
+
+        previous = self.smoothed_pitch
+        self.smoothed_pitch = pitch if previous is None else previous + self._alpha * (pitch - previous)
+        if previous is not None:
+            self.pitch_rate = (self.smoothed_pitch - previous) * self.sample_rate
+        self.reps.push(pitch, roll, gyro)
+
+    def finish(self):
+        """Detect reps in the samples still buffered for calibration, at the end of the stream."""
+        self.reps.finish()
+
+    def features(self) -> Dict:
+        if not self.count:
+            return {"samples": 0}
+        latest = self.buffer[self.count - 1]
+        last_rep = self.reps.last_rep
+        return {
+            "samples": self.count,
+            "pitch": float(latest[COLUMNS["pitch"]]),
+            "roll": float(latest[COLUMNS["roll"]]),
+            "range_of_motion": {
+                "pitch_window": self.pitch.max - self.pitch.min,
+                "roll_window": self.roll.max - self.roll.min,
+                "pitch_session": self.pitch_max - self.pitch_min,
+            },
+            "angular_velocity": {
+                "gyro_magnitude": self._gyro_values[-1],
+                "gyro_magnitude_mean": self._gyro_sum / len(self._gyro_values),
+                "gyro_magnitude_max": self.gyro.max,
+                "pitch_rate": self.pitch_rate,
+            },
+            "reps": {
+                "rep_count": self.reps.rep_count,
+                "phase": self.reps.phase,
+                "last_rep": last_rep.to_dict() if last_rep is not None else None,
+            },
+        }
+
+
+class BilateralLagTracker:
+    """Exponentially weighted cross-correlation of left and right pitch.
+
+    Each sample pair updates all ``2 * max_lag + 1`` lags at once, so the
+    cost per sample is fixed. A positive lag means the right hand trails the
+    left, as in ``motion_features.bilateral_lag``.
+    """
+
+    def __init__(self, max_lag: int, half_life: int):
+        self.max_lag = max_lag
+        self.decay = 0.5 ** (1.0 / max(half_life, 1))
+        self.xcorr = np.zeros(2 * max_lag + 1)
+        self.power = np.zeros(2)
+        self.means = None
+        self.left = RingBuffer(max_lag + 1, 1)
+        self.right = RingBuffer(max_lag + 1, 1)
+
+    @property
+    def count(self) -> int:
+        return self.left.count
+
+    def add(self, left: float, right: float):
+        """Add the next pair of simultaneous samples."""
+        if self.means is None:
+            self.means = np.array([left, right], dtype=np.float64)
+        self.means += (1 - self.decay) * (np.array([left, right]) - self.means)
+        a, b = left - self.means[0], right - self.means[1]
+        self.left.append((a,))
+        self.right.append((b,))
+        lags = len(self.left)
+        # Newest first: a[t], a[t-1], ..., a[t-lags+1]
+        past_a = self.left.latest(lags)[::-1, 0]
+        past_b = self.right.latest(lags)[::-1, 0]
+        self.xcorr *= self.decay
+        self.power *= self.decay
+        self.xcorr[self.max_lag:self.max_lag + lags] += b * past_a       # b[t] * a[t - lag]
+        self.xcorr[self.max_lag - lags + 1:self.max_lag] += a * past_b[:0:-1]  # a[t] * b[t - |lag|]
+        self.power += (a * a, b * b)
+
+    def features(self, sample_rate: float) -> Dict:
+        norm = math.sqrt(self.power[0] * self.power[1])
+        if self.count < 2 or norm == 0:
+            return {"lag_samples": None, "lag_s": None, "correlation": None}
+        best = int(np.argmax(self.xcorr))
+        lag = best - self.max_lag
+        return {"lag_samples": lag, "lag_s": lag / sample_rate, "correlation": float(self.xcorr[best] / norm)}
+
+
+class LiveFeatures:
+    """Per-hand trackers plus the bilateral lag once both hands stream."""
+
+    def __init__(self, sample_rate: float = DEFAULT_SAMPLE_RATE, window_s: float = 10.0,
+                 max_lag_s: float = 1.0):
+        self.sample_rate = sample_rate
+        self.window_s = window_s
+        self.hands: Dict[str, HandTracker] = {}
+        self.bilateral = BilateralLagTracker(max(int(round(max_lag_s * sample_rate)), 1),
+                                             max(int(round(window_s * sample_rate)), 1))
+        self.next_pair = 0  # sample number of the next left/right pair to correlate
+
+    def add(self, hand: str, row: Sequence[float]):
+        tracker = self.hands.get(hand)
+        if tracker is None:
+            tracker = self.hands[hand] = HandTracker(self.sample_rate, self.window_s)
+        tracker.add(row)
+        if hand in ("left", "right") and "left" in self.hands and "right" in self.hands:
+            left, right = self.hands["left"], self.hands["right"]
+            paired = min(left.count, right.count)
+            # Samples the leading hand has already dropped from its buffer cannot be paired
+            capacity = min(left.buffer.capacity, right.buffer.capacity)
+            start = max(self.next_pair, max(left.count, right.count) - capacity)
+            for i in range(start, paired):
+                self.bilateral.add(float(left.buffer[i][COLUMNS["pitch"]]), float(right.buffer[i][COLUMNS["pitch"]]))
+            self.next_pair = max(self.next_pair, paired)
+
+    def finish(self, hands: Optional[Sequence[str]] = None):
+        """End the stream of ``hands`` (all of them by default)."""
+        for hand in self.hands if hands is None else hands:
+            self.hands[hand].finish()
+
+    def snapshot(self) -> Dict:
+        """Current features, in the layout of ``extract_features`` where they overlap."""
+        features = {
+            "sample_rate_hz": self.sample_rate,
+            "hands": {hand: tracker.features() for hand, tracker in self.hands.items()},
+        }
+        if "left" in self.hands and "right" in self.hands:
+            features["bilateral"] = self.bilateral.features(self.sample_rate)
+        return features
+
+
+class StreamingIngestionService:
+    """Feeds samples from sockets, pipes or replayed recordings into LiveFeatures.
+
+    ``on_features`` receives a snapshot after every ``publish_every``
+    samples.
+    """
+
+    def __init__(self, features: Optional[LiveFeatures] = None,
+                 on_features: Optional[Callable[[Dict], None]] = None, publish_every: int = 5):
+        self.features = features or LiveFeatures()
+        self.on_features = on_features
+        self.publish_every = publish_every
+        self.samples = 0
+        self.skipped = 0
+
+    def feed(self, hand: str, row: Sequence[float]):
+        self.features.add(hand, row)
+        self.samples += 1
+        if self.on_features is not None and self.samples % self.publish_every == 0:
+            self.on_features(self.features.snapshot())
+
+    def feed_line(self, line, default_hand: str = "unknown") -> Optional[str]:
+        """Parse and feed one line and return its hand; malformed lines are counted in ``skipped``."""
+        try:
+            parsed = parse_line(line)
+        except PARSE_ERRORS:
+            self.skipped += 1
+            return None
+        if parsed is None:
+            return None
+        sample, row = parsed
+        hand = sample.get("hand", default_hand)
+        self.feed(hand, row)
+        return hand
+
+    async def ingest_reader(self, reader: asyncio.StreamReader, default_hand: str = "unknown"):
+        """Feed newline-delimited samples until the reader reaches EOF, then end their hands' streams."""
+        hands = set()
+        while True:
+            line = await reader.readline()
+            if not line:
+                self.features.finish(sorted(hands))
+                return
+            hand = self.feed_line(line, default_hand)
+            if hand is not None:
+                hands.add(hand)
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8765, default_hand: str = "unknown"):
+        """Accept headset connections and ingest each one's samples."""
+        async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+            try:
+                await self.ingest_reader(reader, default_hand)
+            finally:
+                writer.close()
+
+        return await asyncio.start_server(handle, host, port)
+
+    async def ingest_stdin(self, default_hand: str = "unknown"):
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader()
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+        await self.ingest_reader(reader, default_hand)
+
+    async def replay(self, files: Dict[str, str], speed: float = 1.0):
+        """Feed recordings hand by hand, interleaved at the recorded sample rate times ``speed``."""
+        handles = [open_recording(path) for path in files.values()]
+        try:
+            streams = {hand: IMUStreamParser(f).batches(256) for hand, f in zip(files, handles)}
+            rows = {hand: iter(()) for hand in streams}
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            i = 0
+            while streams:
+                for hand in list(streams):
+                    row = next(rows[hand], None)
+                    if row is None:
+                        batch = next(streams[hand], None)
+                        if batch is None:
+                            del streams[hand]
+                            self.features.finish([hand])
+                            continue
+                        rows[hand] = iter(batch)
+                        row = next(rows[hand])
+                    self.feed(hand, row)
+                i += 1
+                if speed > 0:
+                    await asyncio.sleep(max(started + i / (self.features.sample_rate * speed) - loop.time(), 0))
+        finally:
+            for f in handles:
+                f.close()
+
+
+def main(argv: Optional[List[str]] = None):
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description="Stream IMU samples and print live motion features.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--replay", nargs="+", metavar="FILE", help="Replay recordings at their recorded rate")
+    source.add_argument("--listen", metavar="HOST:PORT", help="Accept newline-delimited samples over TCP")
+    source.add_argument("--stdin", action="store_true", help="Read newline-delimited samples from stdin")
+    parser.add_argument("--hand", default="unknown", help="Hand for samples without a 'hand' key")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed factor (0 = as fast as possible)")
+    parser.add_argument("--sample-rate", type=float, default=DEFAULT_SAMPLE_RATE)
+    parser.add_argument("--window", type=float, default=10.0, help="Seconds covered by the windowed features")
+    parser.add_argument("--publish-every", type=int, default=5, help="Samples between feature snapshots")
+    args = parser.parse_args(argv)
+
+    service = StreamingIngestionService(LiveFeatures(args.sample_rate, args.window),
+                                        on_features=lambda snapshot: print(format_features(snapshot), flush=True),
+                                        publish_every=args.publish_every)
+
+    async def run():
+        if args.replay:
+            await service.replay({hand_from_filename(path): path for path in args.replay}, args.speed)
+        elif args.stdin:
+            await service.ingest_stdin(args.hand)
+        else:
+            host, port = args.listen.rsplit(":", 1)
+            server = await service.serve(host, int(port), args.hand)
+            async with server:
+                await server.serve_forever()
+
+    asyncio.run(run())
+    print(format_features(service.features.snapshot()), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+import asyncio
+from typing import List
+
+import numpy as np
+import pytest
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+import main
+from agents import AgentSystem
+from checkpoints import CheckpointStore
+from embedding_cache import EmbeddingCache
+from imu_session import IMUSession, empty_samples
+from prompts import PROMPT_TEMPLATES, prompt_template
+
+NODES = ["analyze_data", "generate_exercises", "design_game", "plan_routine", "generate_report",
+         "generate_implementation"]
+
+
+class FakeChatModel(BaseChatModel):
+    """Replies "reply 1", "reply 2", ... after ``delay`` seconds, word by word when streamed."""
+    delay: float = 0.0
+    _calls: int = PrivateAttr(default=0)
+    _in_flight: int = PrivateAttr(default=0)
+    _max_in_flight: int = PrivateAttr(default=0)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+
+    def _next_reply(self) -> str:
+        self._calls += 1
+        return f"reply {self._calls} from the fake model"
+
+    def _generate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._next_reply()))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        self._in_flight += 1
+        self._max_in_flight = max(self._max_in_flight, self._in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            return self._generate(messages)
+        finally:
+            self._in_flight -= 1
+
+    async def _astream(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs):
+        for i, word in enumerate(self._next_reply().split(" ")):
+            await asyncio.sleep(0)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word if i == 0 else f" {word}"))
+
+
+def updown_session() -> IMUSession:
+    hands = {}
+    for hand in ("left", "right"):
+        samples = empty_samples(200)
+        samples["index"] = np.arange(200)
+        samples["pitch"] = 30 * np.sin(np.arange(200) / 10.0)
+        samples["gyro_x"] = np.gradient(samples["pitch"]) * 20
+        hands[hand] = samples
+    return IMUSession(hands, timestamp="2025-01-14T08:37:04", sample_rate=20.0)
+
+
+def agent_system(tmp_path, llm: FakeChatModel, **kwargs) -> AgentSystem:
+    system = AgentSystem("test-key", embedding_cache=EmbeddingCache(str(tmp_path / "embeddings")), **kwargs)
+    system.llm = llm
+    return system
+
+
+@pytest.fixture
+def edited_prompts(monkeypatch):
+    """Lets a test edit PROMPT_TEMPLATES; parsed prompts are rebuilt after every edit."""
+    def edit(name: str, text: str):
+        monkeypatch.setitem(PROMPT_TEMPLATES, name, text)
+        prompt_template.cache_clear()
+
+    yield edit
+    monkeypatch.undo()
+    prompt_template.cache_clear()
+
+
+def test_prompt_change_recomputes_from_the_first_stale_node(tmp_path, edited_prompts):
+    llm = FakeChatModel()
+    store = CheckpointStore(str(tmp_path / "checkpoints"))
+    session = updown_session()
+
+    first = agent_system(tmp_path, llm, checkpoints=store).process_motion_data(session)
+    assert sorted(first["checkpoint"]["computed"]) == sorted(NODES)
+    assert first["checkpoint"]["reused"] == []
+
+    rerun = agent_system(tmp_path, llm, checkpoints=store).process_motion_data(session)
+    assert sorted(rerun["checkpoint"]["reused"]) == sorted(NODES)
+    assert rerun["game_implementation"] == first["game_implementation"]
+    assert llm._calls == len(NODES)
+
+    edited_prompts("game_designer", PROMPT_TEMPLATES["game_designer"] + "\nKeep the design short.")
+    edited = agent_system(tmp_path, llm, checkpoints=store).process_motion_data(session)
+    assert edited["checkpoint"]["reused"] == ["analyze_data", "generate_exercises"]
+    assert sorted(edited["checkpoint"]["computed"]) == sorted(NODES[2:])
+    assert edited["exercise_suggestions"] == first["exercise_suggestions"]
+    assert edited["game_design"] != first["game_design"]
+    assert llm._calls == len(NODES) + 4
+
+
+def test_report_and_implementation_run_concurrently(tmp_path):
+    llm = FakeChatModel(delay=0.05)
+    result = agent_system(tmp_path, llm).process_motion_data(updown_session())
+
+    # Only the two branches after plan_routine can overlap
+    assert llm._max_in_flight == 2
+    assert llm._calls == len(NODES)
+    assert result["exercise_routine"] == "reply 4 from the fake model"
+    assert {result["exercise_summary"], result["game_implementation"]} == {
+        "reply 5 from the fake model", "reply 6 from the fake model"}
+
+
+async def collect(stream) -> list:
+    return [event async for event in stream]
+
+
+def test_tokens_stream_before_each_node_finishes(tmp_path, monkeypatch):
+    system = agent_system(tmp_path, FakeChatModel())
+    events = asyncio.run(collect(system.astream_motion_data(updown_session())))
+
+    done = {node: i for i, (kind, node, _) in enumerate(events) if kind == "done"}
+    assert sorted(done) == sorted(NODES)
+    for node in NODES:
+        tokens = [(i, text) for i, (kind, name, text) in enumerate(events) if kind == "token" and name == node]
+        assert len(tokens) > 1
+        assert all(i < done[node] for i, _ in tokens)
+        assert "".join(text for _, text in tokens) == events[done[node]][2]
+
+    monkeypatch.chdir(tmp_path)
+    system = agent_system(tmp_path, FakeChatModel())
+    final = {}
+    original = system.astream_motion_data
+
+    async def recording(*args, **kwargs):
+        async for kind, node, text in original(*args, **kwargs):
+            if kind == "done":
+                final[node] = text
+            yield kind, node, text
+
+    monkeypatch.setattr(system, "astream_motion_data", recording)
+    asyncio.run(main.stream_reports(system, updown_session()))
+    for node, path in main.REPORT_FILES.items():
+        with open(path) as f:
+            assert f.read() == final[node]
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from batch_embedding import embed_texts
+
+
+class FakeModel:
+    def __init__(self, dimension=3, drop_last=False, wide_batch=None):
+        self.dimension = dimension
+        self.drop_last = drop_last
+        self.wide_batch = wide_batch
+
+    def embed_documents(self, texts):
+        dimension = self.dimension + (texts[0] == self.wide_batch)
+        vectors = [[float(text)] * dimension for text in texts]
+        return vectors[:-1] if self.drop_last else vectors
+
+
+def test_embeddings_keep_input_order():
+    texts = [str(i) for i in range(25)]
+    result = embed_texts(FakeModel(), texts, batch_size=4, max_in_flight=3)
+    assert result.shape == (25, 3)
+    assert np.array_equal(result[:, 0], np.arange(25))
+
+
+def test_short_batch_is_rejected():
+    with pytest.raises(ValueError, match="returned 3 vectors for 4 texts"):
+        embed_texts(FakeModel(drop_last=True), [str(i) for i in range(8)], batch_size=4)
+
+
+def test_dimension_mismatch_is_rejected():
+    with pytest.raises(ValueError, match="dimension 4, expected 3"):
+        embed_texts(FakeModel(wide_batch="4"), [str(i) for i in range(8)], batch_size=4, max_in_flight=1)
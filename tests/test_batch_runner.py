@@ -0,0 +1,90 @@
+import asyncio
+import os
+
+from batch_runner import discover_sessions, run_batch
+
+SAMPLE = ('{"pos":{"pitch":%d,"roll":1,"yaw":2},"gyro":{"x":3,"y":4,"z":5},'
+          '"compass":{"x":6,"y":7,"z":8},"temp":30}')
+
+
+def write_recording(path, samples: int = 3):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write("data=[\n" + "\n".join(", " + SAMPLE % i for i in range(samples)) + "\n]\n")
+
+
+class FakeAgentSystem:
+    """Records which sessions it processed and how many ran at once."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.processed = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def aprocess_motion_data(self, session):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        self.processed.append(session.session_id)
+        return {"exercise_summary": f"summary of {session.session_id}",
+                "game_implementation": "guide", "checkpoint": {"reused": [], "computed": []}}
+
+
+def run(agent_system, data_dir, output_dir, **kwargs):
+    return asyncio.run(run_batch(agent_system, discover_sessions(str(data_dir)), str(output_dir), **kwargs))
+
+
+def test_sessions_are_grouped_by_stem_and_patient(tmp_path):
+    for path in ("left_updown.js", "right_updown.js", "p1/left_updown.js", "p1/right_updown.js",
+                 "p1/visit2/Left-lift.js", "p2/right_lift.js"):
+        write_recording(str(tmp_path / path))
+
+    jobs = {job.name: job for job in discover_sessions(str(tmp_path))}
+    assert sorted(jobs) == ["p1/updown", "p1/visit2/lift", "p2/lift", "updown"]
+    assert {name: job.patient_id for name, job in jobs.items()} == {
+        "updown": None, "p1/updown": "p1", "p1/visit2/lift": "p1", "p2/lift": "p2"}
+    assert sorted(jobs["p1/updown"].files) == ["left", "right"]
+    assert list(jobs["p2/lift"].files) == ["right"]
+
+
+def test_rerun_skips_finished_sessions_until_a_source_changes(tmp_path):
+    data_dir, output_dir = tmp_path / "data", tmp_path / "reports"
+    for patient in ("p1", "p2"):
+        write_recording(str(data_dir / patient / "left_updown.js"))
+        write_recording(str(data_dir / patient / "right_updown.js"))
+
+    agent_system = FakeAgentSystem()
+    assert run(agent_system, data_dir, output_dir) == {"p1/updown": "done", "p2/updown": "done"}
+    with open(output_dir / "p1" / "updown" / "exercise_summary.md") as f:
+        assert f.read() == "summary of p1/updown"
+
+    assert run(agent_system, data_dir, output_dir) == {"p1/updown": "skipped", "p2/updown": "skipped"}
+    assert len(agent_system.processed) == 2
+
+    touched = data_dir / "p1" / "left_updown.js"
+    stat = os.stat(touched)
+    os.utime(touched, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert run(agent_system, data_dir, output_dir) == {"p1/updown": "done", "p2/updown": "skipped"}
+
+    resized = data_dir / "p2" / "right_updown.js"
+    stat = os.stat(resized)
+    write_recording(str(resized), samples=4)
+    os.utime(resized, ns=(stat.st_atime_ns, stat.st_mtime_ns))  # only the size differs
+    assert run(agent_system, data_dir, output_dir) == {"p1/updown": "skipped", "p2/updown": "done"}
+    # The first run processes both sessions concurrently, in either order
+    assert sorted(agent_system.processed[:2]) == ["p1/updown", "p2/updown"]
+    assert agent_system.processed[2:] == ["p1/updown", "p2/updown"]
+
+
+def test_concurrency_limit_is_respected(tmp_path):
+    for i in range(6):
+        write_recording(str(tmp_path / "data" / f"p{i}" / "left_updown.js"))
+
+    agent_system = FakeAgentSystem(delay=0.05)
+    status = run(agent_system, tmp_path / "data", tmp_path / "reports", concurrency=2)
+    assert list(status.values()) == ["done"] * 6
+    assert agent_system.max_in_flight == 2
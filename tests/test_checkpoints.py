@@ -0,0 +1,50 @@
+import json
+import os
+
+import pytest
+
+import checkpoints
+from checkpoints import CheckpointStore
+
+
+def test_checkpoint_is_written_atomically_and_reloaded(tmp_path):
+    store = CheckpointStore(str(tmp_path / "checkpoints"))
+    checkpoint = store.for_session("patient 1/2025-01-14")
+    checkpoint.record("analyze_data", "key-1", {"analysis": "reply 1"})
+
+    path = store.path_for("patient 1/2025-01-14")
+    assert os.path.dirname(path) == str(tmp_path / "checkpoints")
+    assert os.listdir(os.path.dirname(path)) == [os.path.basename(path)]
+
+    reloaded = store.for_session("patient 1/2025-01-14")
+    assert reloaded.lookup("analyze_data", "key-1") == {"analysis": "reply 1"}
+    assert reloaded.lookup("analyze_data", "key-2") is None
+    assert reloaded.reused == ["analyze_data"]
+
+
+def test_interrupted_save_keeps_the_previous_checkpoint(tmp_path, monkeypatch):
+    store = CheckpointStore(str(tmp_path))
+    checkpoint = store.for_session("s")
+    checkpoint.record("analyze_data", "key-1", {"analysis": "reply 1"})
+
+    def crash(payload, f):
+        f.write('{"nodes": {')
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(checkpoints.json, "dump", crash)
+    with pytest.raises(KeyboardInterrupt):
+        checkpoint.record("generate_exercises", "key-2", {"exercise_suggestions": "reply 2"})
+    monkeypatch.undo()
+
+    with open(store.path_for("s")) as f:
+        assert list(json.load(f)["nodes"]) == ["analyze_data"]
+    reloaded = store.for_session("s")
+    assert reloaded.lookup("analyze_data", "key-1") == {"analysis": "reply 1"}
+    assert reloaded.lookup("generate_exercises", "key-2") is None
+
+
+def test_unreadable_checkpoint_starts_over(tmp_path):
+    store = CheckpointStore(str(tmp_path))
+    with open(store.path_for("s"), "w") as f:
+        f.write('{"nodes": {')
+    assert store.for_session("s").nodes == {}
@@ -0,0 +1,21 @@
+import os
+
+from data_ingestion import IMUDataProcessor
+from embedding_cache import EmbeddingCache
+from session_cache import load_session
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "imu-data")
+
+
+def test_sessions_are_indexed_as_windows(tmp_path):
+    processor = IMUDataProcessor(DATA_DIR, embed_model=object(), embedding_cache=EmbeddingCache(str(tmp_path / "embeddings")))
+    session = load_session({"left": os.path.join(DATA_DIR, "left_updown.js")}, session_id="s1")
+
+    documents = processor.create_documents(session)
+    assert 0 < len(documents) < len(session) / 10
+    assert all(doc.metadata["session"] == "s1" and "stats" in doc.metadata for doc in documents)
+    windows = processor.create_window_documents(session)
+    assert [doc.text for doc in documents] == [doc.text for doc in windows]
+
+    per_sample = processor.create_documents(session, per_sample=True)
+    assert len(per_sample) == len(session)
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from downsampling import Downsampler, ExtremaDownsampler, LTTBDownsampler, StrideDownsampler
+from imu_session import empty_samples
+
+
+@pytest.fixture
+def samples():
+    rng = np.random.default_rng(0)
+    samples = empty_samples(1000)
+    samples["pitch"] = rng.normal(size=1000)
+    samples["gyro_x"] = rng.normal(size=1000)
+    # Global extrema in the last bucket, which truncating by index used to drop
+    samples["pitch"][995] = 10.0
+    samples["pitch"][997] = -10.0
+    return samples
+
+
+@pytest.mark.parametrize("n_points", [6, 8, 10, 52, 200])
+def test_keeps_endpoints_and_global_extrema(samples, n_points):
+    gyro = np.abs(samples["gyro_x"])
+    selected = ExtremaDownsampler().select(samples, n_points)
+    assert len(selected) <= n_points
+    assert np.all(np.diff(selected) > 0)
+    for index in (0, len(samples) - 1, 995, 997, gyro.argmax(), gyro.argmin()):
+        assert index in selected
+
+
+def test_tiny_budget_keeps_highest_priority_points(samples):
+    assert ExtremaDownsampler().select(samples, 1).tolist() == [0]
+    assert ExtremaDownsampler().select(samples, 2).tolist() == [0, 999]
+    assert ExtremaDownsampler().select(samples, 4).tolist() == [0, 995, 997, 999]
+
+
+@pytest.mark.parametrize("downsampler", [StrideDownsampler(), LTTBDownsampler(), ExtremaDownsampler()])
+def test_zero_points_selects_nothing(samples, downsampler):
+    assert downsampler.select(samples, 0).tolist() == []
+    assert downsampler.select(samples[:1], 0).tolist() == []
+
+
+def test_downsampler_is_abstract():
+    with pytest.raises(TypeError):
+        Downsampler()
@@ -0,0 +1,119 @@
+import os
+from types import SimpleNamespace
+
+import numpy as np
+
+import embedding_cache
+from embedding_cache import CACHE_PATH_ENV, CachedEmbeddings, EmbeddingCache, cache_key
+
+
+def test_default_cache_is_created_on_first_use(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv(CACHE_PATH_ENV, raising=False)
+    cache = EmbeddingCache()
+    assert cache.get_many([]) == []
+    assert len(cache) == 0
+    cache.close()
+    assert not os.path.exists(".embedding_cache")
+
+    cache.put_many(["a"], [np.ones(4)])
+    assert os.path.exists(os.path.join(".embedding_cache", "embeddings.sqlite"))
+
+
+def test_cache_path_from_environment(tmp_path, monkeypatch):
+    monkeypatch.setenv(CACHE_PATH_ENV, str(tmp_path / "shared" / "embeddings.sqlite"))
+    cache = EmbeddingCache()
+    cache.put_many(["a"], [np.ones(4)])
+    assert os.path.exists(tmp_path / "shared" / "embeddings.sqlite")
+
+
+def test_agent_system_leaves_no_cache_behind(tmp_path, monkeypatch):
+    from agents import AgentSystem
+    from data_ingestion import IMUDataProcessor
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv(CACHE_PATH_ENV, raising=False)
+    AgentSystem("test-key")
+    IMUDataProcessor(str(tmp_path), embed_model=object())
+    assert os.listdir(tmp_path) == []
+
+
+class FakeEmbeddingModel:
+    """LangChain-style model that records the texts it was asked to embed."""
+    model_name = "fake-embedding"
+
+    def __init__(self):
+        self.documents = []
+        self.queries = []
+
+    def embed_documents(self, texts):
+        self.documents.append(list(texts))
+        return [[float(len(text)), 1.0, 0.0] for text in texts]
+
+    def embed_query(self, text):
+        self.queries.append(text)
+        return [float(len(text)), 0.0, 1.0]
+
+
+def test_cache_key_depends_on_model_and_text():
+    assert cache_key("m", "left hand") == cache_key("m", "left hand")
+    assert len({cache_key("m", "left hand"), cache_key("n", "left hand"), cache_key("m", "right hand"),
+                cache_key("m\0left", " hand")}) == 4
+
+
+def test_vectors_round_trip_through_sqlite(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite")
+    cache = EmbeddingCache(path)
+    vectors = np.random.default_rng(0).normal(size=(3, 8))
+    cache.put_many(["a", "b", "c"], vectors)
+    cache.close()
+
+    reopened = EmbeddingCache(path)
+    found = reopened.get_many(["b", "missing", "a"])
+    np.testing.assert_array_equal(found[0], vectors[1].astype(np.float32))
+    assert found[1] is None
+    assert found[2].dtype == np.float32
+    assert reopened.stats() == {"hits": 2, "misses": 1, "memory_hits": 0, "disk_hits": 2, "hit_rate": 2 / 3}
+    reopened.get_many(["a"])
+    assert reopened.stats()["memory_hits"] == 1
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, monkeypatch):
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(embedding_cache, "time", SimpleNamespace(time=lambda: clock.now))
+    cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite"), memory_items=2, max_entries=3)
+    for key in ("a", "b", "c"):
+        clock.now += 1
+        cache.put_many([key], [np.ones(2)])
+    assert list(cache.memory) == ["b", "c"]
+
+    cache.memory.clear()
+    clock.now += 1
+    cache.get_many(["a"])  # "b" is now the least recently used row on disk
+    clock.now += 1
+    cache.put_many(["d"], [np.ones(2)])
+
+    assert len(cache) == 3
+    cache.memory.clear()
+    assert [vector is not None for vector in cache.get_many(["a", "b", "c", "d"])] == [True, False, True, True]
+
+
+def test_cached_embeddings_embed_each_new_text_once(tmp_path):
+    model = FakeEmbeddingModel()
+    embeddings = CachedEmbeddings(model, EmbeddingCache(str(tmp_path / "embeddings.sqlite")))
+
+    first = embeddings.embed_documents(["up", "down", "up"])
+    assert model.documents == [["up", "down"]]
+    assert first == [[2.0, 1.0, 0.0], [4.0, 1.0, 0.0], [2.0, 1.0, 0.0]]
+
+    assert embeddings.embed_documents(["down", "hold"]) == [[4.0, 1.0, 0.0], [4.0, 1.0, 0.0]]
+    assert model.documents[1:] == [["hold"]]
+
+    assert embeddings.embed_query("reach") == [5.0, 0.0, 1.0]
+    assert embeddings.embed_query("reach") == [5.0, 0.0, 1.0]
+    assert model.queries == ["reach"]
+    assert embeddings.get_text_embedding("up") == [2.0, 1.0, 0.0]
+
+    other = CachedEmbeddings(model, embeddings.cache, model_name="other-model")
+    other.embed_documents(["up"])
+    assert model.documents[-1] == ["up"]
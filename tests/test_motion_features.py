@@ -0,0 +1,10 @@
+from imu_session import IMUSession, empty_samples
+from motion_features import extract_features
+
+
+def test_single_sample_hand_gets_zero_rates():
+    samples = empty_samples(1)
+    samples["pitch"] = 12.0
+    features = extract_features(IMUSession({"left": samples}))
+    rates = features["hands"]["left"]["angular_velocity"]
+    assert rates["pitch_rate_max_up"] == rates["pitch_rate_max_down"] == rates["pitch_rate_mean_abs"] == 0.0
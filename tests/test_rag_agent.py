@@ -0,0 +1,90 @@
+import asyncio
+from types import SimpleNamespace
+
+from rag_agent import QueryPlanner, RAGAgent, dedupe_results
+
+RESPONSE = """- **Main Query**: How symmetric are both hands?
+- **Sub-Queries**:
+  1. [Range of motion of the left hand]
+  2. [Range of motion of the right hand]
+
+  3. [Timing lag between the hands]
+- **Additional Notes**:
+  1. Sub-queries assume both recordings cover the same exercise.
+  2. Focus on the up-down phase."""
+
+
+def test_only_the_sub_queries_block_is_parsed():
+    assert QueryPlanner._parse_sub_queries(RESPONSE) == [
+        "Range of motion of the left hand",
+        "Range of motion of the right hand",
+        "Timing lag between the hands",
+    ]
+
+
+def test_first_numbered_list_without_heading():
+    content = "Here you go:\n1. Left hand pitch range\n2. Right hand pitch range\n\nNotes:\n1. None"
+    assert QueryPlanner._parse_sub_queries(content) == ["Left hand pitch range", "Right hand pitch range"]
+
+
+def test_dedupe_never_assigns_a_document_twice():
+    results = [
+        [{"index": 1, "distance": 0.1}, {"index": 2, "distance": 0.3}],
+        [{"index": 1, "distance": 0.2}, {"index": 2, "distance": 0.4}],
+        [{"index": 2, "distance": 0.2}, {"index": 3, "distance": 0.5}],
+    ]
+    deduped = dedupe_results(results)
+    assert [[r["index"] for r in row] for row in deduped] == [[1], [], [2, 3]]
+
+
+class FakeStore:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def search_batch(self, queries, k=5):
+        return [list(row) for row in self.rows[:len(queries)]]
+
+
+class FakeEmbeddings:
+    def embed_documents(self, texts):
+        return [[float(i), 1.0] for i in range(len(texts))]
+
+
+class FakeLLM:
+    def __init__(self):
+        self.prompts = []
+
+    async def ainvoke(self, messages):
+        self.prompts.append(messages)
+        return SimpleNamespace(content=f"reply {len(self.prompts)}")
+
+
+class FakePlanner:
+    def __init__(self, sub_queries):
+        self.sub_queries = sub_queries
+        self.sub_results = None
+
+    async def adecompose_query(self, query):
+        return self.sub_queries
+
+    async def asynthesize_results(self, sub_results):
+        self.sub_results = sub_results
+        return {"synthesized_analysis": "done", "sub_results": sub_results}
+
+
+def window(index: int, distance: float) -> dict:
+    document = {"hand": "left", "session": "s", "start": 10 * index, "stop": 10 * index + 10}
+    return {"index": index, "distance": distance, "document": document}
+
+
+def test_sub_queries_without_distinct_documents_are_not_analyzed():
+    shared = [window(1, 0.1), window(2, 0.2)]
+    store = FakeStore([shared, [window(1, 0.3), window(2, 0.4)], [window(7, 0.1)]])
+    llm = FakeLLM()
+    agent = RAGAgent(store, llm, embeddings=FakeEmbeddings())
+    planner = FakePlanner(["left range", "left range again", "right range"])
+
+    result = asyncio.run(agent.aexecute_multi_query_workflow("both hands", planner, k=2))
+
+    assert len(llm.prompts) == 2
+    assert [sub["query"] for sub in result["sub_results"]] == ["left range", "right range"]
@@ -0,0 +1,41 @@
+import asyncio
+from types import SimpleNamespace
+
+import rate_limit
+from rate_limit import RateLimiter
+
+
+def test_refund_leaves_the_window_with_its_request(monkeypatch):
+    clock = SimpleNamespace(now=0.0)
+    monkeypatch.setattr(rate_limit, "time", SimpleNamespace(monotonic=lambda: clock.now))
+    limiter = RateLimiter(tokens_per_minute=1000)
+
+    booking = asyncio.run(limiter.acquire(800))
+    clock.now = 30.0
+    limiter.adjust(-600, booking)  # the request used only 200 tokens
+    assert limiter._tokens == 200
+
+    # Once the request has expired, no negative balance is left over to admit extra tokens
+    clock.now = 61.0
+    asyncio.run(limiter.acquire(900))
+    assert limiter._tokens == 900
+    assert not limiter._fits(200)
+
+
+def test_corrections_are_clamped_and_late_ones_booked_now(monkeypatch):
+    clock = SimpleNamespace(now=0.0)
+    monkeypatch.setattr(rate_limit, "time", SimpleNamespace(monotonic=lambda: clock.now))
+    limiter = RateLimiter(tokens_per_minute=1000)
+
+    booking = asyncio.run(limiter.acquire(300))
+    limiter.adjust(-500, booking)
+    assert limiter._tokens == 0 and booking[2] == 0
+
+    clock.now = 70.0
+    limiter._expire(clock.now)
+    limiter.adjust(-100, booking)
+    limiter.adjust(400, booking)
+    assert limiter._tokens == 400
+    clock.now = 129.0
+    limiter._expire(clock.now)
+    assert limiter._tokens == 400
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from imu_session import empty_samples
+from rep_detection import (REPLAY_PER_SAMPLE, RepDetector, calibrate_zones, calibration_window, detect_reps,
+                           gyro_magnitude, rep_bounds, trailing_mean)
+
+RATE = 20.0
+
+
+def updown(seconds: float, period_s: float = 8.0, rest_s: float = 0.0, seed: int = 0) -> np.ndarray:
+    """Clipped sine reps between -20 and 40 degrees with holds at both ends, after ``rest_s`` at the top."""
+    t = np.arange(0, seconds, 1 / RATE)
+    pitch = np.clip(1.6 * np.sin(2 * np.pi * t / period_s + np.pi / 2), -1, 1) * 30 + 10
+    pitch = np.concatenate((np.full(int(rest_s * RATE), pitch[0]), pitch))
+    samples = empty_samples(len(pitch))
+    samples["pitch"] = pitch + np.random.default_rng(seed).normal(0, 0.5, len(pitch))
+    samples["roll"] = 3.0
+    samples["gyro_x"] = np.gradient(pitch) * RATE
+    return samples
+
+
+def stream(samples: np.ndarray, **kwargs):
+    detector = RepDetector(RATE, **kwargs)
+    reps, backlog = [], 0
+    for pitch, roll, gyro in zip(samples["pitch"].astype(float), samples["roll"].astype(float),
+                                 gyro_magnitude(samples)):
+        reps += detector.push(pitch, roll, gyro)
+        backlog = max(backlog, len(detector._pending))
+    return reps + detector.finish(), detector, backlog
+
+
+def assert_same_reps(streamed, batch):
+    assert len(streamed) == len(batch)
+    for a, b in zip(streamed, batch):
+        assert (a.start, a.turn, a.end) == (b.start, b.turn, b.end)
+        assert a.to_dict() == pytest.approx(b.to_dict())
+
+
+@pytest.mark.parametrize("rest_s", [0.0, 90.0])
+def test_auto_calibrated_stream_matches_batch(rest_s):
+    samples = updown(200.0, rest_s=rest_s)
+    batch = detect_reps(samples, RATE)
+    streamed, detector, backlog = stream(samples)
+    assert len(batch) == 25
+    assert_same_reps(streamed, batch)
+    # The calibration buffer never outgrows its window, also while it is replayed
+    assert backlog <= calibration_window(RATE, 60.0) + 1
+
+
+def test_fixed_zones_stream_matches_batch():
+    samples = updown(100.0)
+    zones, _ = calibrate_zones(trailing_mean(samples["pitch"], 5))
+    streamed, detector, backlog = stream(samples, zones=zones)
+    assert backlog == 0
+    assert_same_reps(streamed, detect_reps(samples, RATE, zones=zones))
+
+
+def test_stream_catches_up_after_calibration():
+    samples = updown(100.0)
+    _, at = calibrate_zones(trailing_mean(samples["pitch"], 5))
+    detector = RepDetector(RATE)
+    for i, (pitch, gyro) in enumerate(zip(samples["pitch"].astype(float), gyro_magnitude(samples))):
+        detector.push(pitch, 3.0, gyro)
+        if i == at:
+            assert detector.zones is not None and len(detector._pending) == at + 1
+    assert not detector._pending
+    assert len(samples) - at > (at + 1) / (REPLAY_PER_SAMPLE - 1)
+
+
+def test_no_reps_without_a_full_excursion():
+    samples = updown(100.0)
+    samples["pitch"] = 5.0
+    assert detect_reps(samples, RATE) == []
+    assert stream(samples)[0] == []
+
+
+def test_rep_bounds_are_detected_reps():
+    samples = updown(60.0)
+    assert rep_bounds(samples, RATE) == [(rep.start, rep.end) for rep in detect_reps(samples, RATE)]
@@ -0,0 +1,100 @@
+import asyncio
+from itertools import count
+from types import SimpleNamespace
+from typing import Any, Dict
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration
+
+import response_cache
+from response_cache import ResponseCache, with_response_cache
+
+
+class FakeChatModel(GenericFakeChatModel):
+    """Replies "reply 1", "reply 2", ... and takes part in the cache key like a real model."""
+    model_name: str = "fake"
+    temperature: float = 0.0
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"model_name": self.model_name, "temperature": self.temperature}
+
+
+def fake_model(**params) -> FakeChatModel:
+    return FakeChatModel(messages=(AIMessage(content=f"reply {i}") for i in count(1)), **params)
+
+
+def messages(text: str = "How far did the left hand move?"):
+    # Message IDs are not part of LangChain's cache key
+    return [SystemMessage(content="You analyze IMU data."), HumanMessage(content=text, id="run-123")]
+
+
+def ask(llm, text: str = "How far did the left hand move?") -> str:
+    return asyncio.run(llm.ainvoke(messages(text))).content
+
+
+def test_contains_predicts_a_cache_hit(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite"))
+    llm = with_response_cache(fake_model(), cache)
+
+    assert not cache.contains(llm, messages())
+    assert ask(llm) == "reply 1"
+    assert cache.stats()["hits"] == 0
+
+    assert cache.contains(llm, messages())
+    assert ask(llm) == "reply 1"
+    assert cache.stats()["hits"] == 1
+
+    assert not cache.contains(llm, messages("And the right hand?"))
+    assert ask(llm, "And the right hand?") == "reply 2"
+    assert cache.stats()["hits"] == 1
+
+
+def test_model_or_parameter_change_misses(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite"))
+    ask(with_response_cache(fake_model(), cache))
+
+    for params in ({"model_name": "other"}, {"temperature": 0.7}):
+        llm = with_response_cache(fake_model(**params), cache)
+        assert not cache.contains(llm, messages())
+        assert ask(llm) == "reply 1"
+    assert cache.stats()["hits"] == 0
+    assert len(cache) == 3
+
+
+def test_entries_expire_after_ttl(tmp_path, monkeypatch):
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(response_cache, "time", SimpleNamespace(time=lambda: clock.now))
+    cache = ResponseCache(str(tmp_path / "responses.sqlite"), ttl_s=60)
+    llm = with_response_cache(fake_model(), cache)
+    ask(llm)
+
+    clock.now += 59
+    assert cache.contains(llm, messages())
+    assert ask(llm) == "reply 1"
+
+    clock.now += 2
+    assert not cache.contains(llm, messages())
+    assert ask(llm) == "reply 2"
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, monkeypatch):
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(response_cache, "time", SimpleNamespace(time=lambda: clock.now))
+    reply = [ChatGeneration(message=AIMessage(content="x" * 100))]
+    cache = ResponseCache(str(tmp_path / "responses.sqlite"), ttl_s=None)
+    cache.update("a", "model", reply)
+    cache.max_bytes = 3 * cache._conn.execute("SELECT size FROM responses").fetchone()[0]
+
+    for prompt in ("b", "c"):
+        clock.now += 1
+        cache.update(prompt, "model", reply)
+    clock.now += 1
+    assert cache.lookup("a", "model") is not None  # "b" is now the least recently used
+    clock.now += 1
+    cache.update("d", "model", reply)
+
+    assert len(cache) == 3
+    assert cache.lookup("b", "model") is None
+    assert all(cache.lookup(prompt, "model") is not None for prompt in ("a", "c", "d"))
@@ -0,0 +1,62 @@
+import numpy as np
+from llama_index.core.schema import Document
+
+from context_builder import ContextBuilder
+from retrieval_cache import RetrievalCache
+from windowing import describe_window
+
+
+def window_result(start: int, distance: float, pitch=(0.0, 2.0)) -> dict:
+    """A search result holding a window Document shaped like ``create_window_documents`` output."""
+    low, high = pitch
+    stats = {name: {"mean": 1.0, "std": 0.5, "min": 0.0, "max": 2.0, "first": 0.0, "last": 2.0}
+             for name in ("pitch", "roll", "yaw", "gyro")}
+    stats["pitch"] = {"mean": (low + high) / 2, "std": 0.5, "min": low, "max": high, "first": low, "last": high}
+    metadata = {"hand": "left", "kind": "window", "start": start, "stop": start + 10, "timestamp": "t",
+                "session": "s", "patient": "p", "stats": stats}
+    text = describe_window(dict(stats, kind="window", hand="left", start=start, stop=start + 10, duration_s=0.5))
+    return {"distance": distance, "document": Document(text=text, metadata=metadata)}
+
+
+def test_overlapping_windows_are_merged_into_one_range():
+    builder = ContextBuilder(token_budget=400)
+    context = builder.build([window_result(0, 0.1, pitch=(0.0, 2.0)), window_result(5, 0.2, pitch=(-1.0, 5.0)),
+                             window_result(100, 0.3)])
+    assert context.count("Motion Pattern") == 2
+    assert "Motion range of 2 windows (left hand, samples 0-15, 0.8s)" in context
+    assert "range=-1.00° to 5.00°, change=+5.00°" in context
+    assert "Motion window (left hand, samples 100-110, 0.5s)" in context
+
+
+def test_choose_k_is_settled_after_the_first_context():
+    builder = ContextBuilder(token_budget=400)
+    first = builder.choose_k()
+    builder.build([window_result(100 * i, i) for i in range(first)])
+    k = builder.choose_k()
+    for n in (1, 3, 5):
+        builder.build([window_result(100 * i, i) for i in range(n)])
+        assert builder.choose_k() == k
+    builder.token_budget = 800
+    assert builder.choose_k() != k
+
+
+def test_repeated_query_hits_with_the_chosen_k():
+    builder = ContextBuilder(token_budget=400)
+    cache = RetrievalCache()
+    embedding = np.ones(4, dtype=np.float32)
+    for _ in range(3):
+        k = builder.choose_k()
+        results = cache.get("left hand range", k, version=1)
+        if results is None:
+            results = [window_result(100 * i, i) for i in range(k)]
+            cache.put("left hand range", embedding, k, results, version=1)
+        builder.build(results)
+    assert cache.stats()["hits"] >= 1
+
+
+def test_short_result_list_answers_larger_k():
+    cache = RetrievalCache()
+    cache.put("q", np.ones(4), 10, [window_result(0, 0.0), window_result(100, 1.0)], version=1)
+    assert len(cache.get("q", 20, version=1)) == 2
+    cache.put("q", np.ones(4), 2, [window_result(0, 0.0), window_result(100, 1.0)], version=1)
+    assert cache.get("q", 5, version=1) is None
@@ -0,0 +1,37 @@
+import os
+
+from data_ingestion import IMUDataProcessor
+from embedding_cache import EmbeddingCache
+from session_cache import cache_paths, cached_parse_stats
+
+SAMPLE = ('{"pos":{"pitch":%d,"roll":1,"yaw":2},"gyro":{"x":3,"y":4,"z":5},'
+          '"compass":{"x":6,"y":7,"z":8},"temp":30}')
+
+
+def write_recording(path):
+    lines = ["data=[", "    , " + SAMPLE % 0, ", " + SAMPLE % 1, ', {"pos":{"pitch":', ", " + SAMPLE % 2, "]"]
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def processor(data_dir, use_cache):
+    cache = EmbeddingCache(os.path.join(data_dir, "embeddings"))
+    return IMUDataProcessor(data_dir, use_cache=use_cache, embed_model=object(), embedding_cache=cache)
+
+
+def test_cached_loads_keep_parse_stats(tmp_path):
+    source = str(tmp_path / "left_test.js")
+    write_recording(source)
+
+    parsed = processor(str(tmp_path), use_cache=False)
+    parsed.load_imu_data()
+    expected = parsed.parse_stats[source]
+    assert expected.samples == 3 and expected.skipped == 1 and expected.skipped_lines == [4]
+
+    for _ in range(2):  # the first load builds the cache, the second only reads it
+        cached = processor(str(tmp_path), use_cache=True)
+        session = cached.load_imu_data()
+        assert len(session.samples("left")) == 3
+        assert cached.parse_stats[source] == expected
+    assert all(os.path.exists(path) for path in cache_paths(source))
+    assert cached_parse_stats(source) == expected
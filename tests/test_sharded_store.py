@@ -0,0 +1,81 @@
+import shutil
+
+import numpy as np
+import pytest
+
+from sharded_store import ShardedVectorStore
+from vector_store import VectorStore
+
+DIM = 8
+
+
+def patient_data(patients, per_patient: int = 50, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(len(patients) * per_patient, DIM)).astype(np.float32)
+    documents = [{"patient": patient, "hand": "left", "start": i, "stop": i + 10}
+                 for patient in patients for i in range(per_patient)]
+    return vectors, documents
+
+
+def test_worker_threads_start_lazily_and_stop_on_exit():
+    with ShardedVectorStore(dimension=DIM) as store:
+        assert store._pool is None
+        store.add_vectors(*patient_data(["p1", "p2"]))
+        pool = store._pool
+        assert pool is not None
+    assert store._pool is None
+    assert pool._shutdown
+
+
+def test_shards_with_missing_files_are_skipped(tmp_path):
+    with ShardedVectorStore(str(tmp_path), dimension=DIM) as store:
+        store.add_vectors(*patient_data(["p1", "p2"]))
+        store.save()
+    shutil.rmtree(tmp_path / store.shard_name("p2"))
+
+    with ShardedVectorStore.load(str(tmp_path)) as reopened:
+        assert len(reopened) == 50
+        assert reopened.remove_patient("p2") == 0
+        assert reopened.remove_matching({"hand": "left"}) == 50
+        assert len(reopened) == 0
+
+
+def keys(rows):
+    return [[(r["document"]["patient"], r["document"]["start"]) for r in row] for row in rows]
+
+
+def test_merged_top_k_matches_a_single_flat_store():
+    vectors, documents = patient_data(["p1", "p2", "p3", "p4"])
+    flat = VectorStore(dimension=DIM)
+    flat.create_index(vectors, documents)
+    queries = np.random.default_rng(1).normal(size=(10, DIM)).astype(np.float32)
+
+    with ShardedVectorStore(dimension=DIM) as store:
+        store.add_vectors(vectors, documents)
+        assert len(store.shards) == 4
+        sharded = store.search_batch(queries, k=12)
+
+    expected = flat.search_batch(queries, k=12)
+    assert keys(sharded) == keys(expected)
+    for got, want in zip(sharded, expected):
+        assert [r["distance"] for r in got] == pytest.approx([r["distance"] for r in want])
+
+
+def test_save_and_lazy_load_with_patient_pruning(tmp_path):
+    vectors, documents = patient_data(["p1", "p2", "p3"])
+    queries = vectors[::37]
+    with ShardedVectorStore(str(tmp_path), dimension=DIM) as store:
+        store.add_vectors(vectors, documents)
+        before = store.search_batch(queries, k=5)
+        store.save()
+
+    with ShardedVectorStore.load(str(tmp_path)) as reopened:
+        assert reopened.loaded_shards() == []
+        pruned = reopened.search_batch(queries, k=5, filters={"patient": "p2"})
+        assert all(r["document"]["patient"] == "p2" for row in pruned for r in row)
+        assert [len(row) for row in pruned] == [5] * len(queries)
+        # Only the filtered patient's shard was read from disk
+        assert reopened.loaded_shards() == [(reopened.shard_name("p2"), 50)]
+
+        assert keys(reopened.search_batch(queries, k=5)) == keys(before)
+        assert len(reopened.loaded_shards()) == 3
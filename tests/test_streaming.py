@@ -0,0 +1,51 @@
+import asyncio
+import os
+
+import numpy as np
+import pytest
+
+from imu_parser import IMUStreamParser, open_recording
+from imu_session import samples_from_matrix
+from rep_detection import detect_reps
+from streaming import COLUMNS, LiveFeatures, StreamingIngestionService
+
+RATE = 20.0
+DATA_DIR = os.path.join(os.path.dirname(__file__), os.pardir, "imu-data")
+
+
+def row(pitch: float) -> np.ndarray:
+    values = np.zeros(len(COLUMNS), dtype=np.float32)
+    values[COLUMNS["pitch"]] = pitch
+    return values
+
+
+def test_staggered_hand_starts_pair_only_buffered_samples():
+    features = LiveFeatures(RATE, window_s=10.0)
+    pitch = 30 * np.sin(2 * np.pi * np.arange(300) / 80)
+    # The left hand runs 300 samples, more than its 200-sample buffer, before the right hand starts
+    for p in pitch:
+        features.add("left", row(p))
+    for p in pitch:
+        features.add("right", row(p))
+
+    assert features.next_pair == 300
+    # Only the pairs still buffered for the left hand are correlated
+    assert features.bilateral.count == 200
+    assert features.snapshot()["bilateral"]["lag_samples"] == 0
+
+
+def test_replay_finds_the_same_reps_as_detect_reps():
+    files = {hand: os.path.join(DATA_DIR, f"{hand}_updown.js") for hand in ("left", "right")}
+    service = StreamingIngestionService(LiveFeatures(RATE))
+    asyncio.run(service.replay(files, speed=0))
+
+    snapshot = service.features.snapshot()
+    for hand, path in files.items():
+        with open_recording(path) as f:
+            batch = detect_reps(samples_from_matrix(IMUStreamParser(f).read_array(), hand), RATE)
+        streamed = service.features.hands[hand].reps.reps
+        assert len(batch) > 0
+        assert [(r.start, r.turn, r.end) for r in streamed] == [(r.start, r.turn, r.end) for r in batch]
+        for a, b in zip(streamed, batch):
+            assert a.to_dict() == pytest.approx(b.to_dict())
+        assert snapshot["hands"][hand]["reps"]["rep_count"] == len(batch)
@@ -0,0 +1,135 @@
+import threading
+
+import numpy as np
+import pytest
+
+from vector_store import VectorStore
+
+N, DIM = 5000, 16
+
+
+@pytest.fixture(scope="module")
+def data():
+    vectors = np.random.default_rng(0).normal(size=(N, DIM)).astype(np.float32)
+    documents = [{"hand": "left" if i % 2 else "right", "start": i, "stop": i + 1} for i in range(N)]
+    return vectors, documents
+
+
+def make_store(index_type, data):
+    vectors, documents = data
+    store = VectorStore(dimension=DIM, index_type=index_type, nlist=64, pq_m=4, nprobe=2, ef_search=16)
+    store.create_index(vectors, documents)
+    return store
+
+
+@pytest.mark.parametrize("index_type", ["flat", "ivf_flat", "ivf_pq", "hnsw"])
+def test_selective_filter_returns_k_matches(index_type, data):
+    store = make_store(index_type, data)
+    queries = data[0][:20]
+    results = store.search_batch(queries, k=5, filters={"time_range": (2000, 2010)})
+    assert [len(row) for row in results] == [5] * len(queries)
+    assert all(2000 <= result["index"] < 2010 for row in results for result in row)
+    assert all(result["document"]["start"] == result["index"] for row in results for result in row)
+
+    if index_type in ("ivf_flat", "hnsw"):
+        # Both store the vectors uncompressed, so the retry is exact
+        exact = make_store("flat", data).search_batch(queries, k=5, filters={"time_range": (2000, 2010)})
+        assert [[r["index"] for r in row] for row in results] == [[r["index"] for r in row] for row in exact]
+
+
+@pytest.mark.parametrize("index_type", ["ivf_flat", "hnsw"])
+def test_filter_with_fewer_matches_than_k(index_type, data):
+    store = make_store(index_type, data)
+    results = store.search_batch(data[0][:3], k=5, filters={"time_range": (100, 103), "hand": "left"})
+    assert [sorted(r["index"] for r in row) for row in results] == [[101]] * 3
+
+
+def test_hnsw_tombstones_keep_k_results(data):
+    store = make_store("hnsw", data)
+    store.remove_ids(np.arange(0, N - 50))
+    results = store.search_batch(data[0][:5], k=10)
+    assert [len(row) for row in results] == [10] * 5
+    assert all(result["index"] >= N - 50 for row in results for result in row)
+
+
+class BlockingIndex:
+    """Index wrapper whose searches wait for ``release``."""
+
+    def __init__(self, index):
+        self.index = index
+        self.entered = threading.Event()
+        self.release = threading.Event()
+
+    def search(self, *args, **kwargs):
+        self.entered.set()
+        self.release.wait(5)
+        return self.index.search(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.index, name)
+
+
+def test_searches_do_not_hold_the_lock(data):
+    store = make_store("flat", data)
+    blocking = store.index = BlockingIndex(store.index)
+    slow = threading.Thread(target=store.search, args=(data[0][0],))
+    slow.start()
+    assert blocking.entered.wait(5)
+
+    # The lock is free while the search runs; adding waits for it to finish
+    assert store._lock.acquire(timeout=1)
+    store._lock.release()
+    added = threading.Thread(target=store.add_vectors, args=(data[0][:1], [{"hand": "left"}]))
+    added.start()
+    added.join(0.2)
+    assert added.is_alive()
+
+    blocking.release.set()
+    slow.join(5)
+    added.join(5)
+    assert not added.is_alive() and len(store) == N + 1
+
+
+def test_load_finishes_a_snapshot_interrupted_after_its_commit(data, tmp_path, monkeypatch):
+    vectors, documents = data
+    path = str(tmp_path / "store")
+    store = VectorStore(dimension=DIM)
+    store.create_index(vectors[:100], documents[:100])
+    store.save(path)
+    store.add_vectors(vectors[100:200], documents[100:200])
+    store.save_incremental(path)
+
+    # Die right after the commit marker is in place, before anything is swapped in
+    monkeypatch.setattr(VectorStore, "_commit_snapshot", staticmethod(lambda filepath: None))
+    store.add_vectors(vectors[200:300], documents[200:300])
+    store.compact(path)
+    monkeypatch.undo()
+
+    loaded = VectorStore(dimension=DIM)
+    loaded.load(path)
+    assert len(loaded) == 300
+    assert loaded.get_document(250) == documents[250]
+    assert loaded.search(vectors[250], k=1)[0]["index"] == 250
+
+
+def test_snapshot_interrupted_before_its_commit_is_ignored(data, tmp_path, monkeypatch):
+    vectors, documents = data
+    path = str(tmp_path / "store")
+    store = VectorStore(dimension=DIM)
+    store.create_index(vectors[:100], documents[:100])
+    store.save(path)
+    store.add_vectors(vectors[100:200], documents[100:200])
+    store.save_incremental(path)
+
+    def crash(*args, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr("vector_store.os.replace", crash)
+    with pytest.raises(OSError):
+        store.compact(path)
+    monkeypatch.undo()
+
+    loaded = VectorStore(dimension=DIM)
+    loaded.load(path)
+    assert len(loaded) == 200
+    assert loaded.get_document(150) == documents[150]
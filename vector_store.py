@@ -1,102 +1,786 @@
 import faiss
+import json
 import numpy as np
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 import pickle
 import os
+import shutil
+import threading
+from imu_session import IMUSession
+from window_embeddings import WindowEmbedder
+from document_store import DocumentStore
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+
+# Document metadata keys understood by search filters (first match wins).
+FILTER_KEYS = {
+    "patient": ("patient", "patient_id"),
+    "hand": ("hand",),
+    "session": ("session", "session_id"),
+}
+
+# Approximate indexes answer filtered searches that come back short exactly
+# over the selected vectors when there are at most this many of them.
+EXACT_SEARCH_MAX_IDS = 10_000
+
+
+def document_metadata(document) -> Dict:
+    """Metadata dict of a plain dict document or a LlamaIndex Document."""
+    if document is None:
+        return {}
+    metadata = getattr(document, "metadata", None)
+    if isinstance(metadata, dict):
+        return metadata
+    return document if isinstance(document, dict) else {}
+
+
+class MetadataIndex:
+    """Columnar copy of the filterable document metadata, one row per vector ID.
+
+    Categorical fields are stored as integer codes so a filter becomes a few
+    vectorized comparisons that yield the IDs to hand to FAISS. Removed IDs
+    keep their row (with ID -1) until the next ``save``.
+    """
+
+    def __init__(self):
+        self.vocab: Dict[str, Dict[str, int]] = {field: {} for field in FILTER_KEYS}
+        self.ids = np.empty(0, dtype=np.int64)
+        self.codes: Dict[str, np.ndarray] = {field: np.empty(0, dtype=np.int32) for field in FILTER_KEYS}
+        self.start = np.empty(0, dtype=np.float64)
+        self.stop = np.empty(0, dtype=np.float64)
+        self._rows: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, vector_id) -> bool:
+        return int(vector_id) in self._rows
+
+    def _code(self, field: str, value) -> int:
+        if value is None:
+            return -1
+        return self.vocab[field].setdefault(str(value), len(self.vocab[field]))
+
+    def set(self, ids: np.ndarray, documents: List):
+        """Record metadata for the given vector IDs; ``None`` documents match no filter."""
+        ids = np.asarray(ids, dtype=np.int64)
+        new = np.unique(ids[[int(i) not in self._rows for i in ids.tolist()]]) if len(ids) else ids
+        if len(new):
+            for row, vector_id in enumerate(new.tolist(), start=len(self.ids)):
+                self._rows[vector_id] = row
+            self.ids = np.concatenate((self.ids, new))
+            for field in FILTER_KEYS:
+                self.codes[field] = np.concatenate((self.codes[field], np.full(len(new), -1, dtype=np.int32)))
+            self.start = np.concatenate((self.start, np.full(len(new), np.nan)))
+            self.stop = np.concatenate((self.stop, np.full(len(new), np.nan)))
+        for vector_id, document in zip(ids.tolist(), documents):
+            row = self._rows[vector_id]
+            metadata = document_metadata(document)
+            for field, keys in FILTER_KEYS.items():
+                value = next((metadata[key] for key in keys if key in metadata), None)
+                self.codes[field][row] = self._code(field, value)
+            self.start[row] = metadata.get("start", np.nan)
+            self.stop[row] = metadata.get("stop", metadata.get("start", np.nan))
+
+    def remove(self, ids: np.ndarray) -> np.ndarray:
+        """Forget the given IDs; returns the ones that were present."""
+        rows = [self._rows.pop(i) for i in np.asarray(ids, dtype=np.int64).tolist() if i in self._rows]
+        removed = self.ids[rows].copy()
+        self.ids[rows] = -1
+        return removed
+
+    def copy(self) -> "MetadataIndex":
+        other = MetadataIndex()
+        other.vocab = {field: dict(vocab) for field, vocab in self.vocab.items()}
+        other.ids, other.start, other.stop = self.ids.copy(), self.start.copy(), self.stop.copy()
+        other.codes = {field: codes.copy() for field, codes in self.codes.items()}
+        other._rows = dict(self._rows)
+        return other
+
+    def save(self, path: str):
+        """Write the live rows as one uncompressed ``.npz`` file."""
+        live = self.ids >= 0
+        arrays = {f"codes_{field}": codes[live] for field, codes in self.codes.items()}
+        with open(path, "wb") as f:
+            np.savez(f, ids=self.ids[live], start=self.start[live], stop=self.stop[live],
+                     vocab=np.array(json.dumps(self.vocab)), **arrays)
+
+    @classmethod
+    def load(cls, path: str) -> "MetadataIndex":
+        """Read columns written by ``save`` without touching the documents."""
+        index = cls()
+        with np.load(path, allow_pickle=False) as data:
+            index.start = data["start"]
+            index.stop = data["stop"]
+            # Files written before stable IDs had one row per position.
+            index.ids = data["ids"] if "ids" in data else np.arange(len(index.start), dtype=np.int64)
+            index.vocab.update(json.loads(str(data["vocab"])))
+            for field in FILTER_KEYS:
+                index.codes[field] = data[f"codes_{field}"]
+        index._rows = {vector_id: row for row, vector_id in enumerate(index.ids.tolist())}
+        return index
+
+    def select(self, filters: Dict) -> np.ndarray:
+        """IDs matching every filter.
+
+        Supported filters: ``patient``, ``hand`` and ``session`` (a value or a
+        list of values) and ``time_range`` (``(start, stop)`` in sample
+        indices; windows overlapping the range match).
+        """
+        mask = self.ids >= 0
+        for field, wanted in filters.items():
+            if wanted is None:
+                continue
+            if field == "time_range":
+                lo, hi = wanted
+                mask &= (self.stop > lo) & (self.start < hi)
+            elif field in FILTER_KEYS:
+                values = wanted if isinstance(wanted, (list, tuple, set)) else [wanted]
+                codes = [self.vocab[field][str(v)] for v in values if str(v) in self.vocab[field]]
+                mask &= np.isin(self.codes[field], codes)
+            else:
+                raise ValueError(f"Unknown filter '{field}', expected one of {list(FILTER_KEYS) + ['time_range']}")
+        return self.ids[mask]
+
+
+def index_factory_string(index_type: str, dimension: int, n_train: int, nlist: int = 1024,
+                         pq_m: int = 16, pq_nbits: int = 8, hnsw_m: int = 32) -> str:
+    """FAISS factory description for an index type, shrunk to fit the training set.
+
+    IVF and PQ both want about 39 training points per centroid, so the
+    number of lists and PQ bits are reduced for small collections. IVF
+    indexes store external IDs natively; flat and HNSW indexes are wrapped in
+    an ``IDMap2`` so every type accepts ``add_with_ids``.
+    """
+    if index_type == "flat":
+        return "IDMap2,Flat"
+    if index_type == "hnsw":
+        return f"IDMap2,HNSW{hnsw_m}"
+    nlist = max(1, min(nlist, n_train // 39))
+    if index_type == "ivf_flat":
+        return f"IVF{nlist},Flat"
+    if index_type == "ivf_pq":
+        if dimension % pq_m != 0:
+            raise ValueError(f"pq_m={pq_m} must divide the dimension {dimension}")
+        nbits = max(1, min(pq_nbits, int(np.log2(max(n_train // 39, 2)))))
+        return f"IVF{nlist},PQ{pq_m}x{nbits}"
+    raise ValueError(f"Unknown index_type '{index_type}', expected one of {INDEX_TYPES}")
+
+
+def log_segments(filepath: str) -> List[Tuple[int, str]]:
+    """(sequence number, path prefix) of the committed append-log segments, oldest first."""
+    log_dir = f"{filepath}.log"
+    if not os.path.isdir(log_dir):
+        return []
+    names = sorted(name[:-len(".npz")] for name in os.listdir(log_dir) if name.endswith(".npz"))
+    return [(int(name), os.path.join(log_dir, name)) for name in names]
+
 
 class VectorStore:
-    def __init__(self, dimension: int = 1536):
-        """Initialize the vector store with OpenAI's embedding dimension (1536 by default)."""
-        self.dimension = dimension
+    def __init__(self, dimension: Optional[int] = None, embedder: Optional[WindowEmbedder] = None,
+                 index_type: str = "flat", nlist: int = 1024, pq_m: int = 16, pq_nbits: int = 8,
+                 hnsw_m: int = 32, nprobe: int = 16, ef_search: int = 64, train_size: int = 100_000):
+        """Initialize the vector store.
+
+        Without an ``embedder`` the store holds OpenAI text embeddings
+        (dimension 1536 by default). With a local WindowEmbedder the dimension
+        follows the embedder and ``index_session`` can index raw IMU windows
+        without any network calls.
+
+        ``index_type`` selects exact search ("flat") or an approximate index
+        ("ivf_flat", "ivf_pq", "hnsw"). IVF indexes are trained on up to
+        ``train_size`` vectors from the first batch; ``nprobe`` and
+        ``ef_search`` trade recall for latency and can be changed later with
+        ``set_search_params``.
+
+        Every vector gets a stable int64 ID that survives saves, deletions
+        and compaction.
+        """
+        if embedder is not None:
+            if dimension is not None and dimension != embedder.dimension:
+                raise ValueError(f"dimension {dimension} does not match embedder dimension {embedder.dimension}")
+            dimension = embedder.dimension
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index_type '{index_type}', expected one of {INDEX_TYPES}")
+        self.dimension = dimension if dimension is not None else 1536
+        self.embedder = embedder
+        self.index_type = index_type
+        self.index_params = {"nlist": nlist, "pq_m": pq_m, "pq_nbits": pq_nbits, "hnsw_m": hnsw_m}
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self.train_size = train_size
         self.index = None
         self.document_map = {}  # Maps vector IDs to original documents
-        
-    def create_index(self, embeddings: np.ndarray, documents: List[Dict] = None):
-        """Create a new FAISS index with the given embeddings."""
+        self.metadata = MetadataIndex()
+        self.next_id = 0
+        # HNSW graphs cannot delete nodes, so removed IDs are filtered out of
+        # results until compaction rebuilds the graph without them.
+        self.tombstones = set()
+        # Changes since the last snapshot, written by save_incremental.
+        self._pending_ids: List[np.ndarray] = []
+        self._pending_vectors: List[np.ndarray] = []
+        self._pending_removed: List[np.ndarray] = []
+        self._path = None
+        self._log_seq = 0
+        self._version = 0
+        self._lock = threading.RLock()
+        # Searches run outside the lock; changing the index in place waits for them
+        self._idle = threading.Condition(self._lock)
+        self._searches = 0
+        self._writers = 0
+        self._compaction = None
+
+    def _build_index(self, embeddings: np.ndarray) -> faiss.Index:
+        """Create (and train, if needed) an empty index of the configured type."""
+        n_train = min(len(embeddings), self.train_size)
+        description = index_factory_string(self.index_type, self.dimension, n_train, **self.index_params)
+        index = faiss.index_factory(self.dimension, description, faiss.METRIC_L2)
+        if not index.is_trained:
+            sample = embeddings
+            if len(embeddings) > n_train:
+                rows = np.random.default_rng(0).choice(len(embeddings), n_train, replace=False)
+                sample = embeddings[np.sort(rows)]
+            index.train(sample)
+        return index
+
+    def set_search_params(self, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+        """Tune IVF ``nprobe`` and HNSW ``efSearch``; ignored by other index types."""
+        if nprobe is not None:
+            self.nprobe = nprobe
+        if ef_search is not None:
+            self.ef_search = ef_search
+        if self.index is None:
+            return
+        index = self.index
+        if isinstance(index, faiss.IndexIDMap):
+            index = faiss.downcast_index(index.index)
+        params = faiss.ParameterSpace()
+        if self.index_type in ("ivf_flat", "ivf_pq"):
+            params.set_index_parameter(index, "nprobe", self.nprobe)
+        elif self.index_type == "hnsw":
+            params.set_index_parameter(index, "efSearch", self.ef_search)
+
+    def create_index(self, embeddings: np.ndarray, documents: List[Dict] = None,
+                     ids: Optional[np.ndarray] = None) -> np.ndarray:
+        """Create a new FAISS index with the given embeddings, replacing any previous contents.
+
+        Returns the IDs assigned to the vectors.
+        """
         if len(embeddings.shape) != 2 or embeddings.shape[1] != self.dimension:
             raise ValueError(f"Embeddings must be a 2D array with shape (n, {self.dimension})")
-        
-        # Initialize FAISS index
-        self.index = faiss.IndexFlatL2(self.dimension)
-        
+        embeddings = np.ascontiguousarray(embeddings, dtype='float32')
+
+        with self._lock:
+            # Initialize FAISS index
+            self.index = self._build_index(embeddings)
+            self.set_search_params()
+            self.document_map = {}
+            self.metadata = MetadataIndex()
+            self.next_id = 0
+            self.tombstones = set()
+            self._version += 1
+            return self._add(embeddings, documents, ids)
+
+    def add_vectors(self, embeddings: np.ndarray, documents: List[Dict] = None,
+                    ids: Optional[np.ndarray] = None) -> np.ndarray:
+        """Add new vectors to the existing index.
+
+        IDs are taken from a monotonically increasing counter unless given
+        explicitly; they are returned so callers can delete the vectors later.
+        """
+        with self._lock:
+            if self.index is None:
+                return self.create_index(embeddings, documents, ids)
+            if len(embeddings.shape) != 2 or embeddings.shape[1] != self.dimension:
+                raise ValueError(f"Embeddings must be a 2D array with shape (n, {self.dimension})")
+            return self._add(np.ascontiguousarray(embeddings, dtype='float32'), documents, ids)
+
+    def _add(self, embeddings: np.ndarray, documents: Optional[List], ids: Optional[np.ndarray]) -> np.ndarray:
+        if ids is None:
+            ids = np.arange(self.next_id, self.next_id + len(embeddings), dtype=np.int64)
+        else:
+            ids = np.ascontiguousarray(ids, dtype=np.int64)
+            if ids.shape != (len(embeddings),) or len(np.unique(ids)) != len(ids):
+                raise ValueError("ids must be unique and match the number of embeddings")
+            taken = [i for i in ids.tolist() if i in self.metadata or i in self.tombstones]
+            if taken:
+                raise ValueError(f"IDs already in use: {taken[:10]}")
+        if not len(ids):
+            return ids
+
         # Add vectors to the index
-        self.index.add(embeddings.astype('float32'))
-        
-        # Store document mapping if provided
-        if documents:
-            for i, doc in enumerate(documents):
-                self.document_map[i] = doc
-                
-    def search(self, query_vector: np.ndarray, k: int = 5) -> List[Dict]:
-        """Search for k nearest neighbors of the query vector."""
+        self._wait_for_searches()
+        self.index.add_with_ids(embeddings, ids)
+
+        # Store document mapping if provided; every ID gets a metadata row
+        documents = list(documents) if documents else []
+        documents += [None] * (len(ids) - len(documents))
+        for vector_id, doc in zip(ids.tolist(), documents):
+            if doc is not None:
+                self.document_map[vector_id] = doc
+        self.metadata.set(ids, documents)
+
+        self.next_id = max(self.next_id, int(ids.max()) + 1)
+        self._pending_ids.append(ids)
+        self._pending_vectors.append(embeddings.copy())
+        self._version += 1
+        return ids
+
+    def remove_ids(self, ids: np.ndarray) -> int:
+        """Delete vectors and their documents; returns how many IDs were present.
+
+        Flat and IVF indexes drop the vectors immediately. HNSW keeps them in
+        the graph, hidden from every search, until ``compact`` rebuilds it.
+        """
+        with self._lock:
+            removed = self.metadata.remove(np.atleast_1d(np.asarray(ids, dtype=np.int64)))
+            if not len(removed):
+                return 0
+            self._wait_for_searches()
+            if self.index_type == "hnsw":
+                self.tombstones.update(removed.tolist())
+            else:
+                self.index.remove_ids(removed)
+            for vector_id in removed.tolist():
+                self.document_map.pop(vector_id, None)
+
+            # Vectors added and removed before the next save never reach the log
+            gone = set(removed.tolist())
+            for i, pending in enumerate(self._pending_ids):
+                keep = np.array([vector_id not in gone for vector_id in pending.tolist()], dtype=bool)
+                if not keep.all():
+                    self._pending_ids[i] = pending[keep]
+                    self._pending_vectors[i] = self._pending_vectors[i][keep]
+            self._pending_removed.append(removed)
+            self._version += 1
+            return len(removed)
+
+    def remove_matching(self, filters: Dict) -> int:
+        """Delete every vector whose metadata matches ``filters``, e.g. ``{"patient": "p1"}``."""
+        return self.remove_ids(self.metadata.select(filters))
+
+    def index_session(self, session: IMUSession) -> np.ndarray:
+        """Embed a session's motion windows locally and add them to the index."""
+        if self.embedder is None:
+            raise ValueError("index_session requires a VectorStore created with an embedder")
+        vectors, documents = self.embedder.embed_session(session)
+        if len(vectors):
+            return self.add_vectors(vectors, documents)
+        return np.empty(0, dtype=np.int64)
+
+    def _wait_for_searches(self):
+        """Wait, holding the lock, until no search uses the index; FAISS cannot change it during one."""
+        self._writers += 1
+        try:
+            while self._searches:
+                self._idle.wait()
+        finally:
+            self._writers -= 1
+            self._idle.notify_all()
+
+    def _selector(self, ids: Optional[np.ndarray]):
+        """FAISS ID selector restricting results to ``ids`` and hiding tombstones, or None."""
+        if ids is not None:
+            return faiss.IDSelectorBatch(np.ascontiguousarray(ids, dtype=np.int64))
+        if self.tombstones:
+            hidden = np.fromiter(self.tombstones, dtype=np.int64, count=len(self.tombstones))
+            return faiss.IDSelectorNot(faiss.IDSelectorBatch(hidden))
+        return None
+
+    def _search_params(self, selector, nprobe: int, ef_search: int):
+        if self.index_type in ("ivf_flat", "ivf_pq"):
+            return faiss.SearchParametersIVF(sel=selector, nprobe=nprobe)
+        if self.index_type == "hnsw":
+            return faiss.SearchParametersHNSW(sel=selector, efSearch=ef_search)
+        return faiss.SearchParameters(sel=selector)
+
+    def _search_short_rows(self, index: faiss.Index, queries: np.ndarray, k: int, ids: Optional[np.ndarray],
+                           selector, selectable: int, distances: np.ndarray, indices: np.ndarray):
+        """Search again for the queries an approximate index returned fewer than ``k`` matches for.
+
+        An ID selector only drops candidates after the IVF lists or the HNSW
+        graph have been explored, so a selective filter can leave few or none.
+        IVF retries probe every list. HNSW searches the selected vectors
+        exactly when there are at most ``EXACT_SEARCH_MAX_IDS`` of them and
+        otherwise doubles ``efSearch`` until the rows are full.
+        """
+        expected = min(k, selectable)
+        short = np.flatnonzero((indices >= 0).sum(axis=1) < expected)
+        ef_search = max(self.ef_search, k)
+        while len(short):
+            if self.index_type in ("ivf_flat", "ivf_pq"):
+                params = self._search_params(selector, faiss.extract_index_ivf(index).nlist, self.ef_search)
+                distances[short], indices[short] = index.search(queries[short], k, params=params)
+                return
+            if ids is not None and len(ids) <= EXACT_SEARCH_MAX_IDS:
+                ids = np.ascontiguousarray(ids, dtype=np.int64)
+                found_distances, rows = faiss.knn(queries[short], index.reconstruct_batch(ids), min(k, len(ids)))
+                distances[short], indices[short] = np.inf, -1
+                distances[short, :rows.shape[1]] = found_distances
+                indices[short, :rows.shape[1]] = np.where(rows >= 0, ids[np.maximum(rows, 0)], -1)
+                return
+            if ef_search >= index.ntotal:
+                return
+            ef_search = min(2 * ef_search, index.ntotal)
+            found_distances, found = index.search(queries[short], k,
+                                                  params=self._search_params(selector, self.nprobe, ef_search))
+            distances[short], indices[short] = found_distances, found
+            short = short[(found >= 0).sum(axis=1) < expected]
+
+    def search_batch(self, queries: np.ndarray, k: int = 5, filters: Optional[Dict] = None) -> List[List[Dict]]:
+        """Search many query vectors with one FAISS call.
+
+        ``filters`` (see ``MetadataIndex.select``) are applied inside FAISS via
+        an ID selector. Approximate indexes search again for queries that
+        came back with fewer than ``k`` matches although the filter selects
+        more (see ``_search_short_rows``), so every query gets up to ``k``
+        matching results.
+
+        The lock is only held to take a consistent view of the index and the
+        selection; searches run concurrently, and changes to the index wait
+        for running searches to finish.
+        """
         if self.index is None:
             raise ValueError("Index not initialized. Call create_index first.")
-            
+
+        queries = np.ascontiguousarray(np.atleast_2d(queries), dtype='float32')
+        with self._lock:
+            while self._writers:
+                self._idle.wait()
+            ids = self.metadata.select(filters) if filters else None
+            if ids is not None and len(ids) == 0:
+                return [[] for _ in range(len(queries))]
+            index, document_map = self.index, self.document_map
+            selector = self._selector(ids)
+            selectable = len(ids) if ids is not None else len(self)
+            self._searches += 1
+
+        try:
+            # Perform the search
+            if selector is None:
+                distances, indices = index.search(queries, k)
+            else:
+                distances, indices = index.search(queries, k,
+                                                  params=self._search_params(selector, self.nprobe, self.ef_search))
+                if self.index_type != "flat":
+                    self._search_short_rows(index, queries, k, ids, selector, selectable, distances, indices)
+
+            # Return results with documents if available
+            all_results = []
+            for row_distances, row_indices in zip(distances, indices):
+                results = []
+                for dist, idx in zip(row_distances, row_indices):
+                    if idx < 0:
+                        continue
+                    result = {
+                        'distance': float(dist),
+                        'index': int(idx)
+                    }
+                    if idx in document_map:
+                        result['document'] = document_map[idx]
+                    results.append(result)
+                all_results.append(results)
+            return all_results
+        finally:
+            with self._lock:
+                self._searches -= 1
+                self._idle.notify_all()
+
+    def search(self, query_vector: np.ndarray, k: int = 5, filters: Optional[Dict] = None) -> List[Dict]:
+        """Search for k nearest neighbors of the query vector."""
         # Reshape query vector if necessary
         if len(query_vector.shape) == 1:
             query_vector = query_vector.reshape(1, -1)
-            
-        # Perform the search
-        distances, indices = self.index.search(query_vector.astype('float32'), k)
-        
-        # Return results with documents if available
-        results = []
-        for i, (dist, idx) in enumerate(zip(distances[0], indices[0])):
-            result = {
-                'distance': float(dist),
-                'index': int(idx)
-            }
-            if idx in self.document_map:
-                result['document'] = self.document_map[idx]
-            results.append(result)
-            
-        return results
-    
-    def save(self, filepath: str):
-        """Save the vector store to disk."""
-        if self.index is None:
-            raise ValueError("Nothing to save. Index not initialized.")
-            
+        return self.search_batch(query_vector[:1], k, filters)[0]
+
+    def _take_pending(self):
+        pending = (self._pending_ids, self._pending_vectors, self._pending_removed)
+        self._pending_ids, self._pending_vectors, self._pending_removed = [], [], []
+        return pending
+
+    def _restore_pending(self, pending):
+        ids, vectors, removed = pending
+        self._pending_ids[:0] = ids
+        self._pending_vectors[:0] = vectors
+        self._pending_removed[:0] = removed
+
+    def _without_tombstones(self, index: faiss.Index, tombstones: set) -> faiss.Index:
+        """Rebuild an HNSW index from its stored vectors, leaving out removed IDs."""
+        ids = faiss.vector_to_array(index.id_map)
+        vectors = faiss.downcast_index(index.index).reconstruct_n(0, index.ntotal)
+        keep = ~np.isin(ids, np.fromiter(tombstones, dtype=np.int64, count=len(tombstones)))
+        rebuilt = self._build_index(vectors[keep])
+        if len(ids[keep]):
+            rebuilt.add_with_ids(vectors[keep], ids[keep])
+        return rebuilt
+
+    def _write_snapshot(self, filepath: str, index: faiss.Index, documents, metadata: MetadataIndex,
+                        next_id: int, log_seq: int):
+        """Write a full snapshot and drop the log segments folded into it.
+
+        Every file is first written under a temporary name. Renaming
+        ``meta.json.next`` into place commits them; if the process dies after
+        that, ``load`` finishes swapping them in before reading anything, so
+        the index, documents and ``log_seq`` always come from the same
+        snapshot and no folded segment is replayed twice.
+        """
         # Create directory if it doesn't exist
-        os.makedirs(os.path.dirname(filepath), exist_ok=True)
-        
+        os.makedirs(os.path.dirname(filepath) or ".", exist_ok=True)
+
         # Save FAISS index
-        faiss.write_index(self.index, f"{filepath}.faiss")
-        
-        # Save document mapping
-        with open(f"{filepath}.docs", 'wb') as f:
-            pickle.dump(self.document_map, f)
-            
-    def load(self, filepath: str):
-        """Load the vector store from disk."""
+        faiss.write_index(index, f"{filepath}.faiss.tmp")
+
+        # Save documents as an offset-indexed store that loads lazily, plus
+        # the filter columns so they need not be rebuilt from the documents
+        DocumentStore.write(f"{filepath}.docstore.next", documents)
+        metadata.save(f"{filepath}.metadata.npz.tmp")
+
+        # Save the embedding backend and index settings so queries are
+        # encoded and searched the same way after loading. It names the last
+        # log segment folded into this snapshot.
+        with open(f"{filepath}.meta.json.tmp", 'w') as f:
+            json.dump({
+                "dimension": self.dimension,
+                "embedder": self.embedder.config() if self.embedder is not None else None,
+                "index_type": self.index_type,
+                "index_params": self.index_params,
+                "nprobe": self.nprobe,
+                "ef_search": self.ef_search,
+                "train_size": self.train_size,
+                "next_id": next_id,
+                "log_seq": log_seq,
+            }, f)
+        os.replace(f"{filepath}.meta.json.tmp", f"{filepath}.meta.json.next")
+        self._commit_snapshot(filepath)
+
+        for seq, segment in log_segments(filepath):
+            if seq <= log_seq:
+                os.remove(f"{segment}.npz")
+                shutil.rmtree(f"{segment}.docstore", ignore_errors=True)
+        return DocumentStore(f"{filepath}.docstore")
+
+    @staticmethod
+    def _commit_snapshot(filepath: str):
+        """Swap a fully written snapshot into place; ``meta.json`` goes last.
+
+        Safe to repeat after an interruption: only the files still waiting
+        under their temporary names are moved.
+        """
+        if not os.path.exists(f"{filepath}.meta.json.next"):
+            return
+        for name in ("faiss", "metadata.npz"):
+            if os.path.exists(f"{filepath}.{name}.tmp"):
+                os.replace(f"{filepath}.{name}.tmp", f"{filepath}.{name}")
+        docstore = f"{filepath}.docstore"
+        if os.path.isdir(f"{docstore}.next"):
+            shutil.rmtree(f"{docstore}.old", ignore_errors=True)
+            if os.path.exists(docstore):
+                os.replace(docstore, f"{docstore}.old")
+            os.replace(f"{docstore}.next", docstore)
+            shutil.rmtree(f"{docstore}.old", ignore_errors=True)
+        os.replace(f"{filepath}.meta.json.next", f"{filepath}.meta.json")
+
+    def _compact(self, filepath: str):
+        with self._lock:
+            if self.index is None:
+                raise ValueError("Nothing to save. Index not initialized.")
+            if filepath != self._path:
+                # A log left at another location belongs to a different store
+                shutil.rmtree(f"{filepath}.log", ignore_errors=True)
+            pending = self._take_pending()
+            version = self._version
+            index = faiss.clone_index(self.index)
+            documents = self.document_map.copy()
+            metadata = self.metadata.copy()
+            tombstones = set(self.tombstones)
+            next_id, log_seq = self.next_id, self._log_seq
+            self._path = filepath
+
+        # The slow part runs without the lock so searches and appends continue
+        try:
+            if tombstones:
+                index = self._without_tombstones(index, tombstones)
+            documents = self._write_snapshot(filepath, index, documents, metadata, next_id, log_seq)
+        except BaseException:
+            with self._lock:
+                self._restore_pending(pending)
+            raise
+
+        with self._lock:
+            if self._version == version:
+                # Nothing changed meanwhile: adopt the compacted index and the
+                # memory-mapped documents, releasing the in-memory copies
+                self.index = index
+                self.set_search_params()
+                self.document_map = documents
+                self.tombstones = set()
+
+    def compact(self, filepath: str, background: bool = False) -> Optional[threading.Thread]:
+        """Write a full snapshot to ``filepath`` and drop the append log it supersedes.
+
+        Removed vectors are purged from HNSW graphs and the document store.
+        With ``background=True`` the snapshot is written on a daemon thread,
+        which is returned; searches, ``add_vectors`` and ``save_incremental``
+        keep working meanwhile.
+        """
+        self.wait_for_compaction()
+        if not background:
+            self._compact(filepath)
+            return None
+        self._compaction = threading.Thread(target=self._compact, args=(filepath,), daemon=True)
+        self._compaction.start()
+        return self._compaction
+
+    def wait_for_compaction(self):
+        """Block until a background compaction, if any, has finished."""
+        if self._compaction is not None:
+            self._compaction.join()
+            self._compaction = None
+
+    def save(self, filepath: str):
+        """Save the vector store to disk as a full snapshot."""
+        self.compact(filepath)
+
+    def save_incremental(self, filepath: str):
+        """Persist only the changes since the last save as one append-log segment.
+
+        The ``.faiss`` file is left untouched; ``load`` replays the segments
+        in order. Falls back to a full ``save`` if ``filepath`` holds no
+        snapshot of this store yet.
+        """
+        with self._lock:
+            full = filepath != self._path or not os.path.exists(f"{filepath}.meta.json")
+        if full:
+            self.save(filepath)
+            return
+        with self._lock:
+            pending_ids, pending_vectors, removed = self._take_pending()
+            ids = np.concatenate(pending_ids) if pending_ids else np.empty(0, dtype=np.int64)
+            if not len(ids) and not removed:
+                return
+            vectors = (np.concatenate(pending_vectors) if pending_vectors
+                       else np.empty((0, self.dimension), dtype=np.float32))
+            removed = np.concatenate(removed) if removed else np.empty(0, dtype=np.int64)
+
+            seq = self._log_seq + 1
+            segment = os.path.join(f"{filepath}.log", f"{seq:08d}")
+            try:
+                os.makedirs(f"{filepath}.log", exist_ok=True)
+                documents = {i: self.document_map[i] for i in ids.tolist() if i in self.document_map}
+                DocumentStore.write(f"{segment}.docstore", documents)
+                # The .npz is the segment's commit marker, so it goes last
+                with open(f"{segment}.npz.tmp", "wb") as f:
+                    np.savez(f, ids=ids, vectors=vectors, removed=removed)
+                os.replace(f"{segment}.npz.tmp", f"{segment}.npz")
+            except BaseException:
+                self._restore_pending(([ids], [vectors], [removed]))
+                raise
+            self._log_seq = seq
+
+    def _replay_log(self, filepath: str):
+        """Apply the append-log segments newer than the loaded snapshot."""
+        for seq, segment in log_segments(filepath):
+            if seq <= self._log_seq:
+                continue
+            with np.load(f"{segment}.npz", allow_pickle=False) as data:
+                ids, vectors, removed = data["ids"], data["vectors"], data["removed"]
+            # Removals first: a segment may re-add an ID it removed
+            if len(removed):
+                self.remove_ids(removed)
+            if len(ids):
+                documents = DocumentStore(f"{segment}.docstore") if os.path.isdir(f"{segment}.docstore") else {}
+                self._add(vectors, [documents.get(i) for i in ids.tolist()], ids)
+            self._log_seq = seq
+        self._take_pending()
+
+    def _upgrade_legacy_index(self):
+        """Give flat and HNSW indexes saved before stable IDs an ID map (IDs stay 0..n-1)."""
+        if self.index_type not in ("flat", "hnsw") or isinstance(self.index, faiss.IndexIDMap):
+            return
+        vectors = self.index.reconstruct_n(0, self.index.ntotal)
+        self.index = self._build_index(vectors)
+        if len(vectors):
+            self.index.add_with_ids(vectors, np.arange(len(vectors), dtype=np.int64))
+
+    def load(self, filepath: str, allow_pickle: bool = False):
+        """Load the vector store from disk.
+
+        Documents are memory-mapped and decoded on access, then any
+        append-log segments written by ``save_incremental`` are replayed.
+        Stores saved in the old pickle format are only read with
+        ``allow_pickle=True``.
+        """
+        self.wait_for_compaction()
+        # Finish a snapshot that was committed but not fully swapped in
+        self._commit_snapshot(filepath)
         # Load FAISS index
         self.index = faiss.read_index(f"{filepath}.faiss")
-        
+        self.dimension = self.index.d
+
+        meta = {}
+        meta_path = f"{filepath}.meta.json"
+        if os.path.exists(meta_path):
+            with open(meta_path, 'r') as f:
+                meta = json.load(f)
+            if meta.get("embedder"):
+                self.embedder = WindowEmbedder.from_config(meta["embedder"])
+            self.index_type = meta.get("index_type", "flat")
+            self.index_params.update(meta.get("index_params", {}))
+            self.nprobe = meta.get("nprobe", self.nprobe)
+            self.ef_search = meta.get("ef_search", self.ef_search)
+            self.train_size = meta.get("train_size", self.train_size)
+        self._upgrade_legacy_index()
+        self.set_search_params()
+
         # Load document mapping if it exists
+        docstore_path = f"{filepath}.docstore"
         docs_path = f"{filepath}.docs"
-        if os.path.exists(docs_path):
+        if os.path.isdir(docstore_path):
+            self.document_map = DocumentStore(docstore_path)
+        elif os.path.exists(docs_path):
+            if not allow_pickle:
+                raise ValueError(
+                    f"{docs_path} is a legacy pickled document map. Pickles can run arbitrary code; "
+                    f"if it is trusted, convert it once with document_store.migrate_pickle_docs('{filepath}') "
+                    f"or pass allow_pickle=True."
+                )
             with open(docs_path, 'rb') as f:
                 self.document_map = pickle.load(f)
-                
-    def add_vectors(self, embeddings: np.ndarray, documents: List[Dict] = None):
-        """Add new vectors to the existing index."""
-        if self.index is None:
-            self.create_index(embeddings, documents)
-            return
-            
-        # Add vectors to the index
-        self.index.add(embeddings.astype('float32'))
-        
-        # Update document mapping if provided
-        if documents:
-            current_size = len(self.document_map)
-            for i, doc in enumerate(documents):
-                self.document_map[current_size + i] = doc
-                
+        else:
+            self.document_map = {}
+
+        metadata_path = f"{filepath}.metadata.npz"
+        if os.path.exists(metadata_path):
+            self.metadata = MetadataIndex.load(metadata_path)
+        else:
+            self.metadata = MetadataIndex()
+            if self.document_map:
+                ids = np.fromiter(self.document_map.keys(), dtype=np.int64)
+                self.metadata.set(ids, list(self.document_map.values()))
+        if "next_id" not in meta:
+            # Saved before stable IDs: vectors were numbered by position
+            positions = np.arange(self.index.ntotal, dtype=np.int64)
+            missing = positions[[i not in self.metadata for i in positions.tolist()]]
+            self.metadata.set(missing, [None] * len(missing))
+
+        self.next_id = meta.get("next_id", self.index.ntotal)
+        self.tombstones = set()
+        self._take_pending()
+        self._path = filepath
+        self._log_seq = meta.get("log_seq", 0)
+        with self._lock:
+            self._replay_log(filepath)
+            self._version += 1
+
+    @property
+    def version(self) -> int:
+        """Counter that changes whenever vectors are added, removed or loaded."""
+        return self._version
+
     def get_document(self, index: int) -> Optional[Dict]:
         """Retrieve the document associated with a vector index."""
         return self.document_map.get(index)
-        
+
     def __len__(self):
         """Return the number of vectors in the index."""
-        return self.index.ntotal if self.index is not None else 0
+        return self.index.ntotal - len(self.tombstones) if self.index is not None else 0
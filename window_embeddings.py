@@ -0,0 +1,128 @@
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from imu_session import IMUSession
+
+# Divisors that bring each channel to roughly unit scale.
+CHANNEL_SCALES = {
+    "pitch": 90.0, "roll": 90.0, "yaw": 180.0,
+    "gyro_x": 250.0, "gyro_y": 250.0, "gyro_z": 250.0,
+    "compass_x": 50.0, "compass_y": 50.0, "compass_z": 50.0,
+    "temp": 40.0,
+}
+
+# Channels whose absolute level is meaningless (heading depends on where the
+# user faces), so only their variation within a window is encoded.
+RELATIVE_CHANNELS = {"yaw", "compass_x", "compass_y", "compass_z"}
+
+DEFAULT_CHANNELS = ("pitch", "roll", "yaw", "gyro_x", "gyro_y", "gyro_z")
+
+
+class WindowEmbedder:
+    """Local embedding backend for raw IMU signal.
+
+    Encodes sliding windows of each hand into fixed-size vectors: per channel
+    the scaled level, standard deviation, range and slope, followed by the
+    magnitudes of the first ``fft_bins`` non-DC frequency bins. Everything is
+    computed in NumPy, so indexing needs no network access.
+    """
+
+    STATS = 4
+
+    def __init__(self, window: int = 32, stride: int = 16, fft_bins: int = 4,
+                 channels: Sequence[str] = DEFAULT_CHANNELS):
+        if window < 2 or stride < 1:
+            raise ValueError("window must be >= 2 and stride >= 1")
+        if fft_bins > window // 2:
+            raise ValueError(f"fft_bins must be <= window // 2 ({window // 2})")
+        unknown = set(channels) - set(CHANNEL_SCALES)
+        if unknown:
+            raise ValueError(f"Unknown channels: {sorted(unknown)}")
+        self.window = window
+        self.stride = stride
+        self.fft_bins = fft_bins
+        self.channels = tuple(channels)
+
+    @property
+    def dimension(self) -> int:
+        """Length of each embedding vector."""
+        return len(self.channels) * (self.STATS + self.fft_bins)
+
+    def config(self) -> Dict:
+        """JSON-serializable constructor arguments."""
+        return {"window": self.window, "stride": self.stride,
+                "fft_bins": self.fft_bins, "channels": list(self.channels)}
+
+    @classmethod
+    def from_config(cls, config: Dict) -> "WindowEmbedder":
+        return cls(**config)
+
+    def window_starts(self, n: int) -> np.ndarray:
+        """Start offsets of the windows covering ``n`` samples (tail included)."""
+        if n == 0:
+            return np.empty(0, dtype=np.int64)
+        if n <= self.window:
+            return np.zeros(1, dtype=np.int64)
+        starts = np.arange(0, n - self.window + 1, self.stride)
+        if starts[-1] != n - self.window:
+            starts = np.append(starts, n - self.window)
+        return starts
+
+    def _signal(self, samples: np.ndarray) -> np.ndarray:
+        """(n, channels) float32 matrix, scaled, with yaw unwrapped."""
+        columns = []
+        for name in self.channels:
+            values = samples[name].astype(np.float32)
+            if name == "yaw":
+                values = np.rad2deg(np.unwrap(np.deg2rad(values))).astype(np.float32)
+            columns.append(values / CHANNEL_SCALES[name])
+        return np.stack(columns, axis=1)
+
+    def embed_samples(self, samples: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Embed one hand's structured samples; returns (vectors, window starts)."""
+        n = len(samples)
+        starts = self.window_starts(n)
+        if n == 0:
+            return np.empty((0, self.dimension), dtype=np.float32), starts
+
+        signal = self._signal(samples)
+        if n < self.window:
+            windows = signal.T[np.newaxis]
+        else:
+            windows = sliding_window_view(signal, self.window, axis=0)[starts]
+        # windows: (m, channels, length)
+        length = windows.shape[2]
+        level = windows.mean(axis=2)
+        relative = np.array([name in RELATIVE_CHANNELS for name in self.channels])
+        level[:, relative] = 0.0
+        spread = windows.std(axis=2)
+        extent = np.ptp(windows, axis=2)
+        slope = (windows[:, :, -1] - windows[:, :, 0]) / max(length - 1, 1) * self.window
+
+        centered = windows - windows.mean(axis=2, keepdims=True)
+        spectrum = np.abs(np.fft.rfft(centered, n=self.window, axis=2))[:, :, 1:1 + self.fft_bins]
+        spectrum /= self.window
+
+        vectors = np.concatenate(
+            [np.stack([level, spread, extent, slope], axis=2), spectrum], axis=2
+        ).reshape(len(windows), -1)
+        return vectors.astype(np.float32, copy=False), starts
+
+    def embed_session(self, session: IMUSession) -> Tuple[np.ndarray, List[Dict]]:
+        """Embed every hand; returns vectors and one metadata dict per window."""
+        vectors, documents = [], []
+        for hand in session.hands:
+            samples = session.samples(hand)
+            hand_vectors, starts = self.embed_samples(samples)
+            vectors.append(hand_vectors)
+            first = samples["index"][starts]
+            last = samples["index"][np.minimum(starts + self.window, len(samples)) - 1]
+            for start, stop in zip(first.tolist(), last.tolist()):
+                documents.append({"hand": hand, "start": start, "stop": stop + 1,
+                                  "timestamp": session.timestamp, "session": session.session_id,
+                                  "patient": session.patient_id})
+        if not vectors:
+            return np.empty((0, self.dimension), dtype=np.float32), documents
+        return np.concatenate(vectors), documents
@@ -0,0 +1,130 @@
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from imu_session import IMUSession
+from motion_features import DEFAULT_SAMPLE_RATE
+from rep_detection import rep_bounds
+
+DEFAULT_WINDOW = 40
+DEFAULT_STRIDE = 20
+
+
+def fixed_bounds(n: int, window: int = DEFAULT_WINDOW, stride: int = DEFAULT_STRIDE) -> List[Tuple[int, int]]:
+    """[start, stop) ranges of fixed-length windows covering ``n`` samples."""
+    if window < 1 or stride < 1:
+        raise ValueError("window and stride must be at least 1")
+    if n == 0:
+        return []
+    if n <= window:
+        return [(0, n)]
+    starts = list(range(0, n - window + 1, stride))
+    if starts[-1] != n - window:
+        starts.append(n - window)
+    return [(start, start + window) for start in starts]
+
+
+def segment_stats(x: np.ndarray, starts: np.ndarray, stops: np.ndarray) -> Dict[str, np.ndarray]:
+    """Mean, std, min, max, first and last value of ``x`` over each [start, stop).
+
+    Segments may overlap; sums come from prefix sums and extrema from one
+    ``reduceat`` over interleaved start/stop offsets.
+    """
+    x = x.astype(np.float64)
+    lengths = (stops - starts).astype(np.float64)
+    csum = np.concatenate(([0.0], np.cumsum(x)))
+    csq = np.concatenate(([0.0], np.cumsum(x * x)))
+    mean = (csum[stops] - csum[starts]) / lengths
+    var = np.maximum((csq[stops] - csq[starts]) / lengths - mean ** 2, 0.0)
+
+    # reduceat over [s0, e0, s1, e1, ...]: even slots reduce x[s:e].
+    padded = np.append(x, x[-1])
+    offsets = np.empty(2 * len(starts), dtype=np.int64)
+    offsets[0::2], offsets[1::2] = starts, stops
+    return {
+        "mean": mean,
+        "std": np.sqrt(var),
+        "min": np.minimum.reduceat(padded, offsets)[0::2],
+        "max": np.maximum.reduceat(padded, offsets)[0::2],
+        "first": x[starts],
+        "last": x[stops - 1],
+    }
+
+
+def window_summaries(samples: np.ndarray, bounds: List[Tuple[int, int]]) -> List[Dict]:
+    """Aggregated statistics for each [start, stop) range of one hand."""
+    if not bounds or len(samples) == 0:
+        return []
+    starts = np.array([b[0] for b in bounds], dtype=np.int64)
+    stops = np.array([b[1] for b in bounds], dtype=np.int64)
+    yaw = np.rad2deg(np.unwrap(np.deg2rad(samples["yaw"].astype(np.float64))))
+    gyro = np.linalg.norm(np.stack([samples["gyro_x"], samples["gyro_y"], samples["gyro_z"]], axis=1)
+                          .astype(np.float64), axis=1)
+    channels = {
+        "pitch": segment_stats(samples["pitch"], starts, stops),
+        "roll": segment_stats(samples["roll"], starts, stops),
+        "yaw": segment_stats(yaw, starts, stops),
+        "gyro": segment_stats(gyro, starts, stops),
+    }
+    index = samples["index"]
+    summaries = []
+    for i in range(len(starts)):
+        summary = {"start": int(index[starts[i]]), "stop": int(index[stops[i] - 1]) + 1,
+                   "samples": int(stops[i] - starts[i])}
+        for name, stats in channels.items():
+            summary[name] = {key: float(values[i]) for key, values in stats.items()}
+        summaries.append(summary)
+    return summaries
+
+
+def summarize_session(session: IMUSession, window: int = DEFAULT_WINDOW, stride: int = DEFAULT_STRIDE,
+                      align_to_reps: bool = False, sample_rate: Optional[float] = None) -> List[Dict]:
+    """Window summaries for every hand of a session.
+
+    With ``align_to_reps`` each window is one detected repetition; hands
+    without a complete rep fall back to fixed windows.
+    """
+    rate = sample_rate or session.sample_rate or DEFAULT_SAMPLE_RATE
+    summaries = []
+    for hand in session.hands:
+        samples = session.samples(hand)
+        bounds = rep_bounds(samples, rate) if align_to_reps else []
+        kind = "repetition" if bounds else "window"
+        if not bounds:
+            bounds = fixed_bounds(len(samples), window, stride)
+        for summary in window_summaries(samples, bounds):
+            summary.update(hand=hand, kind=kind, duration_s=summary["samples"] / rate)
+            summaries.append(summary)
+    return summaries
+
+
+def describe_window(summary: Dict) -> str:
+    """Readable text for one window summary, used as the document text."""
+    pitch, roll, yaw, gyro = summary["pitch"], summary["roll"], summary["yaw"], summary["gyro"]
+    return (
+        f"Motion {summary['kind']} ({summary['hand']} hand, samples {summary['start']}-{summary['stop']}, "
+        f"{summary['duration_s']:.1f}s):\n"
+        f"Pitch: mean={pitch['mean']:.2f}°, range={pitch['min']:.2f}° to {pitch['max']:.2f}°, "
+        f"change={pitch['last'] - pitch['first']:+.2f}°\n"
+        f"Roll: mean={roll['mean']:.2f}°, range={roll['min']:.2f}° to {roll['max']:.2f}°, std={roll['std']:.2f}°\n"
+        f"Yaw: span={yaw['max'] - yaw['min']:.2f}°, std={yaw['std']:.2f}°\n"
+        f"Angular velocity: mean={gyro['mean']:.2f}, peak={gyro['max']:.2f} deg/s"
+    )
+
+
+def window_documents(session: IMUSession, window: int = DEFAULT_WINDOW, stride: int = DEFAULT_STRIDE,
+                     align_to_reps: bool = False) -> List[Tuple[str, Dict]]:
+    """(text, metadata) of one search document per window (or repetition) of a session."""
+    documents = []
+    for summary in summarize_session(session, window, stride, align_to_reps):
+        documents.append((describe_window(summary), {
+            "hand": summary["hand"],
+            "kind": summary["kind"],
+            "start": summary["start"],
+            "stop": summary["stop"],
+            "timestamp": session.timestamp,
+            "session": session.session_id,
+            "patient": session.patient_id,
+            "stats": {name: summary[name] for name in ("pitch", "roll", "yaw", "gyro")},
+        }))
+    return documents